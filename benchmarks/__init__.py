@@ -0,0 +1 @@
+"""Benchmarks for the model layer and routes; run with ``python -m benchmarks.run``"""
@@ -0,0 +1,122 @@
+"""Decode and encode throughput of the model layer for large record counts
+
+    python -m benchmarks.bench_codec --records 1m
+    python -m benchmarks.bench_codec --records 100k --models Message,Asset --out codec.json
+
+Every model is decoded from the records a JSON file and a DynamoDB query
+would hand back, then encoded again. Memory is the traced growth per decoded
+instance over the first 100k records.
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+from legatera.models import User, Trustee, Message, Asset, LastWishes
+from .run import make_app, parse_size
+
+MEMORY_SAMPLE = 100000
+
+MODELS = {'User': User, 'Trustee': Trustee, 'Message': Message, 'Asset': Asset, 'LastWishes': LastWishes}
+
+def _records(name, count):
+    """Stored records of one model as (json_form, dynamo_form) lists"""
+    created_at = '2024-01-01T00:00:00'
+    records = []
+    for index in range(count):
+        user_id = f'bench-user-{index:07d}'
+        if name == 'User':
+            record = {'id': user_id, 'email': f'user{index}@legatera-bench.example.com',
+                      'password_hash': 'pbkdf2:sha256:600000$bench$hash', 'first_name': f'First{index}',
+                      'last_name': f'Last{index}', 'is_trustee': False, 'created_at': created_at,
+                      'last_seen': None}
+        elif name == 'Trustee':
+            record = {'id': f'{user_id}-trustee', 'user_id': user_id, 'trustee_user_id': 'bench-user-0000000',
+                      'notification_triggered': index % 2 == 0,
+                      'triggered_at': created_at if index % 2 == 0 else None}
+        elif name == 'Message':
+            record = {'id': f'{user_id}-message', 'user_id': user_id, 'recipient_id': 'bench-user-0000000',
+                      'content': 'A benchmark message about the family photo archive', 'media_url': None,
+                      'delay_days': 7, 'created_at': created_at, 'sent_at': None, 'release_at': None}
+        elif name == 'Asset':
+            record = {'id': f'{user_id}-asset', 'user_id': user_id, 'name': 'Savings account',
+                      'description': 'Joint account at the bank', 'asset_type': 'financial',
+                      'value': str(Decimal(index) / 100), 'location': 'Bank'}
+        else:
+            record = {'id': f'{user_id}-wishes', 'user_id': user_id, 'funeral_preferences': 'Cremation',
+                      'special_requests': None, 'personal_message': 'Be kind to each other',
+                      'updated_at': created_at}
+        records.append(record)
+    dynamo = records
+    if name == 'Asset':
+        dynamo = [dict(record, value=Decimal(record['value'])) for record in records]
+    return records, dynamo
+
+def _rate(count, seconds):
+    return {'seconds': round(seconds, 3), 'records_per_sec': round(count / seconds) if seconds else None}
+
+def bench_model(name, count):
+    cls = MODELS[name]
+    stored, items = _records(name, count)
+    results = {}
+
+    # Tracing slows allocation several times over, so memory is sampled on its own pass
+    sample = stored[:MEMORY_SAMPLE]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [cls.from_dict(record) for record in sample]
+    results['bytes_per_instance'] = round((tracemalloc.get_traced_memory()[0] - before) / len(kept))
+    tracemalloc.stop()
+    del kept
+
+    gc.collect()
+    started = time.perf_counter()
+    loaded = [cls.from_dict(record) for record in stored]
+    results['decode_json'] = _rate(count, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for record in loaded:
+        record.to_dict()
+    results['encode_json'] = _rate(count, time.perf_counter() - started)
+    del loaded
+    gc.collect()
+
+    started = time.perf_counter()
+    loaded = [cls.from_dynamo_item(item) for item in items]
+    results['decode_dynamo'] = _rate(count, time.perf_counter() - started)
+    started = time.perf_counter()
+    for record in loaded:
+        record.to_dynamo_item()
+    results['encode_dynamo'] = _rate(count, time.perf_counter() - started)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark model decode/encode for many records')
+    parser.add_argument('--records', default='1m', help='records per model, e.g. 100k or 1m')
+    parser.add_argument('--models', default=','.join(MODELS))
+    parser.add_argument('--out', help='write results to this JSON file')
+    args = parser.parse_args(argv)
+    count = parse_size(args.records)
+
+    results = {}
+    app = make_app('local', '/nonexistent')
+    with app.app_context():
+        for name in args.models.split(','):
+            results[name] = bench_model(name, count)
+            stats = results[name]
+            print(f"{name:<11} decode json {stats['decode_json']['records_per_sec']:>9}/s   "
+                  f"dynamo {stats['decode_dynamo']['records_per_sec']:>9}/s   "
+                  f"encode json {stats['encode_json']['records_per_sec']:>9}/s   "
+                  f"{stats['bytes_per_instance']:>5} bytes/instance")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'records': count, 'models': results}, f, indent=2)
+        print(f'\nResults written to {args.out}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+"""Model layer benchmarks: single-record saves and the lookups the routes use"""
+import random
+from legatera.models import User, Trustee, Message, Asset
+from .timing import measure
+
+def _targets(dataset, repeat, seed):
+    rng = random.Random(seed)
+    return [rng.randrange(dataset.size) for _ in range(repeat + 1)]
+
+def run(dataset, repeat):
+    """Time each model operation against a populated backend"""
+    picks = _targets(dataset, repeat, dataset.seed)
+    password_hash = User.get_by_id(dataset.user_ids[0]).password_hash
+    results = {}
+
+    results['User.get_by_id'] = measure(
+        lambda i: User.get_by_id(dataset.user_id(picks[i])), repeat)
+    results['User.get_by_email'] = measure(
+        lambda i: User.get_by_email(dataset.emails[picks[i]]), repeat)
+    results['Trustee.get_by_user_id'] = measure(
+        lambda i: Trustee.get_by_user_id(dataset.user_id(picks[i])), repeat)
+    results['Trustee.get_by_trustee_id'] = measure(
+        lambda i: Trustee.get_by_trustee_id(dataset.trustee_ids[picks[i]]), repeat)
+    results['Message.get_by_user_id'] = measure(
+        lambda i: Message.get_by_user_id(dataset.user_id(picks[i])), repeat)
+    results['Asset.get_by_user_id'] = measure(
+        lambda i: Asset.get_by_user_id(dataset.user_id(picks[i])), repeat)
+    results['Message.list_by_user_id'] = measure(
+        lambda i: Message.list_by_user_id(dataset.user_id(picks[i])), repeat)
+    results['Asset.list_by_user_id'] = measure(
+        lambda i: Asset.list_by_user_id(dataset.user_id(picks[i])), repeat)
+
+    def save_user(i):
+        user = User(f'bench-new-{i}@legatera-bench.example.com', first_name='New', last_name='User')
+        user.password_hash = password_hash
+        user.save()
+
+    results['User.save'] = measure(save_user, repeat)
+    results['Trustee.save'] = measure(
+        lambda i: Trustee(dataset.user_id(picks[i]), dataset.user_id(picks[i] + 1)).save(), repeat)
+    results['Message.save'] = measure(
+        lambda i: Message(dataset.user_id(picks[i]), dataset.user_id(picks[i] + 1),
+                          'A benchmark message about the family photo archive').save(), repeat)
+    results['Asset.save'] = measure(
+        lambda i: Asset(dataset.user_id(picks[i]), 'Benchmark asset', 'Savings account',
+                        'financial', '1250.50', 'Bank').save(), repeat)
+    return results
@@ -0,0 +1,38 @@
+"""Route benchmarks driven through the Flask test client"""
+from .datasets import PASSWORD
+from .timing import measure
+
+def _login(client, email):
+    response = client.post('/login', data={'email': email, 'password': PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f'Benchmark login failed with status {response.status_code}')
+    return response
+
+def _expect(response, status):
+    if response.status_code != status:
+        raise RuntimeError(f'{response.request.path} returned {response.status_code}, expected {status}')
+    return response
+
+def run(app, dataset, repeat):
+    """Time the login, dashboard and add-message round trips for one user"""
+    email = dataset.emails[dataset.size // 2]
+    user_id = dataset.user_ids[dataset.size // 2]
+    recipient = dataset.trustee_ids[dataset.size // 2]
+    results = {}
+
+    results['GET /login'] = measure(
+        lambda i: _expect(app.test_client().get('/login'), 200), repeat)
+    results['POST /login'] = measure(
+        lambda i: _login(app.test_client(), dataset.emails[i % dataset.size]), repeat)
+
+    client = app.test_client()
+    _login(client, email)
+    results['GET /user-dashboard'] = measure(
+        lambda i: _expect(client.get('/user-dashboard'), 200), repeat)
+    results['POST /add-message'] = measure(
+        lambda i: _expect(client.post('/add-message', data={
+            'recipient': recipient,
+            'content': f'Benchmark message {i} for {user_id}',
+            'delay_days': '0'
+        }), 302), repeat)
+    return results
@@ -0,0 +1,157 @@
+"""Dashboard throughput under sync workers and under the ASGI adapter
+
+    python -m benchmarks.bench_serving
+    python -m benchmarks.bench_serving --latency-ms 20 --requests 400 --concurrency 64 --out serving.json
+
+Both modes run in this process against the in-memory DynamoDB, with every
+table call delayed by --latency-ms to stand in for the network round trip.
+Sync mode is --sync-workers gunicorn sync workers: that many requests in
+flight, each holding its worker while it waits. ASGI mode sends
+--concurrency requests at a time through legatera.aio.AsgiAdapter on one
+event loop, as a single uvicorn worker would. The fragment cache is off so
+every request reaches the table.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+from legatera.aio import AsgiAdapter
+from . import datasets
+from .run import make_app, parse_size
+from .timing import percentile
+
+PATH = '/user-dashboard'
+
+class SlowTable:
+    """Delays every call on a table by a fixed latency"""
+
+    def __init__(self, table, latency):
+        self._table = table
+        self._latency = latency
+
+    def __getattr__(self, name):
+        attr = getattr(self._table, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+
+        def call(*args, **kwargs):
+            time.sleep(self._latency)
+            return attr(*args, **kwargs)
+        return call
+
+def _add_latency(app, latency):
+    resource = app.dynamodb
+    tables = {}
+
+    def table(name):
+        if name not in tables:
+            tables[name] = SlowTable(type(resource).Table(resource, name), latency)
+        return tables[name]
+    resource.Table = table
+
+def _session_cookie(app, email):
+    client = app.test_client()
+    response = client.post('/login', data={'email': email, 'password': datasets.PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f'Benchmark login failed with status {response.status_code}')
+    cookie = client.get_cookie(app.config.get('SESSION_COOKIE_NAME', 'session'))
+    return f'{cookie.key}={cookie.value}'
+
+def _summary(latencies, seconds):
+    latencies = [latency * 1000 for latency in latencies]
+    return {
+        'requests': len(latencies),
+        'seconds': round(seconds, 3),
+        'requests_per_sec': round(len(latencies) / seconds, 1),
+        'p50_ms': round(percentile(latencies, 0.5), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2)
+    }
+
+def bench_sync(app, cookie, requests, workers):
+    def call(_):
+        environ = EnvironBuilder(path=PATH, headers={'Cookie': cookie}).get_environ()
+        started = time.perf_counter()
+        app_iter, status, _ = run_wsgi_app(app, environ, buffered=True)
+        if not status.startswith('200'):
+            raise RuntimeError(f'{PATH} returned {status}')
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(call, range(requests)))
+    return _summary(latencies, time.perf_counter() - started)
+
+def bench_asgi(app, cookie, requests, concurrency):
+    adapter = AsgiAdapter(app)
+    scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http', 'path': PATH,
+             'query_string': b'', 'root_path': '', 'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+             'headers': [(b'cookie', cookie.encode())]}
+
+    async def call():
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        started = time.perf_counter()
+        await adapter(scope, receive, send)
+        if sent[0]['status'] != 200:
+            raise RuntimeError(f"{PATH} returned {sent[0]['status']}")
+        return time.perf_counter() - started
+
+    async def main():
+        slots = asyncio.Semaphore(concurrency)
+
+        async def limited():
+            async with slots:
+                return await call()
+        return await asyncio.gather(*(limited() for _ in range(requests)))
+
+    started = time.perf_counter()
+    latencies = asyncio.run(main())
+    return _summary(latencies, time.perf_counter() - started)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare dashboard throughput under sync and ASGI serving')
+    parser.add_argument('--size', default='1k', help='users in the dataset')
+    parser.add_argument('--latency-ms', type=float, default=10, help='delay added to every DynamoDB call')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--sync-workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=64, help='requests in flight under ASGI')
+    parser.add_argument('--out', help='write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='legatera-bench-') as workdir:
+        app = make_app('dynamodb', workdir)
+        app.config.update(FRAGMENT_CACHE='none', ASYNC_REQUEST_THREADS=args.concurrency)
+        with app.app_context():
+            dataset = datasets.load(parse_size(args.size))
+        cookie = _session_cookie(app, dataset.emails[dataset.size // 2])
+        _add_latency(app, args.latency_ms / 1000)
+
+        results = {
+            'latency_ms': args.latency_ms,
+            'sync': dict(bench_sync(app, cookie, args.requests, args.sync_workers), workers=args.sync_workers),
+            'asgi': dict(bench_asgi(app, cookie, args.requests, args.concurrency), concurrency=args.concurrency)
+        }
+    for mode in ('sync', 'asgi'):
+        stats = results[mode]
+        print(f"{mode:<5} {stats['requests_per_sec']:>8.1f} req/s   p50 {stats['p50_ms']:>8.2f} ms   "
+              f"p95 {stats['p95_ms']:>8.2f} ms")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResults written to {args.out}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
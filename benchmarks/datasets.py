@@ -0,0 +1,115 @@
+"""Deterministic synthetic datasets written straight into a storage backend
+
+Loading goes around the models on purpose: building a 1M-user fixture through
+``save()`` would take longer than the benchmark itself.
+"""
+import random
+from decimal import Decimal
+from flask import current_app
+from werkzeug.security import generate_password_hash
+from legatera.models import StorageModel, Asset, AssetSummary, Message, Trustee
+
+PASSWORD = 'benchmark-password'
+ASSET_TYPES = ['digital', 'financial', 'property', 'personal']
+WORDS = ('account bank letter photo house car savings pension crypto wallet note garden '
+         'family memory instructions password manager insurance policy deed will').split()
+
+class Dataset:
+    """Ids of the generated records, used to pick realistic lookup targets"""
+
+    def __init__(self, size, seed):
+        self.size = size
+        self.seed = seed
+        self.user_ids = []
+        self.emails = []
+        self.trustee_ids = []
+
+    def user_id(self, index):
+        return self.user_ids[index % len(self.user_ids)]
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def _user_record(index, password_hash, created_at):
+    user_id = f'bench-user-{index:07d}'
+    return {
+        'id': user_id,
+        'email': f'user{index}@legatera-bench.example.com',
+        'password_hash': password_hash,
+        'first_name': f'First{index}',
+        'last_name': f'Last{index}',
+        'is_trustee': False,
+        'created_at': created_at
+    }
+
+def generate(size, messages_per_user=3, assets_per_user=2, seed=1234):
+    """Yield (collection, record) pairs for ``size`` users and their data"""
+    rng = random.Random(seed)
+    # Hashing is deliberately slow, so every synthetic user shares one hash
+    password_hash = generate_password_hash(PASSWORD)
+    created_at = '2024-01-01T00:00:00'
+    for index in range(size):
+        user = _user_record(index, password_hash, created_at)
+        yield 'users', user
+        # Each user names the next one as trustee, so every user is also a trustee
+        trustee = Trustee(user['id'], f'bench-user-{(index + 1) % size:07d}')
+        trustee.id = f'{user["id"]}-trustee'
+        yield 'trustees', trustee
+        for number in range(messages_per_user):
+            message = Message(user['id'], trustee.trustee_user_id, _text(rng, 40),
+                              delay_days=rng.choice([0, 7, 30]))
+            message.id = f'{user["id"]}-message-{number}'
+            message.created_at = created_at
+            yield 'messages', message
+        summary = AssetSummary(user['id'])
+        for number in range(assets_per_user):
+            asset = Asset(user['id'], _text(rng, 3).title(), _text(rng, 12),
+                          rng.choice(ASSET_TYPES), Decimal(rng.randrange(100, 500000)) / 100,
+                          _text(rng, 2))
+            asset.id = f'{user["id"]}-asset-{number}'
+            summary.add(asset.summary_type, asset.value)
+            yield 'assets', asset
+        yield 'asset_summaries', summary
+
+def _local_load(records, dataset):
+    collections = {'users': [], 'trustees': [], 'messages': [], 'assets': []}
+    summaries = {}
+    for collection, record in records:
+        if collection == 'users':
+            collections['users'].append(record)
+            dataset.user_ids.append(record['id'])
+            dataset.emails.append(record['email'])
+        elif collection == 'asset_summaries':
+            summaries[record.user_id] = record.to_dict()
+        else:
+            if collection == 'trustees':
+                dataset.trustee_ids.append(record.trustee_user_id)
+            collections[collection].append(record.to_dict())
+    for collection, data in collections.items():
+        StorageModel._save_data(collection, data)
+    StorageModel._save_data('asset_summaries', summaries)
+
+def _dynamo_load(records, dataset):
+    table = current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE'])
+    for collection, record in records:
+        if collection == 'users':
+            dataset.user_ids.append(record['id'])
+            dataset.emails.append(record['email'])
+            item = {'PK': f'USER#{record["id"]}', 'SK': f'PROFILE#{record["id"]}', 'type': 'user', **record}
+        elif collection == 'asset_summaries':
+            item = record.to_dynamo_item()
+        else:
+            if collection == 'trustees':
+                dataset.trustee_ids.append(record.trustee_user_id)
+            item = record.to_dynamo_item()
+        table._store(item)
+
+def load(size, messages_per_user=3, assets_per_user=2, seed=1234):
+    """Populate the current app's backend and return the Dataset"""
+    dataset = Dataset(size, seed)
+    records = generate(size, messages_per_user, assets_per_user, seed)
+    if current_app.dynamodb:
+        _dynamo_load(records, dataset)
+    else:
+        _local_load(records, dataset)
+    return dataset
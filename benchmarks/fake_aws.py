@@ -0,0 +1,352 @@
+"""In-memory stand-ins for the DynamoDB resource and S3 client used by the models
+
+Only the expression forms that legatera issues are understood. Anything else
+raises, so a new query shape shows up as a benchmark failure rather than as
+silently wrong numbers.
+"""
+import io
+import re
+from botocore.exceptions import ClientError
+
+_CLAUSE_PATTERNS = [
+    ('begins_with', re.compile(r'^begins_with\(\s*(\S+?)\s*,\s*(:\w+)\s*\)$')),
+    ('exists', re.compile(r'^attribute_exists\(\s*(\S+?)\s*\)$')),
+    ('not_exists', re.compile(r'^attribute_not_exists\(\s*(\S+?)\s*\)$')),
+    ('in', re.compile(r'^(\S+)\s+IN\s+\((.+)\)$')),
+    ('compare', re.compile(r'^(\S+)\s*(=|<>|<=|>=|<|>)\s*(:\w+)$'))
+]
+_COMPARE = {
+    '=': lambda a, b: a == b,
+    '<>': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b
+}
+
+class ConditionalCheckFailed(ClientError):
+    """The ClientError boto3 raises when a write's condition does not hold"""
+
+    def __init__(self, operation):
+        super().__init__({'Error': {'Code': 'ConditionalCheckFailedException',
+                                    'Message': 'The conditional request failed'}}, operation)
+
+def _check_types(value):
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, dict):
+        for v in value.values():
+            _check_types(v)
+    elif isinstance(value, (list, set, tuple)):
+        for v in value:
+            _check_types(v)
+
+def _name(token, names):
+    return names[token] if token.startswith('#') else token
+
+def _compile_condition(expression, names, values):
+    """Compile an AND-joined condition into a predicate over items
+
+    A clause may itself be a parenthesised OR of simple clauses.
+    """
+    if not expression:
+        return lambda item: True
+    checks = []
+    for clause in re.split(r'\s+AND\s+', expression.strip()):
+        clause = clause.strip()
+        if clause.startswith('(') and clause.endswith(')'):
+            options = [_compile_condition(part, names, values)
+                       for part in re.split(r'\s+OR\s+', clause[1:-1])]
+            checks.append(lambda item, o=options: any(check(item) for check in o))
+            continue
+        for kind, pattern in _CLAUSE_PATTERNS:
+            match = pattern.match(clause)
+            if match:
+                break
+        else:
+            raise ValueError(f'Unsupported expression clause: {clause!r}')
+        if kind == 'begins_with':
+            attr, value = _name(match.group(1), names), values[match.group(2)]
+            checks.append(lambda item, a=attr, v=value: isinstance(item.get(a), str) and item[a].startswith(v))
+        elif kind == 'exists':
+            attr = _name(match.group(1), names)
+            checks.append(lambda item, a=attr: a in item)
+        elif kind == 'not_exists':
+            attr = _name(match.group(1), names)
+            checks.append(lambda item, a=attr: a not in item)
+        elif kind == 'in':
+            attr = _name(match.group(1), names)
+            options = [values[token.strip()] for token in match.group(2).split(',')]
+            checks.append(lambda item, a=attr, o=options: item.get(a) in o)
+        else:
+            attr, op, value = _name(match.group(1), names), match.group(2), values[match.group(3)]
+            checks.append(lambda item, a=attr, f=_COMPARE[op], v=value: f(item.get(a), v))
+    return lambda item: all(check(item) for check in checks)
+
+def _project(item, projection, names):
+    if not projection:
+        return dict(item)
+    attrs = [_name(token.strip(), names) for token in projection.split(',')]
+    return {a: item[a] for a in attrs if a in item}
+
+def _apply_update(item, expression, names, values):
+    for action, body in re.findall(r'(SET|ADD|REMOVE)\s+(.+?)(?=\s+(?:SET|ADD|REMOVE)\s+|$)', expression.strip()):
+        for part in (p.strip() for p in body.split(',')):
+            if action == 'SET':
+                target, source = (s.strip() for s in part.split('=', 1))
+                target = _name(target, names)
+                plus = re.match(r'^(\S+)\s*\+\s*(:\w+)$', source)
+                if plus:
+                    item[target] = item.get(_name(plus.group(1), names), 0) + values[plus.group(2)]
+                else:
+                    item[target] = values[source]
+            elif action == 'ADD':
+                target, source = part.split()
+                target = _name(target, names)
+                item[target] = item.get(target, 0) + values[source]
+            else:
+                item.pop(_name(part, names), None)
+
+def _item_size(item):
+    return sum(len(k) + len(str(v)) for k, v in item.items())
+
+def _with_capacity(response, kwargs, table_name, units):
+    if kwargs.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+        response['ConsumedCapacity'] = {'TableName': table_name, 'CapacityUnits': units}
+    return response
+
+def _write_units(item):
+    return float(-(-_item_size(item) // 1024))
+
+class FakeTable:
+    def __init__(self, resource, name, indexes=None):
+        self.resource = resource
+        self.name = name
+        self.items = {}
+        self.partitions = {}
+        # index name -> (hash attribute, range attribute)
+        self.indexes = indexes or {'CheckInIndex': ('checkin_bucket', 'last_seen')}
+        self.meta = type('Meta', (), {'client': resource.meta.client})()
+        self.calls = {}
+
+    def _count(self, operation):
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def _store(self, item):
+        key = (item['PK'], item['SK'])
+        self.items[key] = item
+        self.partitions.setdefault(item['PK'], {})[item['SK']] = item
+
+    def _delete(self, key):
+        item = self.items.pop(key, None)
+        if item is not None:
+            self.partitions.get(key[0], {}).pop(key[1], None)
+        return item
+
+    def _holds(self, key, condition, names, values):
+        """Whether a write's condition holds for the item stored under key"""
+        if not condition:
+            return True
+        return _compile_condition(condition, names or {}, values or {})(self.items.get(key) or {})
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, **kwargs):
+        self._count('PutItem')
+        _check_types(Item)
+        if not self._holds((Item['PK'], Item['SK']), ConditionExpression,
+                           ExpressionAttributeNames, ExpressionAttributeValues):
+            raise ConditionalCheckFailed('PutItem')
+        self._store(dict(Item))
+        return _with_capacity({}, kwargs, self.name, _write_units(Item))
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        self._count('GetItem')
+        item = self.items.get((Key['PK'], Key['SK']))
+        if item is None:
+            return _with_capacity({}, kwargs, self.name, 0.5)
+        return _with_capacity({'Item': _project(item, ProjectionExpression, ExpressionAttributeNames or {})},
+                              kwargs, self.name, 0.5 * -(-_item_size(item) // 4096))
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, **kwargs):
+        self._count('DeleteItem')
+        if not self._holds((Key['PK'], Key['SK']), ConditionExpression,
+                           ExpressionAttributeNames, ExpressionAttributeValues):
+            raise ConditionalCheckFailed('DeleteItem')
+        self._delete((Key['PK'], Key['SK']))
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ConditionExpression=None, ReturnValues=None, **kwargs):
+        self._count('UpdateItem')
+        names, values = ExpressionAttributeNames or {}, ExpressionAttributeValues or {}
+        _check_types(values)
+        if not self._holds((Key['PK'], Key['SK']), ConditionExpression, names, values):
+            raise ConditionalCheckFailed('UpdateItem')
+        existing = self.items.get((Key['PK'], Key['SK']))
+        item = dict(existing) if existing else dict(Key)
+        _apply_update(item, UpdateExpression, names, values)
+        self._store(item)
+        return _with_capacity({'Attributes': dict(item)} if ReturnValues else {}, kwargs, self.name,
+                              _write_units(item))
+
+    def _page(self, candidates, kwargs):
+        names = kwargs.get('ExpressionAttributeNames') or {}
+        values = kwargs.get('ExpressionAttributeValues') or {}
+        matches = _compile_condition(kwargs.get('FilterExpression'), names, values)
+        limit = kwargs.get('Limit')
+        start = kwargs.get('ExclusiveStartKey')
+        if start:
+            start = (start['PK'], start['SK'])
+            position = next((i for i, item in enumerate(candidates) if (item['PK'], item['SK']) == start), -1)
+            candidates = candidates[position + 1:]
+        evaluated = candidates[:limit] if limit else candidates
+        result = {
+            'Items': [_project(item, kwargs.get('ProjectionExpression'), names)
+                      for item in evaluated if matches(item)],
+            'ScannedCount': len(evaluated)
+        }
+        result['Count'] = len(result['Items'])
+        if limit and len(candidates) > limit:
+            last = evaluated[-1]
+            result['LastEvaluatedKey'] = {'PK': last['PK'], 'SK': last['SK']}
+        if kwargs.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            size = sum(_item_size(item) for item in evaluated)
+            result['ConsumedCapacity'] = {'TableName': self.name,
+                                          'CapacityUnits': max(0.5, size / 8192)}
+        return result
+
+    def query(self, KeyConditionExpression, IndexName=None, ScanIndexForward=True, **kwargs):
+        self._count('Query')
+        names = kwargs.get('ExpressionAttributeNames') or {}
+        values = kwargs.get('ExpressionAttributeValues') or {}
+        key_matches = _compile_condition(KeyConditionExpression, names, values)
+        hash_clause = re.split(r'\s+AND\s+', KeyConditionExpression)[0]
+        hash_attr, hash_value = (s.strip() for s in hash_clause.split('='))
+        hash_attr, hash_value = _name(hash_attr, names), values[hash_value]
+        if IndexName:
+            _, range_attr = self.indexes[IndexName]
+            candidates = sorted((item for item in self.items.values()
+                                 if item.get(hash_attr) == hash_value and key_matches(item)),
+                                key=lambda item: (item.get(range_attr), item['PK'], item['SK']))
+        else:
+            partition = self.partitions.get(hash_value, {})
+            candidates = [partition[sk] for sk in sorted(partition) if key_matches(partition[sk])]
+        if not ScanIndexForward:
+            candidates.reverse()
+        return self._page(candidates, kwargs)
+
+    def scan(self, Segment=None, TotalSegments=None, **kwargs):
+        self._count('Scan')
+        candidates = list(self.items.values())
+        if TotalSegments:
+            candidates = [item for item in candidates if hash(item['PK']) % TotalSegments == Segment]
+        return self._page(candidates, kwargs)
+
+class FakeDynamoClient:
+    def __init__(self, resource):
+        self.resource = resource
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        """Check every condition first, then apply all the writes or none, as DynamoDB does"""
+        writes, reasons, keys = [], [], set()
+        for entry in TransactItems:
+            (operation, request), = entry.items()
+            if operation not in ('Put', 'Update', 'Delete', 'ConditionCheck'):
+                raise ValueError(f'Unsupported transaction operation: {operation}')
+            table = self.resource.Table(request['TableName'])
+            key = request['Item'] if operation == 'Put' else request['Key']
+            key = (key['PK'], key['SK'])
+            if (table.name, key) in keys:
+                raise ClientError({'Error': {'Code': 'ValidationException',
+                                             'Message': 'Transaction request cannot include multiple '
+                                                        'operations on one item'}}, 'TransactWriteItems')
+            keys.add((table.name, key))
+            if table._holds(key, request.get('ConditionExpression'), request.get('ExpressionAttributeNames'),
+                            request.get('ExpressionAttributeValues')):
+                reasons.append({'Code': 'None'})
+            else:
+                reasons.append({'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'})
+            params = {k: v for k, v in request.items() if k not in ('TableName', 'ConditionExpression')}
+            writes.append((operation, table, params))
+        if any(reason['Code'] != 'None' for reason in reasons):
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException',
+                                         'Message': 'Transaction cancelled'},
+                               'CancellationReasons': reasons}, 'TransactWriteItems')
+        for operation, table, params in writes:
+            if operation == 'Put':
+                table.put_item(**params)
+            elif operation == 'Update':
+                table.update_item(**params)
+            elif operation == 'Delete':
+                table.delete_item(**params)
+        return {}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        return self.resource.batch_write_item(RequestItems=RequestItems)
+
+class FakeDynamoDB:
+    """Stand-in for boto3.resource('dynamodb')"""
+
+    def __init__(self):
+        self.tables = {}
+        self.meta = type('Meta', (), {})()
+        self.meta.client = FakeDynamoClient(self)
+
+    def Table(self, name):
+        if name not in self.tables:
+            self.tables[name] = FakeTable(self, name)
+        return self.tables[name]
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        for name, requests in RequestItems.items():
+            table = self.Table(name)
+            table._count('BatchWriteItem')
+            for request in requests:
+                if 'PutRequest' in request:
+                    _check_types(request['PutRequest']['Item'])
+                    table._store(dict(request['PutRequest']['Item']))
+                else:
+                    key = request['DeleteRequest']['Key']
+                    table._delete((key['PK'], key['SK']))
+        return {'UnprocessedItems': {}}
+
+class FakeBody:
+    def __init__(self, data):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amount=None):
+        return self._stream.read(amount)
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self._stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+class FakeS3Client:
+    """Stand-in for boto3.client('s3') covering the calls legatera makes"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def head_bucket(self, Bucket):
+        return {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body if isinstance(Body, bytes) else Body.read()
+        return {}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, **kwargs):
+        self.objects[(Bucket, Key)] = Fileobj.read()
+
+    def get_object(self, Bucket, Key, **kwargs):
+        data = self.objects[(Bucket, Key)]
+        return {'Body': FakeBody(data), 'ContentLength': len(data)}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+__all__ = ['FakeDynamoDB', 'FakeS3Client', 'ConditionalCheckFailed']
@@ -0,0 +1,295 @@
+"""Load test the production gunicorn setup against local AWS stand-ins
+
+Starts moto_server for DynamoDB, S3 and Cognito, provisions the table, bucket,
+user pool and one account pair per virtual user, then launches gunicorn with
+the command from the Dockerfile and drives scripted journeys at the requested
+concurrency. Everything runs on one machine without network access.
+
+    pip install -r requirements-bench.txt
+    python -m benchmarks.loadtest --users 20 --duration 60 --out load.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from .timing import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'Loadtest-Passw0rd!'
+TABLE = 'legatera-loadtest'
+BUCKET = 'legatera-loadtest'
+# A 1x1 PNG is enough to exercise the media upload path
+MEDIA = bytes.fromhex('89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+                      '1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082')
+_CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+_RECIPIENT_RE = re.compile(r'<select[^>]*name="recipient"[^>]*>\s*<option[^>]*value="([^"]+)"')
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _wait_for(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{process.args[0]} exited with status {process.returncode}')
+        try:
+            requests.get(url, timeout=5)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f'Timed out waiting for {url}')
+
+def dockerfile_command(path=os.path.join(ROOT, 'Dockerfile')):
+    """Return the CMD of the Dockerfile so the test runs the shipped server config"""
+    with open(path) as f:
+        for line in f:
+            if line.startswith('CMD'):
+                return json.loads(line[len('CMD'):].strip())
+    raise RuntimeError(f'No CMD in {path}')
+
+def gunicorn_command(port, workers=None):
+    command = dockerfile_command()
+    command[0] = sys.executable
+    command = [f'--bind=127.0.0.1:{port}' if arg.startswith('--bind') else arg for arg in command]
+    if workers:
+        command = [f'--workers={workers}' if arg.startswith('--workers') else arg for arg in command]
+    return command
+
+def provision(endpoint, users):
+    """Create the AWS resources and one owner/trustee account pair per virtual user"""
+    import boto3
+    cognito = boto3.client('cognito-idp', region_name='us-east-1', endpoint_url=endpoint)
+    boto3.client('s3', region_name='us-east-1', endpoint_url=endpoint).create_bucket(Bucket=BUCKET)
+    pool_id = cognito.create_user_pool(PoolName='legatera-loadtest')['UserPool']['Id']
+    client_id = cognito.create_user_pool_client(
+        UserPoolId=pool_id, ClientName='legatera-loadtest',
+        ExplicitAuthFlows=['ALLOW_USER_PASSWORD_AUTH', 'ALLOW_REFRESH_TOKEN_AUTH']
+    )['UserPoolClient']['ClientId']
+    os.environ.update(COGNITO_USER_POOL_ID=pool_id, COGNITO_APP_CLIENT_ID=client_id)
+
+    # Config reads the environment when it is first imported, so import late
+    from werkzeug.security import generate_password_hash
+    from legatera import create_app
+    from legatera.cli import db_init
+    from legatera.models import User, Trustee
+
+    app = create_app()
+    app.test_cli_runner().invoke(db_init)
+    password_hash = generate_password_hash(PASSWORD)
+    accounts = []
+    with app.app_context():
+        for index in range(users):
+            owner = User(f'owner{index}@loadtest.example.com', first_name='Owner', last_name=str(index))
+            trustee = User(f'trustee{index}@loadtest.example.com', first_name='Trustee', last_name=str(index),
+                           is_trustee=True)
+            for user in (owner, trustee):
+                user.password_hash = password_hash
+                user.save()
+            cognito.admin_create_user(UserPoolId=pool_id, Username=owner.email, MessageAction='SUPPRESS')
+            cognito.admin_set_user_password(UserPoolId=pool_id, Username=owner.email,
+                                            Password=PASSWORD, Permanent=True)
+            Trustee(owner.id, trustee.id).save()
+            accounts.append((owner.email, trustee.email))
+    return accounts
+
+class Recorder:
+    """Thread-safe latency samples keyed by endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, name, seconds, ok):
+        with self._lock:
+            self.samples[name].append(seconds * 1000)
+            if not ok:
+                self.errors[name] += 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for name, samples in sorted(self.samples.items()):
+            endpoints[name] = {
+                'requests': len(samples),
+                'errors': self.errors[name],
+                'p50_ms': round(percentile(samples, 0.50), 2),
+                'p95_ms': round(percentile(samples, 0.95), 2),
+                'p99_ms': round(percentile(samples, 0.99), 2),
+                'max_ms': round(max(samples), 2),
+                'throughput_rps': round(len(samples) / elapsed, 2)
+            }
+        total = sum(len(s) for s in self.samples.values())
+        return {
+            'elapsed_seconds': round(elapsed, 2),
+            'requests': total,
+            'errors': sum(self.errors.values()),
+            'throughput_rps': round(total / elapsed, 2),
+            'endpoints': endpoints
+        }
+
+class VirtualUser:
+    def __init__(self, base_url, recorder, account, index):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.owner_email, self.trustee_email = account
+        self.index = index
+        self.iteration = 0
+
+    def request(self, session, method, path, expect, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, self.base_url + path, allow_redirects=False,
+                                       timeout=30, **kwargs)
+        except requests.RequestException:
+            self.recorder.add(f'{method} {path.split("?")[0]}', time.perf_counter() - started, False)
+            return None
+        ok = response.status_code == expect
+        self.recorder.add(f'{method} {path.split("?")[0]}', time.perf_counter() - started, ok)
+        return response if ok else None
+
+    def _form(self, session, path):
+        response = self.request(session, 'GET', path, 200)
+        match = _CSRF_RE.search(response.text) if response is not None else None
+        return (match.group(1), response.text) if match else (None, None)
+
+    def register(self):
+        session = requests.Session()
+        token, _ = self._form(session, '/register')
+        if token:
+            email = f'new-{self.index}-{self.iteration}-{os.getpid()}@loadtest.example.com'
+            self.request(session, 'POST', '/register', 302, data={
+                'csrf_token': token, 'email': email, 'password': PASSWORD, 'confirm_password': PASSWORD,
+                'first_name': 'Load', 'last_name': 'Test'})
+
+    def owner(self):
+        session = requests.Session()
+        token, _ = self._form(session, '/login')
+        if not token or self.request(session, 'POST', '/login', 302, data={
+                'csrf_token': token, 'email': self.owner_email, 'password': PASSWORD}) is None:
+            return
+        self.request(session, 'GET', '/user-dashboard', 200)
+        token, page = self._form(session, '/add-message')
+        recipient = _RECIPIENT_RE.search(page or '')
+        if token and recipient:
+            self.request(session, 'POST', '/add-message', 302, data={
+                'csrf_token': token, 'recipient': recipient.group(1), 'delay_days': '0',
+                'content': f'Load test message {self.iteration} from virtual user {self.index}'
+            }, files={'media': (f'photo-{self.iteration}.png', MEDIA, 'image/png')})
+        self.request(session, 'GET', '/logout', 302)
+
+    def trustee(self):
+        session = requests.Session()
+        token, _ = self._form(session, '/trustee-login')
+        if not token or self.request(session, 'POST', '/trustee-login', 302, data={
+                'csrf_token': token, 'email': self.trustee_email, 'password': PASSWORD}) is None:
+            return
+        self.request(session, 'GET', '/trustee-dashboard', 200)
+        self.request(session, 'GET', '/logout', 302)
+
+    def run(self, deadline, mix, seed):
+        rng = random.Random(seed)
+        journeys, weights = zip(*mix.items())
+        while time.monotonic() < deadline:
+            getattr(self, rng.choices(journeys, weights)[0])()
+            self.iteration += 1
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('register', 'owner', 'trustee'):
+            raise argparse.ArgumentTypeError(f'unknown journey {name!r}')
+        mix[name] = float(weight or 1)
+    return mix
+
+def print_report(report):
+    print(f"\n{report['requests']} requests in {report['elapsed_seconds']}s, "
+          f"{report['throughput_rps']} req/s, {report['errors']} errors")
+    print(f"  {'endpoint':<26}{'reqs':>7}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    for name, stats in report['endpoints'].items():
+        print(f"  {name:<26}{stats['requests']:>7}{stats['errors']:>6}{stats['p50_ms']:>10.1f}"
+              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['throughput_rps']:>9.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test Legatera under gunicorn with local AWS stand-ins')
+    parser.add_argument('--users', type=int, default=10, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load after ramp-up starts')
+    parser.add_argument('--ramp-up', type=float, default=5, help='seconds over which users are started')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('register=1,owner=3,trustee=1'),
+                        help='journey weights, e.g. register=1,owner=3,trustee=1')
+    parser.add_argument('--workers', type=int, help='override the Dockerfile worker count')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--out', help='write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='legatera-load-')
+    aws_port, app_port = _free_port(), _free_port()
+    endpoint = f'http://127.0.0.1:{aws_port}'
+    os.environ.update(
+        AWS_ACCESS_KEY_ID='testing', AWS_SECRET_ACCESS_KEY='testing', AWS_DEFAULT_REGION='us-east-1',
+        AWS_ENDPOINT_URL=endpoint, DYNAMODB_TABLE=TABLE, S3_BUCKET=BUCKET,
+        SECRET_KEY='loadtest-secret', STORAGE_DIR=os.path.join(workdir, 'storage'),
+        METRICS_DIR=os.path.join(workdir, 'metrics'), METRICS_REQUEST_LOG='false'
+    )
+    processes = []
+    try:
+        moto = subprocess.Popen([sys.executable, '-m', 'moto.server', '-p', str(aws_port)],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        processes.append(moto)
+        _wait_for(endpoint, moto)
+        print(f'moto_server on {endpoint}; provisioning {args.users} account pairs')
+        accounts = provision(endpoint, args.users)
+
+        command = gunicorn_command(app_port, args.workers)
+        print('Starting', ' '.join(command[1:]))
+        with open(os.path.join(workdir, 'gunicorn.log'), 'w') as log:
+            server = subprocess.Popen(command, cwd=ROOT, env=os.environ.copy(), stdout=log, stderr=log)
+        processes.append(server)
+        base_url = f'http://127.0.0.1:{app_port}'
+        _wait_for(base_url + '/', server)
+
+        recorder = Recorder()
+        started = time.monotonic()
+        deadline = started + args.duration
+        threads = []
+        for index in range(args.users):
+            vu = VirtualUser(base_url, recorder, accounts[index], index)
+            thread = threading.Thread(target=vu.run, args=(deadline, args.mix, args.seed + index), daemon=True)
+            thread.start()
+            threads.append(thread)
+            time.sleep(args.ramp_up / args.users)
+        for thread in threads:
+            thread.join()
+        report = recorder.report(time.monotonic() - started)
+        report['config'] = {'users': args.users, 'duration': args.duration, 'ramp_up': args.ramp_up,
+                            'mix': args.mix, 'command': command[1:]}
+        print_report(report)
+        print(f'Server log: {os.path.join(workdir, "gunicorn.log")}')
+        if args.out:
+            with open(args.out, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f'Report written to {args.out}')
+        return 1 if report['errors'] else 0
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""Run the model and route benchmarks and compare against a saved baseline
+
+    python -m benchmarks.run --sizes 1k,10k --backends local,dynamodb --out results.json
+    python -m benchmarks.run --sizes 10k --compare results.json --threshold 0.25
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from legatera import create_app
+from . import bench_models, bench_routes, datasets
+from .fake_aws import FakeDynamoDB
+
+BACKENDS = ('local', 'dynamodb')
+SUFFIXES = {'k': 1000, 'm': 1000000}
+
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1:] in SUFFIXES:
+        return int(float(text[:-1]) * SUFFIXES[text[-1]])
+    return int(text)
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def make_app(backend, workdir):
+    app = create_app()
+    app.config.update(
+        STORAGE_DIR=os.path.join(workdir, 'storage'),
+        SEARCH_INDEX_DIR=os.path.join(workdir, 'search'),
+        WTF_CSRF_ENABLED=False,
+        METRICS_REQUEST_LOG=False,
+        PROFILE_SAMPLE_RATE=0
+    )
+    app.logger.setLevel(logging.WARNING)
+    app.cognito_client = None
+    app.s3_client = None
+    app.dynamodb = FakeDynamoDB() if backend == 'dynamodb' else None
+    return app
+
+def run_case(backend, size, args):
+    with tempfile.TemporaryDirectory(prefix='legatera-bench-') as workdir:
+        app = make_app(backend, workdir)
+        with app.app_context():
+            started = time.perf_counter()
+            dataset = datasets.load(size, args.messages_per_user, args.assets_per_user, args.seed)
+            case = {'backend': backend, 'size': size,
+                    'load_seconds': round(time.perf_counter() - started, 3)}
+            if 'models' in args.suites:
+                case['models'] = bench_models.run(dataset, args.repeat)
+        if 'routes' in args.suites:
+            case['routes'] = bench_routes.run(app, dataset, args.repeat)
+    return case
+
+def compare(results, baseline, threshold):
+    """Return (case, operation, baseline ms, current ms) for every median that regressed"""
+    regressions = []
+    for case_name, case in results['cases'].items():
+        base_case = baseline.get('cases', {}).get(case_name)
+        if not base_case:
+            continue
+        for suite in ('models', 'routes'):
+            for operation, stats in case.get(suite, {}).items():
+                base = base_case.get(suite, {}).get(operation)
+                if base and stats['median_ms'] > base['median_ms'] * (1 + threshold):
+                    regressions.append((case_name, operation, base['median_ms'], stats['median_ms']))
+    return regressions
+
+def print_case(name, case):
+    print(f"\n{name}  (dataset load {case['load_seconds']}s)")
+    for suite in ('models', 'routes'):
+        for operation, stats in case.get(suite, {}).items():
+            print(f"  {operation:<28} median {stats['median_ms']:>10.3f} ms   "
+                  f"p95 {stats['p95_ms']:>10.3f} ms   {stats['ops_per_sec'] or 0:>10.1f} ops/s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Legatera model layer and routes')
+    parser.add_argument('--sizes', default='1k,10k', help='comma-separated user counts, e.g. 1k,100k,1m')
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--suites', default='models,routes')
+    parser.add_argument('--repeat', type=int, default=20, help='timed calls per operation')
+    parser.add_argument('--messages-per-user', type=int, default=3)
+    parser.add_argument('--assets-per-user', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--out', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file from an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed median slowdown before a regression is reported (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+    args.suites = set(args.suites.split(','))
+
+    results = {
+        'meta': {
+            'started_at': datetime.utcnow().isoformat(),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'messages_per_user': args.messages_per_user,
+            'assets_per_user': args.assets_per_user,
+            'seed': args.seed
+        },
+        'cases': {}
+    }
+    for backend in args.backends.split(','):
+        if backend not in BACKENDS:
+            parser.error(f'unknown backend {backend!r}')
+        for size in map(parse_size, args.sizes.split(',')):
+            name = f'{backend}/{size}'
+            results['cases'][name] = run_case(backend, size, args)
+            print_case(name, results['cases'][name])
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResults written to {args.out}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for case_name, operation, before, after in regressions:
+            print(f'REGRESSION {case_name} {operation}: {before:.3f} ms -> {after:.3f} ms')
+        if regressions:
+            return 1
+        print('No regressions against baseline.')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import statistics
+import time
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def measure(func, repeat, warmup=1):
+    """Call func(i) repeat times and summarise the latencies in milliseconds"""
+    for index in range(warmup):
+        func(index)
+    samples = []
+    for index in range(repeat):
+        start = time.perf_counter()
+        func(warmup + index)
+        samples.append((time.perf_counter() - start) * 1000)
+    total = sum(samples)
+    return {
+        'repeat': repeat,
+        'mean_ms': round(statistics.fmean(samples), 4),
+        'median_ms': round(statistics.median(samples), 4),
+        'p95_ms': round(percentile(samples, 0.95), 4),
+        'min_ms': round(min(samples), 4),
+        'max_ms': round(max(samples), 4),
+        'ops_per_sec': round(repeat / (total / 1000), 2) if total else None
+    }
@@ -0,0 +1,8 @@
+"""Gunicorn hooks; the bind address and worker count are on the command line"""
+
+def post_worker_init(worker):
+    # Compile templates and serve the public pages once before this worker
+    # accepts connections, so restarts do not slow the first requests down
+    from legatera.templating import warm_up
+    # Under the ASGI worker the loaded app is the adapter around the Flask app
+    warm_up(getattr(worker.wsgi, 'flask_app', worker.wsgi))
@@ -23,5 +23,11 @@ setup(
         'cryptography==41.0.3',
         'PyJWT==2.8.0'
     ],
+    extras_require={
+        # Brotli responses and .br static files; gzip is used without it
+        'brotli': ['Brotli==1.1.0'],
+        # The uvicorn worker that serves legatera.asgi
+        'asgi': ['uvicorn==0.23.2'],
+    },
     python_requires='>=3.9',
 )
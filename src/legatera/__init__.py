@@ -2,25 +2,42 @@ from flask import Flask
 from flask_login import LoginManager
 from flask_mail import Mail
 from .config import Config
-import boto3
-from botocore.exceptions import ClientError
 import os
+import threading
+
+login_manager = LoginManager()
+mail = Mail()
 
 def init_aws_clients():
-    """Initialize AWS clients with error handling"""
+    """Initialize AWS clients with error handling
+
+    boto3 costs ~100ms to import, so the clients are stand-ins that import it
+    and build the real client or resource on first use.
+    """
     try:
         if os.getenv('AWS_ACCESS_KEY_ID') and os.getenv('AWS_SECRET_ACCESS_KEY'):
-            cognito_client = boto3.client('cognito-idp', region_name=Config.AWS_REGION)
-            dynamodb = boto3.resource('dynamodb', region_name=Config.AWS_REGION)
-            s3_client = boto3.client('s3', region_name=Config.AWS_REGION)
-            
-            # Try to create S3 bucket if it doesn't exist
-            try:
-                s3_client.head_bucket(Bucket=Config.S3_BUCKET)
-            except ClientError as e:
-                if e.response['Error']['Code'] == '404':
-                    s3_client.create_bucket(Bucket=Config.S3_BUCKET)
-            
+            from .aio import LazyClient, ThreadLocalResource
+
+            session = {}
+            session_lock = threading.Lock()
+
+            def build(kind, service):
+                # boto3 sessions are not thread-safe, so clients and resources are built one at a time
+                with session_lock:
+                    if not session:
+                        import boto3
+                        from botocore.config import Config as BotoConfig
+                        session['session'] = boto3.session.Session()
+                        session['config'] = BotoConfig(max_pool_connections=Config.AWS_MAX_POOL_CONNECTIONS)
+                    return getattr(session['session'], kind)(service, region_name=Config.AWS_REGION,
+                                                             endpoint_url=Config.AWS_ENDPOINT_URL,
+                                                             config=session['config'])
+
+            cognito_client = LazyClient(lambda: build('client', 'cognito-idp'))
+            # Clients are thread-safe but resources are not, so each request thread gets its own
+            dynamodb = ThreadLocalResource(lambda: build('resource', 'dynamodb'))
+            s3_client = LazyClient(lambda: build('client', 's3'))
+            s3_client.add_hook(_ensure_bucket)
             return cognito_client, dynamodb, s3_client
         else:
             print("AWS credentials not found. Running in development mode without AWS services.")
@@ -30,17 +47,27 @@ def init_aws_clients():
         print("Running in development mode without AWS services.")
         return None, None, None
 
+def _ensure_bucket(s3_client):
+    """Create the S3 bucket if it doesn't exist"""
+    from botocore.exceptions import ClientError
+    try:
+        s3_client.head_bucket(Bucket=Config.S3_BUCKET)
+    except ClientError as e:
+        if e.response['Error']['Code'] == '404':
+            s3_client.create_bucket(Bucket=Config.S3_BUCKET)
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    from . import templating
+    templating.init_app(app)
+
     # Initialize Flask extensions within app context
-    login_manager = LoginManager()
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message_category = 'info'
 
-    mail = Mail()
     mail.init_app(app)
 
     # Store extensions on app for access in views
@@ -51,9 +78,30 @@ def create_app():
     app.cognito_client, app.dynamodb, app.s3_client = init_aws_clients()
 
     # Register blueprints
-    from .routes import main, auth, dashboard
+    from .routes import main, auth, dashboard, admin, api
     app.register_blueprint(main)
     app.register_blueprint(auth)
     app.register_blueprint(dashboard)
+    app.register_blueprint(admin)
+    app.register_blueprint(api)
+
+    from . import assets
+    assets.init_app(app)
+
+    from . import cli
+    cli.init_app(app)
+
+    from . import metrics
+    from .models import User, Trustee, Message, Asset, LastWishes
+    metrics.init_app(app, model_classes=(User, Trustee, Message, Asset, LastWishes))
+
+    from . import profiling
+    profiling.init_app(app)
+
+    from . import compression
+    compression.init_app(app)
+
+    from . import aio
+    aio.init_app(app)
 
     return app
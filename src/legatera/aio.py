@@ -0,0 +1,290 @@
+"""Async serving: an ASGI adapter and awaitable storage and AWS calls
+
+AsgiAdapter serves the Flask app to an ASGI server (see asgi.py). The server
+accepts connections, reads request bodies and writes responses on its event
+loop, so a slow client holds no thread. Each request runs through the app on
+a pool of ASYNC_REQUEST_THREADS threads, so a process has that many requests
+in flight, each blocked on DynamoDB, S3 or Cognito, instead of one. Each
+thread gets its own DynamoDB resource (see ThreadLocalResource). The local
+JSON backend is not safe for concurrent writes, so without DynamoDB requests
+and awaited calls each run one at a time.
+
+boto3 has no async interface. Model methods and AWS operations are awaited
+through run(), which calls them on a separate pool of ASYNC_IO_THREADS
+threads, with the caller's Flask context:
+
+    trustees, assets = await asyncio.gather(Trustee.aio.get_by_user_id(user_id),
+                                            Asset.aio.list_by_user_id(user_id))
+    await message.aio.save()
+    await aio.s3('put_object', Bucket=bucket, Key=key, Body=data)
+
+async def views work under both the WSGI and ASGI servers; each request runs
+its view's coroutine on an event loop of its own.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+# Request bodies up to this size stay in memory; larger uploads spill to a temp file
+BODY_SPOOL_BYTES = 1024 * 1024
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool(name, size):
+    # Threads do not survive a fork, so every worker process builds its own pools
+    key = (name, os.getpid())
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f'legatera-{name}')
+    return pool
+
+def io_pool():
+    if not current_app.dynamodb:
+        # Local storage rewrites whole JSON files, so its calls must not overlap
+        return _pool('io-local', 1)
+    return _pool('io', current_app.config['ASYNC_IO_THREADS'])
+
+async def run(func, *args, **kwargs):
+    """Await func(*args, **kwargs) called on the IO pool with the caller's app and request context"""
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(io_pool(), call)
+
+class _AsyncProxy:
+    __slots__ = ('_target',)
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        return functools.partial(run, getattr(self._target, name))
+
+class AsyncMethods:
+    """Model.aio.method(...) and record.aio.method(...) return a coroutine running the method with run()"""
+
+    def __get__(self, instance, owner):
+        return _AsyncProxy(owner if instance is None else instance)
+
+async def s3(operation, **kwargs):
+    return await run(getattr(current_app.s3_client, operation), **kwargs)
+
+async def cognito(operation, **kwargs):
+    return await run(getattr(current_app.cognito_client, operation), **kwargs)
+
+async def upload_file(file, folder='general'):
+    from .routes import handle_file_upload
+    return await run(handle_file_upload, file, folder)
+
+class ThreadLocalResource:
+    """Stands in for a boto3 resource, building one per thread on first use
+
+    boto3 resources are not thread-safe, unlike its clients. factory is
+    called under a lock, so it may create them from one shared session.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._resources = []
+        self._hooks = []
+
+    def get(self):
+        resource = getattr(self._local, 'resource', None)
+        if resource is None:
+            with self._lock:
+                resource = self._local.resource = self._factory()
+                self._resources.append(resource)
+                for hook in self._hooks:
+                    hook(resource)
+        return resource
+
+    def add_hook(self, hook):
+        """Call hook(resource) on every resource, those built so far and each one built later"""
+        with self._lock:
+            self._hooks.append(hook)
+            for resource in self._resources:
+                hook(resource)
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+class LazyClient:
+    """Stands in for a boto3 client, building it on first use
+
+    Clients are thread-safe, so the one built is shared by every thread.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._client = None
+        self._hooks = []
+
+    def get(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    client = self._factory()
+                    for hook in self._hooks:
+                        hook(client)
+                    self._client = client
+                client = self._client
+        return client
+
+    def add_hook(self, hook):
+        """Call hook(client) on the client, now if it is built or else when it is"""
+        with self._lock:
+            self._hooks.append(hook)
+            if self._client is not None:
+                hook(self._client)
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+def async_to_sync(func):
+    """Flask hook running an async view to completion in the request's thread"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return asyncio.run(func(*args, **kwargs))
+    return wrapper
+
+def init_app(app):
+    # Replaces Flask's default, which needs asgiref
+    app.async_to_sync = async_to_sync
+
+def _environ(scope, body):
+    """The WSGI environ of an ASGI HTTP request"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        # The whole body is spooled, so chunked uploads without a Content-Length read to the end
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope.get('headers', ()):
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in environ:
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+    return environ
+
+class AsgiAdapter:
+    """ASGI application running a WSGI app on a bounded pool of request threads"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+
+    def request_pool(self):
+        if not self.flask_app.dynamodb:
+            # Concurrent requests would lose each other's writes to the local JSON files
+            return _pool('request-local', 1)
+        return _pool('request', self.flask_app.config['ASYNC_REQUEST_THREADS'])
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'websocket':
+            # Refusing the handshake makes the server answer 403
+            await receive()
+            await send({'type': 'websocket.close'})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_BYTES)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.request_pool(), self._run, _environ(scope, body), send, loop)
+        finally:
+            body.close()
+
+    def _run(self, environ, send, loop):
+        """Call the WSGI app in a request thread and hand each part of the response to the event loop"""
+        def emit(message):
+            # Waiting for each send applies the server's flow control to the app
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and response.get('started'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+            return write
+
+        def start():
+            if not response.get('started'):
+                response['started'] = True
+                emit({'type': 'http.response.start', 'status': response['status'],
+                      'headers': response['headers']})
+
+        def write(data):
+            start()
+            emit({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        app_iter = self.flask_app(environ, start_response)
+        try:
+            # One chunk is held back so the last goes out with more_body False
+            previous = None
+            for chunk in app_iter:
+                if not chunk:
+                    continue
+                if previous is not None:
+                    write(previous)
+                previous = chunk
+            start()
+            emit({'type': 'http.response.body', 'body': previous or b'', 'more_body': False})
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
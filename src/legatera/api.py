@@ -0,0 +1,103 @@
+"""Dashboard data as JSON, for pages that load it a piece at a time
+
+Collections are returned a page at a time along with an opaque cursor for the
+next page. The cursor wraps a DynamoDB ExclusiveStartKey or a local offset and
+is signed together with the user and collection it was issued for, so it
+cannot be edited or used against other data. ?fields=a,b picks the
+attributes returned (the id always is), and only those are read from
+storage. Bodies are serialized without whitespace.
+"""
+import json
+from flask import current_app, request
+from itsdangerous import BadSignature, URLSafeSerializer
+from .models import Trustee, Message, Asset, LastWishes, LISTING_FIELDS
+
+CURSOR_SALT = 'legatera-api-cursor'
+
+# Model, readable fields and the fields returned when none are asked for
+COLLECTIONS = {
+    'trustees': (Trustee, ('id', 'trustee_user_id', 'notification_triggered', 'triggered_at', 'version'),
+                 ('id', 'trustee_user_id', 'notification_triggered', 'triggered_at')),
+    'messages': (Message, ('id', 'recipient_id', 'content', 'content_preview', 'content_size', 'media_url',
+                           'delay_days', 'created_at', 'sent_at', 'release_at', 'version'),
+                 LISTING_FIELDS['messages']),
+    'assets': (Asset, ('id', 'name', 'description', 'asset_type', 'value', 'location', 'version'),
+               LISTING_FIELDS['assets'])
+}
+LAST_WISHES_FIELDS = ('id', 'funeral_preferences', 'special_requests', 'personal_message', 'updated_at', 'version')
+
+# An offloaded message body is fetched through the model, which needs its pointer and hash
+FIELD_DEPENDENCIES = {'content': ('content_ref', 'content_sha256')}
+
+class ApiError(Exception):
+    """A client error, reported as {"error": message} with the given status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def json_response(payload, status=200):
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False)
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=CURSOR_SALT)
+
+def encode_cursor(user_id, collection, start):
+    return _serializer().dumps([user_id, collection, start])
+
+def decode_cursor(cursor, user_id, collection):
+    try:
+        owner, name, start = _serializer().loads(cursor)
+    except (BadSignature, TypeError, ValueError):
+        raise ApiError(400, 'Invalid cursor.')
+    if owner != user_id or name != collection:
+        raise ApiError(400, 'Invalid cursor.')
+    return start
+
+def requested_fields(allowed, default):
+    """Fields named by ?fields=, validated against allowed, with the id first"""
+    value = request.args.get('fields')
+    if not value:
+        return tuple(default)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ApiError(400, f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(allowed)}.")
+    return ('id',) + tuple(dict.fromkeys(name for name in names if name != 'id'))
+
+def requested_limit():
+    config = current_app.config
+    try:
+        limit = int(request.args.get('limit', config['API_PAGE_SIZE']))
+    except ValueError:
+        raise ApiError(400, 'limit must be a number.')
+    return max(1, min(limit, config['API_MAX_PAGE_SIZE']))
+
+def _stored_fields(fields):
+    return tuple(dict.fromkeys(f for name in fields for f in (name,) + FIELD_DEPENDENCIES.get(name, ())))
+
+def serialize(record, fields):
+    data = record.to_dict()
+    item = {name: data[name] for name in fields}
+    if 'content' in item:
+        item['content'] = record.content
+    return item
+
+def collection_page(collection, user_id):
+    """One page of a user's collection and the cursor of the next, None after the last"""
+    model, allowed, default = COLLECTIONS[collection]
+    fields = requested_fields(allowed, default)
+    cursor = request.args.get('cursor')
+    start = decode_cursor(cursor, user_id, collection) if cursor else None
+    records, next_start = model.page_by_user_id(user_id, requested_limit(), start, _stored_fields(fields))
+    return {
+        'data': [serialize(record, fields) for record in records],
+        'next': encode_cursor(user_id, collection, next_start) if next_start is not None else None
+    }
+
+def last_wishes_record(user_id):
+    fields = requested_fields(LAST_WISHES_FIELDS, LAST_WISHES_FIELDS)
+    wishes = LastWishes.get_by_user_id(user_id)
+    return {'data': serialize(wishes, fields) if wishes else None}
@@ -0,0 +1,5 @@
+from . import create_app
+from .aio import AsgiAdapter
+
+# gunicorn -k uvicorn.workers.UvicornWorker --workers=4 --config=gunicorn.conf.py legatera.asgi:app
+app = AsgiAdapter(create_app())
@@ -0,0 +1,144 @@
+"""Fingerprinted, precompressed static files
+
+`flask assets-build` copies each file under the static folder to a name that
+embeds a hash of its content (css/styles.css -> css/styles.1a2b3c4d5e6f.css),
+writes .gz and, when the brotli package is installed, .br variants next to it,
+and records the mapping in manifest.json. While a manifest exists,
+url_for('static', ...) returns the fingerprinted names and they are served
+with a year-long immutable Cache-Control, as brotli or gzip when the client
+accepts it. Without one, static files are served by Flask as before.
+"""
+import functools
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from flask import request, send_file
+
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+# Below this the headers outweigh what compression saves
+MIN_COMPRESS_BYTES = 256
+# (content coding, file suffix), most preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def build_dir(app):
+    return app.config.get('STATIC_BUILD_DIR') or os.path.join(app.root_path, 'static-build')
+
+def fingerprint(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha.update(chunk)
+    return sha.hexdigest()[:12]
+
+def _compressors():
+    # mtime=0 keeps the .gz bytes, and so the ETag, identical across builds
+    compressors = {'.gz': lambda data: gzip.compress(data, 9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        return compressors
+    compressors['.br'] = lambda data: brotli.compress(data, quality=11)
+    return compressors
+
+def have_brotli():
+    return '.br' in _compressors()
+
+def build(source, target):
+    """Write fingerprinted copies of every file under source into target and return the manifest
+
+    Files from earlier builds are left in place, so pages still cached by
+    clients can load the assets they reference during a rollout.
+    """
+    compressors = _compressors()
+    manifest = {}
+    for dirpath, dirnames, filenames in os.walk(source):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, source).replace(os.sep, '/')
+            stem, ext = os.path.splitext(name)
+            built = f'{stem}.{fingerprint(path)}{ext}'
+            out = os.path.join(target, built)
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            shutil.copyfile(path, out)
+            manifest[name] = built
+            if ext.lower() not in COMPRESSIBLE:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < MIN_COMPRESS_BYTES:
+                continue
+            for suffix, compress in compressors.items():
+                compressed = compress(data)
+                if len(compressed) < len(data):
+                    with open(out + suffix, 'wb') as f:
+                        f.write(compressed)
+
+    os.makedirs(target, exist_ok=True)
+    # Written last and swapped in whole, so a running server never sees a partial build
+    tmp = os.path.join(target, MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(target, MANIFEST))
+    return manifest
+
+def load_manifest(directory):
+    """Return ({name: fingerprinted name}, {fingerprinted name: available encodings})"""
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}, {}
+    # Checked once here rather than with a stat per request
+    variants = {built: tuple((coding, suffix) for coding, suffix in ENCODINGS
+                             if os.path.exists(os.path.join(directory, built + suffix)))
+                for built in manifest.values()}
+    return manifest, variants
+
+def _assets(app):
+    # Loaded on first use, once STATIC_BUILD_DIR is final
+    assets = getattr(app, 'static_assets', None)
+    if assets is None:
+        assets = app.static_assets = load_manifest(build_dir(app))
+    return assets
+
+def manifest(app):
+    """The {name: fingerprinted name} map in use, empty when nothing was built"""
+    return _assets(app)[0]
+
+def _url_defaults(app, endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        names = _assets(app)[0]
+        values['filename'] = names.get(values['filename'], values['filename'])
+
+def _send_static(app, filename):
+    encodings = _assets(app)[1].get(filename)
+    if encodings is None:
+        # Names missing from the manifest are served and revalidated as before
+        return app.send_static_file(filename)
+
+    path = os.path.join(build_dir(app), filename)
+    coding = None
+    for candidate, suffix in encodings:
+        if request.accept_encodings.quality(candidate) > 0:
+            coding, path = candidate, path + suffix
+            break
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_file(path, mimetype=mimetype, max_age=app.config['STATIC_MAX_AGE'], conditional=True)
+    if coding:
+        response.headers['Content-Encoding'] = coding
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+def init_app(app):
+    """Point url_for('static') and the static route at the fingerprinted build"""
+    if 'static' not in app.view_functions:
+        return
+    app.url_defaults(functools.partial(_url_defaults, app))
+    app.view_functions['static'] = functools.partial(_send_static, app)
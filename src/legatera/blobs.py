@@ -0,0 +1,62 @@
+import hashlib
+import os
+import zlib
+from flask import current_app
+
+class BlobIntegrityError(Exception):
+    """Raised when a stored blob does not match the hash recorded for it"""
+
+def _local_dir():
+    storage_dir = current_app.config.get('STORAGE_DIR') or os.path.join(current_app.root_path, 'storage')
+    return current_app.config.get('BLOB_DIR') or os.path.join(storage_dir, 'blobs')
+
+def _local_path(key):
+    root = os.path.realpath(_local_dir())
+    path = os.path.realpath(os.path.join(root, key))
+    if not path.startswith(root + os.sep):
+        raise ValueError(f"Blob key outside blob directory: {key}")
+    return path
+
+def put(key, data):
+    """Store bytes under key in S3, or in the local blob directory"""
+    if current_app.s3_client:
+        current_app.s3_client.put_object(Bucket=current_app.config['S3_BUCKET'], Key=key, Body=data,
+                                         ACL='private')
+        return
+    path = _local_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write beside the target and rename, so readers never see half a blob
+    with open(f'{path}.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(f'{path}.tmp', path)
+
+def get(key):
+    if current_app.s3_client:
+        response = current_app.s3_client.get_object(Bucket=current_app.config['S3_BUCKET'], Key=key)
+        return response['Body'].read()
+    with open(_local_path(key), 'rb') as f:
+        return f.read()
+
+def delete(key):
+    """Remove a blob; failures are logged, since an orphaned blob is harmless"""
+    try:
+        if current_app.s3_client:
+            current_app.s3_client.delete_object(Bucket=current_app.config['S3_BUCKET'], Key=key)
+        elif os.path.exists(_local_path(key)):
+            os.remove(_local_path(key))
+    except Exception as e:
+        current_app.logger.error(f"Blob delete error for {key}: {str(e)}")
+
+def text_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+def store_text(key, data):
+    """Compress UTF-8 encoded text and store it under key"""
+    put(key, zlib.compress(data, 6))
+
+def load_text(key, digest):
+    """Fetch, decompress and verify a text blob written by store_text"""
+    data = zlib.decompress(get(key))
+    if digest and text_digest(data) != digest:
+        raise BlobIntegrityError(f"Blob {key} does not match its recorded hash")
+    return data.decode('utf-8')
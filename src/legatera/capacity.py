@@ -0,0 +1,138 @@
+import sys
+import time
+from flask import current_app, has_request_context, request
+from . import metrics
+
+WRITE_OPERATIONS = {'put_item', 'update_item', 'delete_item', 'batch_write_item', 'transact_write_items'}
+
+# Request fields worth logging for a slow call; attribute values are left out
+# because they carry emails and message text
+_LOGGED_FIELDS = ('IndexName', 'Key', 'KeyConditionExpression', 'FilterExpression',
+                  'ProjectionExpression', 'UpdateExpression', 'ConditionExpression')
+
+def _caller():
+    """Name the model method that issued the call, skipping private helpers"""
+    frame = sys._getframe(3)
+    fallback = None
+    for _ in range(8):
+        if frame is None:
+            break
+        code = frame.f_code
+        name = getattr(code, 'co_qualname', code.co_name).split('.<locals>')[0]
+        if not frame.f_globals.get('__name__', '').startswith(__name__):
+            fallback = fallback or name
+            if not name.rsplit('.', 1)[-1].startswith('_'):
+                return name
+        frame = frame.f_back
+    return fallback or 'unknown'
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'cli'
+
+def _units(consumed):
+    """Total capacity units from a ConsumedCapacity entry or list of entries"""
+    if not consumed:
+        return 0.0
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return float(sum(entry.get('CapacityUnits', 0) for entry in consumed))
+
+def record(operation, params, response, seconds, caller=None):
+    """Attribute the capacity of one DynamoDB call to its caller and route"""
+    units = _units(response.get('ConsumedCapacity'))
+    kind = 'write' if operation in WRITE_OPERATIONS else 'read'
+    caller = caller or _caller()
+    labels = {'endpoint': _endpoint(), 'caller': caller, 'operation': operation}
+    metrics.registry.inc('legatera_dynamodb_calls_total', labels)
+    metrics.registry.inc('legatera_dynamodb_capacity_units_total', dict(labels, kind=kind), units)
+    metrics.record_capacity(kind, units)
+
+    config = current_app.config
+    if seconds * 1000 >= config['DYNAMODB_SLOW_CALL_MS'] or units >= config['DYNAMODB_SLOW_CALL_UNITS']:
+        details = [f'{seconds * 1000:.1f}ms', f'{units:g} {kind} units']
+        if 'ScannedCount' in response:
+            details.append(f"scanned={response['ScannedCount']} returned={response.get('Count')}")
+        details.extend(f'{field}={params[field]!r}' for field in _LOGGED_FIELDS if field in params)
+        current_app.logger.warning(
+            f"Slow DynamoDB {operation} from {caller} ({labels['endpoint']}): {' '.join(details)}"
+        )
+
+class TrackedTable:
+    """Table handle that requests consumed capacity on every call and records it"""
+
+    def __init__(self, table):
+        self._table = table
+
+    def __getattr__(self, name):
+        return getattr(self._table, name)
+
+    def _call(self, operation, method, kwargs):
+        if not current_app.config['DYNAMODB_CAPACITY_TRACKING']:
+            return method(**kwargs)
+        kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+        started = time.perf_counter()
+        response = method(**kwargs)
+        record(operation, kwargs, response, time.perf_counter() - started)
+        return response
+
+    def get_item(self, **kwargs):
+        return self._call('get_item', self._table.get_item, kwargs)
+
+    def put_item(self, **kwargs):
+        return self._call('put_item', self._table.put_item, kwargs)
+
+    def update_item(self, **kwargs):
+        return self._call('update_item', self._table.update_item, kwargs)
+
+    def delete_item(self, **kwargs):
+        return self._call('delete_item', self._table.delete_item, kwargs)
+
+    def query(self, **kwargs):
+        return self._call('query', self._table.query, kwargs)
+
+    def scan(self, **kwargs):
+        return self._call('scan', self._table.scan, kwargs)
+
+    def transact_write_items(self, **kwargs):
+        return self._call('transact_write_items', self._table.meta.client.transact_write_items, kwargs)
+
+def batch_write_item(**kwargs):
+    """BatchWriteItem through the app's resource, with capacity accounting"""
+    if not current_app.config['DYNAMODB_CAPACITY_TRACKING']:
+        return current_app.dynamodb.batch_write_item(**kwargs)
+    kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+    started = time.perf_counter()
+    response = current_app.dynamodb.batch_write_item(**kwargs)
+    record('batch_write_item', kwargs, response, time.perf_counter() - started)
+    return response
+
+def capacity_report(source):
+    """Group recorded capacity by route, then by calling method and operation"""
+    routes = {}
+    for (name, labels), value in source.counters.items():
+        if name not in ('legatera_dynamodb_calls_total', 'legatera_dynamodb_capacity_units_total'):
+            continue
+        labels = dict(labels)
+        route = routes.setdefault(labels['endpoint'], {'calls': 0, 'read_units': 0.0, 'write_units': 0.0,
+                                                       'callers': {}})
+        key = (labels['caller'], labels['operation'])
+        caller = route['callers'].setdefault(key, {'caller': key[0], 'operation': key[1], 'calls': 0,
+                                                   'read_units': 0.0, 'write_units': 0.0})
+        if name == 'legatera_dynamodb_calls_total':
+            route['calls'] += value
+            caller['calls'] += value
+        else:
+            field = f"{labels['kind']}_units"
+            route[field] += value
+            caller[field] += value
+
+    def total(entry):
+        return entry['read_units'] + entry['write_units']
+
+    report = []
+    for endpoint, route in routes.items():
+        callers = sorted(route.pop('callers').values(), key=total, reverse=True)
+        report.append({'endpoint': endpoint, **route, 'callers': callers})
+    return sorted(report, key=total, reverse=True)
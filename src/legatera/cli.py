@@ -0,0 +1,420 @@
+import click
+import threading
+from collections import Counter
+from datetime import datetime
+from flask import current_app
+from flask.cli import with_appcontext
+from decimal import Decimal
+from .models import (StorageModel, Trustee, Message, Asset, AssetSummary, LastWishes, CHECKIN_INDEX,
+                     LAST_WISHES_SK, bump_data_version, checkin_bucket)
+
+@click.command('db-init')
+@with_appcontext
+def db_init():
+    """Create the DynamoDB table and its indexes, or the local storage directory"""
+    if not current_app.dynamodb:
+        click.echo(f"Using local storage in {StorageModel._get_storage_dir()}")
+        return
+
+    from botocore.exceptions import ClientError
+    table_name = current_app.config['DYNAMODB_TABLE']
+    try:
+        table = current_app.dynamodb.create_table(
+            TableName=table_name,
+            KeySchema=[
+                {'AttributeName': 'PK', 'KeyType': 'HASH'},
+                {'AttributeName': 'SK', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'PK', 'AttributeType': 'S'},
+                {'AttributeName': 'SK', 'AttributeType': 'S'},
+                {'AttributeName': 'checkin_bucket', 'AttributeType': 'S'},
+                {'AttributeName': 'last_seen', 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': CHECKIN_INDEX,
+                'KeySchema': [
+                    {'AttributeName': 'checkin_bucket', 'KeyType': 'HASH'},
+                    {'AttributeName': 'last_seen', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['id']}
+            }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        table.wait_until_exists()
+        click.echo(f"Created table {table_name}")
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceInUseException':
+            raise
+        click.echo(f"Table {table_name} already exists")
+
+@click.command('sweep-inactive')
+@click.option('--days', type=int, default=None, help='Inactivity threshold in days.')
+@with_appcontext
+def sweep_inactive_command(days):
+    """Report users who stopped checking in, resuming from the last checkpoint"""
+    from .inactivity import sweep_inactive
+
+    def report(user_id, last_seen):
+        trustees = Trustee.get_by_user_id(user_id)
+        click.echo(f"{user_id}\tlast seen {last_seen}\t{len(trustees)} trustees")
+
+    stale = sweep_inactive(report, threshold_days=days)
+    click.echo(f"{stale} inactive users found")
+
+@click.command('rebuild-asset-summary')
+@click.argument('user_id', required=False)
+@click.option('--all', 'all_users', is_flag=True, help='Rebuild the summary of every user.')
+@with_appcontext
+def rebuild_asset_summary(user_id, all_users):
+    """Recompute materialized asset aggregates from the stored assets"""
+    if user_id:
+        summary = Asset.rebuild_summary(user_id)
+        click.echo(f"{user_id}: {summary.count} assets, total {summary.total_value}")
+        return
+    if not all_users:
+        raise click.UsageError('Pass a USER_ID or --all.')
+
+    summaries = {}
+    for user, asset_type, value in _iter_asset_values():
+        summary = summaries.setdefault(user, AssetSummary(user))
+        summary.add(asset_type or 'other', Decimal(str(value)) if value is not None else Decimal('0'))
+
+    if current_app.dynamodb:
+        StorageModel._batch_write(summary.to_dynamo_item() for summary in summaries.values())
+    else:
+        StorageModel._save_data('asset_summaries', {u: s.to_dict() for u, s in summaries.items()})
+    bump_data_version(*summaries)
+    click.echo(f"Rebuilt asset summaries for {len(summaries)} users")
+
+def _iter_asset_values():
+    """Yield (user_id, asset_type, value) for every asset in storage"""
+    if not current_app.dynamodb:
+        for asset in StorageModel._load_data('assets'):
+            yield asset['user_id'], asset.get('asset_type'), asset.get('value')
+        return
+    for item in _scan_items('asset', 'user_id, asset_type, #value', {'#value': 'value'}):
+        yield item['user_id'], item.get('asset_type'), item.get('value')
+
+def _scan_items(item_type, projection, names=None):
+    """Yield every DynamoDB item of one type, following scan pagination"""
+    table = StorageModel._get_table()
+    kwargs = {
+        'FilterExpression': '#type = :type',
+        'ProjectionExpression': projection,
+        'ExpressionAttributeNames': {'#type': 'type', **(names or {})},
+        'ExpressionAttributeValues': {':type': item_type}
+    }
+    while True:
+        response = table.scan(**kwargs)
+        yield from response['Items']
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+@click.command('search-reindex')
+@click.argument('user_id', required=False)
+@click.option('--all', 'all_users', is_flag=True, help='Rebuild the index of every user.')
+@with_appcontext
+def search_reindex(user_id, all_users):
+    """Rebuild full-text search indexes from stored messages, assets and wishes"""
+    from . import search
+    if user_id:
+        user_ids = [user_id]
+    elif all_users:
+        if current_app.dynamodb:
+            user_ids = [item['id'] for item in _scan_items('user', 'id')]
+        else:
+            user_ids = [user['id'] for user in StorageModel._load_data('users')]
+    else:
+        raise click.UsageError('Pass a USER_ID or --all.')
+
+    for uid in user_ids:
+        records = Message.get_by_user_id(uid) + Asset.get_by_user_id(uid)
+        wishes = LastWishes.get_by_user_id(uid)
+        if wishes:
+            records.append(wishes)
+        search.index_documents(uid, (r.search_document() for r in records), replace_all=True)
+        click.echo(f"{uid}: indexed {len(records)} documents")
+
+@click.command('export-user')
+@click.argument('user_id')
+@click.argument('output', type=click.File('wb'), default='-')
+@with_appcontext
+def export_user(user_id, output):
+    """Write a user's legacy archive (ZIP) to OUTPUT, streaming as it is built"""
+    from .export import stream_export
+    written = 0
+    for chunk in stream_export(user_id):
+        output.write(chunk)
+        written += len(chunk)
+    click.echo(f"Exported {written} bytes for {user_id}", err=True)
+
+@click.command('import-data')
+@click.argument('user_id')
+@click.argument('source', type=click.File('rb'))
+@click.option('--kind', type=click.Choice(['assets', 'messages']), required=True)
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+              help='Input format; detected from the file name by default.')
+@with_appcontext
+def import_data(user_id, source, kind, fmt):
+    """Bulk import assets or messages for USER_ID from a CSV or JSON-lines file"""
+    from .importer import import_records, detect_format
+    fmt = fmt or detect_format(source.name)
+
+    def progress(report):
+        click.echo(f"{report.imported} imported, {len(report.errors)} rejected, "
+                   f"{report.rows_per_second:.0f} rows/s", err=True)
+
+    report = import_records(user_id, kind, source, fmt=fmt, progress=progress)
+    for line, errors in report.errors:
+        details = '; '.join(f"{field}: {', '.join(messages)}" for field, messages in errors.items())
+        click.echo(f"line {line}: {details}")
+    click.echo(f"Imported {report.imported} of {report.rows} {kind} in {report.elapsed:.2f}s")
+
+@click.command('profile-token')
+@with_appcontext
+def profile_token():
+    """Print a signed header value that turns on profiling for a request"""
+    from .profiling import create_token
+    header = current_app.config['PROFILE_HEADER']
+    click.echo(f"{header}: {create_token(current_app)}")
+
+def scan_options(command, resumable=True):
+    """Options shared by the commands built on the parallel scanner"""
+    command = click.option('--segments', type=int, default=None,
+                           help='Parallel scan segments (default SCAN_SEGMENTS).')(command)
+    command = click.option('--rate', type=float, default=None,
+                           help='Max read capacity units per second (default SCAN_MAX_UNITS_PER_SECOND).')(command)
+    if resumable:
+        command = click.option('--resume', is_flag=True, help='Continue from the last checkpoint.')(command)
+    return command
+
+def single_pass_scan_options(command):
+    """scan_options for commands that need every item in one run, so cannot resume"""
+    return scan_options(command, resumable=False)
+
+def _run_scan(name, on_item, item_types, projection=None, names=None, segments=None, rate=None, resume=False,
+              checkpoint=True):
+    from .scanner import parallel_scan
+    result = parallel_scan(on_item, item_types=item_types, projection=projection, names=names,
+                           segments=segments, checkpoint=name if checkpoint else None, resume=resume,
+                           max_units_per_second=rate)
+    resumed = ' (resumed)' if result.resumed else ''
+    click.echo(f"Scanned {result.scanned} items{resumed} in {result.elapsed:.1f}s with {result.segments} "
+               f"segments, {result.units:g} read units")
+    return result
+
+def _message_state(item, now):
+    if item.get('sent_at'):
+        return 'sent'
+    if not item.get('release_at'):
+        return 'held'
+    return 'due' if item['release_at'] <= now else 'scheduled'
+
+@click.command('count-messages')
+@single_pass_scan_options
+@with_appcontext
+def count_messages(segments, rate):
+    """Count messages by delivery state with a parallel table scan"""
+    now = datetime.utcnow().isoformat()
+    counts = Counter()
+    lock = threading.Lock()
+
+    def on_item(item):
+        state = _message_state(item, now)
+        with lock:
+            counts[state] += 1
+
+    # The counts live in memory, so a resumed run would only count the rest of the table
+    _run_scan('count-messages', on_item, ['message'], 'sent_at, release_at',
+              segments=segments, rate=rate, checkpoint=False)
+    for state in ('held', 'scheduled', 'due', 'sent'):
+        click.echo(f"{state}\t{counts[state]}")
+
+@click.command('reconcile-users')
+@single_pass_scan_options
+@with_appcontext
+def reconcile_users(segments, rate):
+    """Report trustees, messages and assets that reference missing users"""
+    user_ids = set()
+    references = []
+    lock = threading.Lock()
+
+    def on_item(item):
+        with lock:
+            if item['type'] == 'user':
+                user_ids.add(item['id'])
+            elif item['type'] == 'trustee':
+                references.append(('trustee', item['id'], item['user_id'], item.get('trustee_user_id')))
+            else:
+                references.append((item['type'], item['id'], item['user_id'], item.get('recipient_id')))
+
+    # Orphans can only be found once every user is known, so never resume halfway
+    _run_scan('reconcile-users', on_item, ['user', 'trustee', 'message', 'asset'],
+              'id, #type, user_id, trustee_user_id, recipient_id', segments=segments, rate=rate,
+              checkpoint=False)
+    orphans = 0
+    for kind, item_id, owner_id, other_id in references:
+        missing = [uid for uid in (owner_id, other_id) if uid and uid not in user_ids]
+        if missing:
+            orphans += 1
+            click.echo(f"{kind} {item_id}: missing user {', '.join(missing)}")
+    click.echo(f"{len(user_ids)} users, {len(references)} references, {orphans} orphaned")
+
+@click.command('backfill-checkins')
+@scan_options
+@click.option('--dry-run', is_flag=True, help='Only report what would change.')
+@with_appcontext
+def backfill_checkins(segments, rate, resume, dry_run):
+    """Add users seen before the check-in index existed to the index"""
+    pending = []
+    lock = threading.Lock()
+    local_checkins = None if current_app.dynamodb else (StorageModel._load_data('checkins') or {})
+
+    def on_item(item):
+        if not item.get('last_seen'):
+            return
+        bucket = checkin_bucket(datetime.fromisoformat(item['last_seen']).date())
+        if current_app.dynamodb:
+            if item.get('checkin_bucket'):
+                return
+            if not dry_run:
+                from botocore.exceptions import ClientError
+                try:
+                    StorageModel._get_table().update_item(
+                        Key={'PK': f"USER#{item['id']}", 'SK': f"PROFILE#{item['id']}"},
+                        UpdateExpression='SET checkin_bucket = :bucket',
+                        ConditionExpression='attribute_not_exists(checkin_bucket)',
+                        ExpressionAttributeValues={':bucket': bucket}
+                    )
+                except ClientError as e:
+                    # The user logged in since the page was read and is indexed already
+                    if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                        raise
+                    return
+        elif item['id'] in local_checkins.get('users', {}):
+            return
+        elif not dry_run:
+            local_checkins.setdefault('buckets', {}).setdefault(bucket, {})[item['id']] = item['last_seen']
+            local_checkins.setdefault('users', {})[item['id']] = bucket
+        with lock:
+            pending.append(item['id'])
+
+    _run_scan('backfill-checkins', on_item, ['user'], 'id, last_seen, checkin_bucket',
+              segments=segments, rate=rate, resume=resume)
+    if local_checkins is not None and pending and not dry_run:
+        StorageModel._save_data('checkins', local_checkins)
+    click.echo(f"{'Would backfill' if dry_run else 'Backfilled'} {len(pending)} users")
+
+@click.command('migrate-last-wishes')
+@single_pass_scan_options
+@click.option('--dry-run', is_flag=True, help='Only report what would change.')
+@with_appcontext
+def migrate_last_wishes(segments, rate, dry_run):
+    """Collapse each user's WISHES#<id> items into the single WISHES item
+
+    The newest version is kept; older ones move to history when
+    LAST_WISHES_HISTORY is on and are dropped otherwise.
+    """
+    legacy = {}
+    lock = threading.Lock()
+
+    def on_item(item):
+        if item.get('SK') == LAST_WISHES_SK:
+            return
+        with lock:
+            # Keyed by id, since a scan may deliver a page twice
+            legacy.setdefault(item['user_id'], {})[item['id']] = item
+
+    # Every version of a user must be seen before choosing the newest, so never resume halfway
+    _run_scan('migrate-last-wishes', on_item, ['last_wishes'], segments=segments, rate=rate, checkpoint=False)
+    if not current_app.dynamodb:
+        # Local storage already keys wishes by user; only stray duplicates need collapsing
+        legacy = {user_id: items for user_id, items in legacy.items() if len(items) > 1}
+    keep_history = current_app.config['LAST_WISHES_HISTORY']
+    migrated = []
+    for user_id, items in legacy.items():
+        items = sorted(items.values(), key=lambda item: item['updated_at'])
+        *older, newest = [{k: v for k, v in item.items() if k not in ('PK', 'SK', 'type')} for item in items]
+        if dry_run:
+            click.echo(f"{user_id}: would keep {newest['id']}, replacing {len(older)} older versions")
+            continue
+        if current_app.dynamodb:
+            from botocore.exceptions import ClientError
+            table = StorageModel._get_table()
+            try:
+                table.put_item(Item=LastWishes.from_dict(newest).to_dynamo_item(),
+                               ConditionExpression='attribute_not_exists(PK)')
+            except ClientError as e:
+                # Saved since the new layout went live, so even the newest legacy item is older
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                older.append(newest)
+            if keep_history and older:
+                LastWishes.save_history(user_id, older)
+            for item in items:
+                table.delete_item(Key={'PK': item['PK'], 'SK': item['SK']})
+        else:
+            if keep_history and older:
+                LastWishes.save_history(user_id, older)
+            wishes = [w for w in StorageModel._load_data('last_wishes') if w['user_id'] != user_id]
+            wishes.append(newest)
+            StorageModel._save_data('last_wishes', wishes)
+        migrated.append(user_id)
+    if migrated:
+        # Cached dashboards still show the wishes from before the migration
+        bump_data_version(*migrated)
+    click.echo(f"{'Would migrate' if dry_run else 'Migrated'} last wishes of {len(legacy)} users")
+
+@click.command('capacity-report')
+@with_appcontext
+def capacity_report_command():
+    """Print DynamoDB capacity consumed per route, as recorded in METRICS_DIR"""
+    from .capacity import capacity_report
+    from .metrics import collect
+    for route in capacity_report(collect(current_app)):
+        click.echo(f"{route['endpoint']}\t{route['calls']} calls\t"
+                   f"{route['read_units']:g} RCU\t{route['write_units']:g} WCU")
+        for entry in route['callers']:
+            click.echo(f"  {entry['caller']} {entry['operation']}\t{entry['calls']} calls\t"
+                       f"{entry['read_units']:g} RCU\t{entry['write_units']:g} WCU")
+
+@click.command('assets-build')
+@click.option('--output', type=click.Path(file_okay=False), default=None,
+              help='Target directory (default STATIC_BUILD_DIR).')
+@with_appcontext
+def assets_build(output):
+    """Write fingerprinted, precompressed copies of the static files and their manifest"""
+    from .assets import build, build_dir, have_brotli
+    target = output or build_dir(current_app)
+    manifest = build(current_app.static_folder, target)
+    click.echo(f"{len(manifest)} static files written to {target}")
+    if not have_brotli():
+        click.echo("brotli is not installed; only .gz variants were written")
+
+@click.command('templates-compile')
+@with_appcontext
+def templates_compile():
+    """Compile every template into the shared bytecode cache"""
+    from .templating import compile_templates
+    if not current_app.config['TEMPLATE_BYTECODE_CACHE']:
+        raise click.UsageError('TEMPLATE_BYTECODE_CACHE is off; there is no cache to fill.')
+    names = compile_templates(current_app)
+    click.echo(f"{len(names)} templates compiled")
+
+def init_app(app):
+    app.cli.add_command(db_init)
+    app.cli.add_command(sweep_inactive_command)
+    app.cli.add_command(rebuild_asset_summary)
+    app.cli.add_command(search_reindex)
+    app.cli.add_command(export_user)
+    app.cli.add_command(import_data)
+    app.cli.add_command(profile_token)
+    app.cli.add_command(capacity_report_command)
+    app.cli.add_command(count_messages)
+    app.cli.add_command(reconcile_users)
+    app.cli.add_command(backfill_checkins)
+    app.cli.add_command(migrate_last_wishes)
+    app.cli.add_command(assets_build)
+    app.cli.add_command(templates_compile)
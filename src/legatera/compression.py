@@ -0,0 +1,223 @@
+"""On-the-fly compression of dynamic responses
+
+CompressionMiddleware wraps the WSGI app. It compresses a response with brotli
+(when the package is installed) or gzip, whichever Accept-Encoding prefers, if
+the content type is in COMPRESSION_TYPES and the body reaches
+COMPRESSION_MIN_BYTES. Bodies of a known, moderate size are compressed in one
+go and keep a Content-Length. Streamed bodies are compressed chunk by chunk
+and flushed after each one, so the client still receives them as they are
+produced. Responses that already have a Content-Encoding, such as the
+precompressed static files, pass through untouched.
+
+Bytes in and out and the CPU time spent are recorded per encoding in the
+metrics registry.
+"""
+import itertools
+import time
+import zlib
+from werkzeug.http import parse_accept_header
+from . import metrics
+
+# Larger bodies of known length are streamed rather than held in memory to
+# compress in one go, at the cost of their Content-Length
+BUFFER_MAX_BYTES = 1024 * 1024
+SKIP_STATUS = (204, 206, 304)
+
+_brotli = None
+
+def _load_brotli():
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+        except ImportError:
+            brotli = False
+        _brotli = brotli
+    return _brotli or None
+
+class GzipCompressor:
+    encoding = 'gzip'
+
+    def __init__(self, config):
+        # wbits 31 writes the gzip header and trailer around the deflate stream
+        self._stream = zlib.compressobj(config['COMPRESSION_GZIP_LEVEL'], zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._stream.compress(data) + self._stream.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._stream.flush()
+
+class BrotliCompressor:
+    encoding = 'br'
+
+    def __init__(self, config):
+        self._stream = _load_brotli().Compressor(quality=config['COMPRESSION_BROTLI_QUALITY'])
+
+    def compress(self, data):
+        return self._stream.process(data) + self._stream.flush()
+
+    def finish(self):
+        return self._stream.finish()
+
+def negotiate(accept_encoding):
+    """Return the compressor class the client prefers, or None"""
+    if not accept_encoding:
+        return None
+    accept = parse_accept_header(accept_encoding)
+    candidates = ((BrotliCompressor,) if _load_brotli() else ()) + (GzipCompressor,)
+    best, best_quality = None, 0
+    for candidate in candidates:
+        # Brotli wins ties; it is smaller at a similar cost
+        quality = accept.quality(candidate.encoding)
+        if quality > best_quality:
+            best, best_quality = candidate, quality
+    return best
+
+def _header(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+def _add_vary(headers):
+    vary = _header(headers, 'Vary')
+    if vary is None:
+        return headers + [('Vary', 'Accept-Encoding')]
+    if 'accept-encoding' in vary.lower() or vary.strip() == '*':
+        return headers
+    return [(k, f'{v}, Accept-Encoding' if k.lower() == 'vary' else v) for k, v in headers]
+
+def _encoded_headers(headers, encoding, length=None):
+    encoded = []
+    for key, value in headers:
+        lower = key.lower()
+        # Byte ranges of the identity body no longer apply
+        if lower in ('content-length', 'accept-ranges'):
+            continue
+        if lower == 'etag' and value.startswith('"'):
+            # The bytes differ from the identity response, so only a weak match holds
+            value = 'W/' + value
+        encoded.append((key, value))
+    encoded.append(('Content-Encoding', encoding))
+    if length is not None:
+        encoded.append(('Content-Length', str(length)))
+    return encoded
+
+def _record(encoding, size_in, size_out, cpu_seconds):
+    labels = {'encoding': encoding}
+    metrics.registry.inc('legatera_compression_bytes_total', dict(labels, direction='in'), size_in)
+    metrics.registry.inc('legatera_compression_bytes_total', dict(labels, direction='out'), size_out)
+    metrics.registry.inc('legatera_compression_cpu_seconds_total', labels, cpu_seconds)
+    if size_in:
+        metrics.registry.observe('legatera_compression_ratio', labels, size_out / size_in)
+
+def _no_write(data):
+    raise RuntimeError('write() is not supported for responses that may be compressed')
+
+class CompressionMiddleware:
+    """WSGI middleware compressing responses the client can decode"""
+
+    def __init__(self, wsgi_app, config):
+        self.wsgi_app = wsgi_app
+        self.config = config
+
+    def _compressible(self, status, headers):
+        code = int(status.split(' ', 1)[0])
+        if code < 200 or code in SKIP_STATUS:
+            return False
+        if _header(headers, 'Content-Encoding') is not None:
+            return False
+        if 'no-transform' in (_header(headers, 'Cache-Control') or '').lower():
+            return False
+        mimetype = (_header(headers, 'Content-Type') or '').split(';', 1)[0].strip().lower()
+        return mimetype in self.config['COMPRESSION_TYPES']
+
+    def __call__(self, environ, start_response):
+        config = self.config
+        if not config['COMPRESSION_ENABLED'] or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.wsgi_app(environ, start_response)
+        compressor = negotiate(environ.get('HTTP_ACCEPT_ENCODING'))
+        pending = []
+        returned = False
+
+        def intercept(status, headers, exc_info=None):
+            pending.clear()
+            if exc_info is None and self._compressible(status, headers):
+                # Caches must keep compressed and identity copies apart even
+                # when this client gets the identity one
+                headers = _add_vary(list(headers))
+                # An app that starts its response only once iterated is passed through
+                if compressor is not None and not returned:
+                    # Held back until the body shows whether it is worth compressing
+                    pending.extend((status, headers))
+                    return _no_write
+            return start_response(status, headers, exc_info)
+
+        app_iter = self.wsgi_app(environ, intercept)
+        returned = True
+        if not pending:
+            return app_iter
+        status, headers = pending
+        minimum = config['COMPRESSION_MIN_BYTES']
+        length = _header(headers, 'Content-Length')
+        length = int(length) if length and length.isdigit() else None
+        if length is not None and length < minimum:
+            start_response(status, headers)
+            return app_iter
+        if length is not None and length <= BUFFER_MAX_BYTES:
+            try:
+                body = b''.join(app_iter)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+            started = time.thread_time()
+            stream = compressor(config)
+            data = stream.compress(body) + stream.finish()
+            _record(stream.encoding, len(body), len(data), time.thread_time() - started)
+            start_response(status, _encoded_headers(headers, stream.encoding, len(data)))
+            return [data]
+        return self._stream(app_iter, status, headers, compressor(config), minimum, start_response)
+
+    def _stream(self, app_iter, status, headers, stream, minimum, start_response):
+        size_in = size_out = 0
+        cpu = 0.0
+        try:
+            iterator = iter(app_iter)
+            buffered, buffered_size = [], 0
+            for chunk in iterator:
+                buffered.append(chunk)
+                buffered_size += len(chunk)
+                if buffered_size >= minimum:
+                    break
+            else:
+                # The whole body came in under the threshold; send it as it is
+                start_response(status, headers)
+                yield from buffered
+                return
+
+            start_response(status, _encoded_headers(headers, stream.encoding))
+            for chunk in itertools.chain((b''.join(buffered),), iterator):
+                if not chunk:
+                    continue
+                started = time.thread_time()
+                data = stream.compress(chunk)
+                cpu += time.thread_time() - started
+                size_in += len(chunk)
+                size_out += len(data)
+                yield data
+            started = time.thread_time()
+            data = stream.finish()
+            cpu += time.thread_time() - started
+            size_out += len(data)
+            yield data
+        finally:
+            if size_in:
+                _record(stream.encoding, size_in, size_out, cpu)
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+def init_app(app):
+    """Wrap the app's WSGI callable with the compression middleware"""
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, app.config)
@@ -1,12 +1,12 @@
 import os
-import boto3
-from botocore.exceptions import ClientError
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-here'
     
     # AWS Configuration
     AWS_REGION = 'us-east-1'
+    # Point every AWS client at a local stand-in such as moto_server
+    AWS_ENDPOINT_URL = os.environ.get('AWS_ENDPOINT_URL')
     
     # Cognito Configuration
     COGNITO_USER_POOL_ID = os.environ.get('COGNITO_USER_POOL_ID')
@@ -17,13 +17,107 @@ class Config:
     
     # S3 Configuration
     S3_BUCKET = os.environ.get('S3_BUCKET', 'legatera-files')
+    # Seconds a presigned link to a private upload stays valid
+    S3_PRESIGNED_URL_EXPIRES = int(os.environ.get('S3_PRESIGNED_URL_EXPIRES', 300))
     
+    # Inactivity sweep (dead-man's switch)
+    INACTIVITY_THRESHOLD_DAYS = int(os.environ.get('INACTIVITY_THRESHOLD_DAYS', 90))
+    INACTIVITY_SWEEP_LOOKBACK_DAYS = int(os.environ.get('INACTIVITY_SWEEP_LOOKBACK_DAYS', 365))
+
+    # DynamoDB capacity accounting; calls slower or costlier than these are logged
+    DYNAMODB_CAPACITY_TRACKING = os.environ.get('DYNAMODB_CAPACITY_TRACKING', 'true').lower() == 'true'
+    DYNAMODB_SLOW_CALL_MS = float(os.environ.get('DYNAMODB_SLOW_CALL_MS', 100))
+    DYNAMODB_SLOW_CALL_UNITS = float(os.environ.get('DYNAMODB_SLOW_CALL_UNITS', 10))
+
+    # Parallel table scans used by the admin CLI commands; 0 disables rate limiting
+    SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', 8))
+    SCAN_MAX_UNITS_PER_SECOND = float(os.environ.get('SCAN_MAX_UNITS_PER_SECOND', 0))
+
+    # Keep each replaced version of a user's last wishes as a separate history record
+    LAST_WISHES_HISTORY = os.environ.get('LAST_WISHES_HISTORY', 'false').lower() == 'true'
+
+    # Local storage directory used when DynamoDB is unavailable
+    STORAGE_DIR = os.environ.get('STORAGE_DIR')
+
+    # Message bodies larger than this go to S3 (or BLOB_DIR locally) compressed, so a
+    # message item stays within one 4 KB read unit and far from the 400 KB item limit
+    MESSAGE_INLINE_MAX_BYTES = int(os.environ.get('MESSAGE_INLINE_MAX_BYTES', 3072))
+    MESSAGE_PREVIEW_CHARS = 200
+    BLOB_DIR = os.environ.get('BLOB_DIR')
+
+    # Rendered dashboard fragments: 'sqlite' (shared by the workers on a host),
+    # 'memory' (per worker) or 'none'; the SQLite file defaults to STORAGE_DIR
+    FRAGMENT_CACHE = os.environ.get('FRAGMENT_CACHE', 'sqlite')
+    FRAGMENT_CACHE_PATH = os.environ.get('FRAGMENT_CACHE_PATH')
+    FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+    # Output of `flask assets-build`; while its manifest exists, static URLs carry a
+    # content hash and are cached by browsers for STATIC_MAX_AGE without revalidation
+    STATIC_BUILD_DIR = os.environ.get('STATIC_BUILD_DIR')
+    STATIC_MAX_AGE = 365 * 24 * 3600
+
+    # Compiled templates are shared by the workers on a host through this directory
+    # (default: a per-user temp directory); `flask templates-compile` fills it in advance
+    TEMPLATE_BYTECODE_CACHE = os.environ.get('TEMPLATE_BYTECODE_CACHE', 'true').lower() == 'true'
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')
+    # Public pages each gunicorn worker serves to itself before taking traffic
+    WARM_UP_PATHS = ('/', '/login', '/register', '/trustee-login')
+
+    # Dynamic responses are compressed with brotli or gzip when the client accepts
+    # it, the content type is listed and the body is at least COMPRESSION_MIN_BYTES
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+    COMPRESSION_GZIP_LEVEL = 6
+    COMPRESSION_BROTLI_QUALITY = 4
+    COMPRESSION_TYPES = ('text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+                         'application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+
+    # Full-text search indexes, one SQLite database per user, on this instance's
+    # local disk; rebuild them with `flask search-reindex --all` when it starts
+    SEARCH_INDEX_DIR = os.environ.get('SEARCH_INDEX_DIR')
+    SEARCH_PAGE_SIZE = 20
+
+    # Serving through legatera.asgi: requests in flight per process, and threads for
+    # the blocking AWS and storage calls that async code awaits through legatera.aio.
+    # Local JSON storage is rewritten whole, so without DynamoDB both run one at a time
+    ASYNC_REQUEST_THREADS = int(os.environ.get('ASYNC_REQUEST_THREADS', 64))
+    ASYNC_IO_THREADS = int(os.environ.get('ASYNC_IO_THREADS', 32))
+    # HTTP connections each AWS client keeps open; botocore's default of 10 would
+    # make concurrent requests queue for a connection or open throwaway ones
+    AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 64))
+
+    # Records per page of the JSON API, by default and at most
+    API_PAGE_SIZE = 50
+    API_MAX_PAGE_SIZE = 200
+
+    # Metrics; set METRICS_DIR to a directory shared by all gunicorn workers
+    # so /metrics reports the whole server rather than one worker
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = 1.0
+    METRICS_REQUEST_LOG = os.environ.get('METRICS_REQUEST_LOG', 'true').lower() == 'true'
+    # /metrics answers 403 unless requested with "Authorization: Bearer <METRICS_TOKEN>"
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Request profiling: sampled, or forced with a token from `flask profile-token`
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'true').lower() == 'true'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_HEADER = 'X-Legatera-Profile'
+    PROFILE_TOKEN_MAX_AGE = 3600
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')
+    PROFILE_MAX_FILES = 200
+
+    # Comma-separated emails allowed to use the /admin pages
+    ADMIN_EMAILS = [e.strip().lower() for e in os.environ.get('ADMIN_EMAILS', '').split(',') if e.strip()]
+
     # Flask Configuration
     UPLOAD_FOLDER = 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 
     @staticmethod
     def get_secret(secret_name):
+        import boto3
+        from botocore.exceptions import ClientError
         session = boto3.session.Session()
         client = session.client(
             service_name='secretsmanager',
@@ -44,12 +138,18 @@ class Config:
 
     @staticmethod
     def get_cognito_client():
-        return boto3.client('cognito-idp', region_name=Config.AWS_REGION)
+        import boto3
+        return boto3.client('cognito-idp', region_name=Config.AWS_REGION,
+                            endpoint_url=Config.AWS_ENDPOINT_URL)
     
     @staticmethod
     def get_dynamodb_resource():
-        return boto3.resource('dynamodb', region_name=Config.AWS_REGION)
+        import boto3
+        return boto3.resource('dynamodb', region_name=Config.AWS_REGION,
+                              endpoint_url=Config.AWS_ENDPOINT_URL)
     
     @staticmethod
     def get_s3_client():
-        return boto3.client('s3', region_name=Config.AWS_REGION)
+        import boto3
+        return boto3.client('s3', region_name=Config.AWS_REGION,
+                            endpoint_url=Config.AWS_ENDPOINT_URL)
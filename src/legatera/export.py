@@ -0,0 +1,133 @@
+import io
+import json
+import os
+import posixpath
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from . import blobs
+from .models import StorageModel
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Sort key prefix -> archive entry, in the order DynamoDB returns a partition
+EXPORT_SECTIONS = {
+    'ASSET#': 'assets.jsonl',
+    'MESSAGE#': 'messages.jsonl',
+    'PROFILE#': 'profile.jsonl',
+    'TRUSTEE#': 'trustees.jsonl',
+    'WISHES#': 'last_wishes.jsonl'
+}
+LOCAL_SECTIONS = [
+    ('assets', 'assets.jsonl'),
+    ('messages', 'messages.jsonl'),
+    ('users', 'profile.jsonl'),
+    ('trustees', 'trustees.jsonl'),
+    ('last_wishes', 'last_wishes.jsonl')
+]
+PRIVATE_FIELDS = {'PK', 'SK', 'password_hash', 'checkin_bucket', 'version', 'content_ref', 'content_sha256',
+                  'content_size', 'content_preview'}
+
+class _ChunkBuffer(io.RawIOBase):
+    """Write-only sink that hands completed chunks back to the generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+def _iter_records(user_id):
+    """Yield (entry_name, record) for every exportable record of a user"""
+    if current_app.dynamodb:
+        for item in StorageModel._query_partition(user_id):
+            prefix = item['SK'].split('#', 1)[0] + '#'
+            if prefix in EXPORT_SECTIONS:
+                yield EXPORT_SECTIONS[prefix], item
+        return
+    for type_name, entry_name in LOCAL_SECTIONS:
+        key = 'id' if type_name == 'users' else 'user_id'
+        for record in StorageModel._load_data(type_name):
+            if record.get(key) == user_id:
+                yield entry_name, record
+
+def _iter_file(path):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(EXPORT_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def _open_media(app, media_url):
+    """Start fetching a media object; returns (first_chunk, remaining_chunks)"""
+    if app.s3_client:
+        response = app.s3_client.get_object(Bucket=app.config['S3_BUCKET'], Key=media_url)
+        chunks = response['Body'].iter_chunks(EXPORT_CHUNK_SIZE)
+    else:
+        static_dir = os.path.realpath(os.path.join(app.root_path, 'static'))
+        path = os.path.realpath(os.path.join(static_dir, media_url))
+        if not path.startswith(static_dir + os.sep):
+            raise ValueError(f"Media path outside static directory: {media_url}")
+        chunks = _iter_file(path)
+    return next(chunks, b''), chunks
+
+def stream_export(user_id):
+    """Generate a ZIP archive of a user's legacy without holding it in memory
+
+    Records are written as JSON lines while the partition is read page by
+    page, then each media file is copied chunk by chunk. The next media
+    object is fetched on a background thread while the current one is being
+    compressed, so S3 latency overlaps with output.
+    """
+    app = current_app._get_current_object()
+    sink = _ChunkBuffer()
+    media = []
+
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        entry_name, entry = None, None
+        for name, record in _iter_records(user_id):
+            if name != entry_name:
+                if entry:
+                    entry.close()
+                entry_name, entry = name, archive.open(name, 'w', force_zip64=True)
+            if record.get('media_url'):
+                media.append((record['id'], record['media_url']))
+            if record.get('content_ref'):
+                # Offloaded message bodies belong in the archive like inline ones
+                record = dict(record, content=blobs.load_text(record['content_ref'], record.get('content_sha256')))
+            public = {k: v for k, v in record.items() if k not in PRIVATE_FIELDS}
+            entry.write(json.dumps(public, default=str).encode('utf-8') + b'\n')
+            yield from sink.drain()
+        if entry:
+            entry.close()
+        yield from sink.drain()
+
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            pending = prefetcher.submit(_open_media, app, media[0][1]) if media else None
+            for index, (record_id, media_url) in enumerate(media):
+                current = pending
+                pending = (prefetcher.submit(_open_media, app, media[index + 1][1])
+                           if index + 1 < len(media) else None)
+                try:
+                    first_chunk, chunks = current.result()
+                except Exception as e:
+                    app.logger.error(f"Export skipped media {media_url}: {str(e)}")
+                    continue
+                name = f"media/{record_id}/{posixpath.basename(media_url)}"
+                with archive.open(name, 'w', force_zip64=True) as media_entry:
+                    media_entry.write(first_chunk)
+                    yield from sink.drain()
+                    for chunk in chunks:
+                        media_entry.write(chunk)
+                        yield from sink.drain()
+                yield from sink.drain()
+    yield from sink.drain()
@@ -1,8 +1,7 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, TextAreaField, FileField, SelectField, DecimalField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError
-import boto3
-from .config import Config
+from flask import current_app
 
 def validate_file_extension(form, field):
     if field.data:
@@ -12,6 +11,14 @@ def validate_file_extension(form, field):
            filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
             raise ValidationError('Invalid file extension. Allowed extensions are: png, jpg, jpeg, gif, pdf, doc, docx')
 
+def validate_import_extension(form, field):
+    if field.data:
+        filename = field.data.filename
+        allowed_extensions = {'csv', 'jsonl', 'ndjson', 'json'}
+        if '.' not in filename or \
+           filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
+            raise ValidationError('Invalid file extension. Allowed extensions are: csv, jsonl, ndjson, json')
+
 class RegistrationForm(FlaskForm):
     email = StringField('Email', validators=[
         DataRequired(),
@@ -37,11 +44,13 @@ class RegistrationForm(FlaskForm):
     submit = SubmitField('Sign Up')
 
     def validate_email(self, field):
-        # Check if email exists in Cognito user pool
-        client = Config.get_cognito_client()
+        # Check if email exists in Cognito user pool, reusing the app's client
+        client = current_app.cognito_client
+        if not client:
+            return
         try:
             response = client.list_users(
-                UserPoolId=Config.COGNITO_USER_POOL_ID,
+                UserPoolId=current_app.config['COGNITO_USER_POOL_ID'],
                 Filter=f'email = "{field.data}"'
             )
             if response.get('Users'):
@@ -78,6 +87,10 @@ class RecipientForm(FlaskForm):
     relationship = StringField('Relationship', validators=[Length(max=64)])
     submit = SubmitField('Add Recipient')
 
+def recipient_choices(trustees):
+    """MessageForm.recipient choices: messages are addressed to one of the user's trustees"""
+    return [(t.trustee_user_id, t.trustee_user_id) for t in trustees]
+
 class MessageForm(FlaskForm):
     recipient = SelectField('Recipient', coerce=str)
     content = TextAreaField('Message', validators=[DataRequired()])
@@ -128,3 +141,14 @@ class DocumentForm(FlaskForm):
         validate_file_extension
     ])
     submit = SubmitField('Upload Document')
+
+class ImportForm(FlaskForm):
+    kind = SelectField('Import', choices=[
+        ('assets', 'Assets'),
+        ('messages', 'Messages')
+    ])
+    file = FileField('CSV or JSON Lines File', validators=[
+        DataRequired(),
+        validate_import_extension
+    ])
+    submit = SubmitField('Import')
@@ -0,0 +1,229 @@
+"""Cache of rendered page fragments, keyed by user and data version
+
+Every model write bumps the owner's data version (see models.bump_data_version),
+so a cached fragment is served only while the data it was rendered from is
+unchanged and nothing needs to be deleted on write. Each user keeps at most
+one entry per fragment; total size is bounded with least-recently-used
+eviction.
+
+FRAGMENT_CACHE picks the backend: 'sqlite' (one database file shared by all
+workers on a host), 'memory' (per process) or 'none'. Any object with the
+same get/set/clear methods can be assigned to app.fragment_cache instead.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app, g
+from markupsafe import Markup
+from . import assets, metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fragments (
+    name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    html TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (name, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS fragments_accessed ON fragments (accessed);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals (id, size) VALUES (0, 0);
+"""
+
+# A hit only rewrites its access time when it is older than this, so
+# repeat views of a hot page do not each take the database write lock
+TOUCH_INTERVAL = 30.0
+EVICT_BATCH = 64
+
+class SQLiteFragmentCache:
+    """LRU fragment store in a SQLite file shared by every worker process"""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _connection(self):
+        # Connections cannot cross threads or a fork, so each thread of each process opens its own
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            import sqlite3
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, name, user_id, version):
+        conn = self._connection()
+        row = conn.execute('SELECT html, accessed FROM fragments WHERE name = ? AND user_id = ? AND version = ?',
+                           (name, user_id, version)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > TOUCH_INTERVAL:
+            conn.execute('UPDATE fragments SET accessed = ? WHERE name = ? AND user_id = ?', (now, name, user_id))
+        return row[0]
+
+    def set(self, name, user_id, version, html):
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            old = conn.execute('SELECT size FROM fragments WHERE name = ? AND user_id = ?',
+                               (name, user_id)).fetchone()
+            # Replacing the user's entry drops the fragment of the older version
+            conn.execute('INSERT OR REPLACE INTO fragments (name, user_id, version, html, size, accessed) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', (name, user_id, version, html, size, time.time()))
+            conn.execute('UPDATE totals SET size = size + ? WHERE id = 0', (size - (old[0] if old else 0),))
+            total = conn.execute('SELECT size FROM totals WHERE id = 0').fetchone()[0]
+            while total > self.max_bytes:
+                victims = conn.execute('SELECT name, user_id, size FROM fragments ORDER BY accessed LIMIT ?',
+                                       (EVICT_BATCH,)).fetchall()
+                for victim_name, victim_user, victim_size in victims:
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute('DELETE FROM fragments WHERE name = ? AND user_id = ?', (victim_name, victim_user))
+                    total -= victim_size
+                conn.execute('UPDATE totals SET size = ? WHERE id = 0', (total,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM fragments')
+        conn.execute('UPDATE totals SET size = 0 WHERE id = 0')
+        conn.execute('COMMIT')
+
+class MemoryFragmentCache:
+    """LRU fragment store private to one process"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name, user_id, version):
+        with self._lock:
+            entry = self._entries.get((name, user_id))
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end((name, user_id))
+            return entry[1]
+
+    def set(self, name, user_id, version, html):
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop((name, user_id), None)
+            if old:
+                self.size -= old[2]
+            self._entries[(name, user_id)] = (version, html, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+def create_backend(app):
+    config = app.config
+    kind = config['FRAGMENT_CACHE']
+    if kind == 'sqlite':
+        path = config.get('FRAGMENT_CACHE_PATH') or os.path.join(
+            config.get('STORAGE_DIR') or os.path.join(app.root_path, 'storage'), 'fragment_cache.db')
+        return SQLiteFragmentCache(path, config['FRAGMENT_CACHE_MAX_BYTES'])
+    if kind == 'memory':
+        return MemoryFragmentCache(config['FRAGMENT_CACHE_MAX_BYTES'])
+    if kind in ('none', ''):
+        return None
+    raise ValueError(f"Unknown FRAGMENT_CACHE backend: {kind!r}")
+
+def _backend():
+    app = current_app._get_current_object()
+    # Built on first use, once STORAGE_DIR and friends are final
+    if not hasattr(app, 'fragment_cache'):
+        app.fragment_cache = create_backend(app)
+    return app.fragment_cache
+
+def data_version(user_id):
+    """The user's data version, read from storage at most once per request"""
+    from .models import get_data_version
+    versions = g.setdefault('data_versions', {})
+    if user_id not in versions:
+        versions[user_id] = get_data_version(user_id)
+    return versions[user_id]
+
+def _templates_digest(app):
+    """Hash of every template and the static manifest, so a deploy that changes
+    page markup or asset URLs changes every ETag"""
+    digest = getattr(app, 'templates_digest', None)
+    if digest is None:
+        sha = hashlib.sha1()
+        root = os.path.join(app.root_path, app.template_folder)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                sha.update(os.path.relpath(path, root).encode('utf-8'))
+                with open(path, 'rb') as f:
+                    sha.update(f.read())
+        sha.update(json.dumps(assets.manifest(app), sort_keys=True).encode('utf-8'))
+        digest = app.templates_digest = sha.hexdigest()
+    return digest
+
+def page_etag(name, user_id):
+    """Weak ETag of a page that depends only on one user's data
+
+    The footer shows the year, so that is part of the tag too.
+    """
+    source = f'{name}:{user_id}:{data_version(user_id)}:{_templates_digest(current_app)}:{datetime.utcnow().year}'
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:24]
+
+def cached(name, user_id, render):
+    """Return the fragment rendered by render(), reusing it until the user's data changes
+
+    A failing cache never fails the page; the fragment is rendered instead.
+    """
+    backend = _backend()
+    if backend is None:
+        return Markup(render())
+    # The version is read before render() loads any data, so a write that
+    # lands mid-render leaves this entry under a version nobody asks for again
+    version = data_version(user_id)
+    try:
+        html = backend.get(name, user_id, version)
+    except Exception as e:
+        current_app.logger.error(f"Fragment cache read error: {str(e)}")
+        html = None
+    if html is not None:
+        metrics.registry.inc('legatera_fragment_cache_total', {'fragment': name, 'result': 'hit'})
+        return Markup(html)
+    metrics.registry.inc('legatera_fragment_cache_total', {'fragment': name, 'result': 'miss'})
+    html = render()
+    try:
+        backend.set(name, user_id, version, str(html))
+    except Exception as e:
+        current_app.logger.error(f"Fragment cache write error: {str(e)}")
+    return Markup(html)
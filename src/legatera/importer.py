@@ -0,0 +1,175 @@
+import csv
+import functools
+import io
+import json
+import time
+from decimal import Decimal
+from flask import current_app
+from werkzeug.datastructures import MultiDict
+from .forms import AssetForm, MessageForm, recipient_choices
+from .models import StorageModel, Message, Asset, Trustee, bump_data_version, deferred_data_versions
+
+# Rows validated before each write; DynamoDB batches are split into 25s below
+IMPORT_CHUNK_SIZE = 500
+
+# Accepted column aliases, mapped onto form field names
+ASSET_COLUMNS = {'asset_type': 'type'}
+MESSAGE_COLUMNS = {'recipient_id': 'recipient'}
+
+class ImportReport:
+    """Outcome of a bulk import: counts, per-row errors and throughput"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.imported = 0
+        self.rows = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def add_error(self, line, errors):
+        self.errors.append((line, errors))
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+def iter_rows(stream, fmt):
+    """Yield (line_number, row) from a binary CSV or JSON-lines stream"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+            continue
+        yield line_number, row if isinstance(row, dict) else ValueError('Expected a JSON object')
+
+def _formdata(row, aliases):
+    data = MultiDict()
+    for key, value in row.items():
+        if key is None or value is None:
+            continue
+        data[aliases.get(key, key)] = value if isinstance(value, str) else str(value)
+    return data
+
+def _build_asset(user_id, row):
+    form = AssetForm(formdata=_formdata(row, ASSET_COLUMNS), meta={'csrf': False})
+    if not form.validate():
+        return None, form.errors
+    return Asset(
+        user_id=user_id,
+        name=form.name.data,
+        description=form.description.data,
+        asset_type=form.type.data,
+        value=form.value.data,
+        location=form.location.data
+    ), None
+
+def _build_message(user_id, row, recipients):
+    form = MessageForm(formdata=_formdata(row, MESSAGE_COLUMNS), meta={'csrf': False})
+    # As on the add-message page, anyone but one of the user's trustees is an invalid choice
+    form.recipient.choices = recipients
+    if not form.validate():
+        return None, form.errors
+    message = Message(
+        user_id=user_id,
+        recipient_id=form.recipient.data,
+        content=form.content.data,
+        delay_days=form.delay_days.data
+    )
+    # Long letters go to blob storage before the batch write, as Message.save() does
+    message.offload_body()
+    return message, None
+
+BUILDERS = {'assets': _build_asset, 'messages': _build_message}
+
+def _write_chunk(kind, user_id, records):
+    """Write one validated chunk to DynamoDB and update derived data"""
+    StorageModel._batch_write(record.to_dynamo_item() for record in records)
+    if kind == 'assets':
+        StorageModel._get_table().update_item(**Asset._summary_update(user_id, _summary_deltas(records)))
+
+def _summary_deltas(assets):
+    deltas = {}
+    for asset in assets:
+        count, value = deltas.get(asset.summary_type, (0, Decimal('0')))
+        deltas[asset.summary_type] = (count + 1, value + (asset.value or Decimal('0')))
+    return deltas
+
+def _index_chunk(user_id, records):
+    try:
+        from . import search
+        search.index_documents(user_id, (record.search_document() for record in records))
+    except Exception as e:
+        current_app.logger.error(f"Search index error during import: {str(e)}")
+
+def import_records(user_id, kind, stream, fmt='csv', progress=None):
+    """Validate and store a stream of assets or messages for one user
+
+    Rows are parsed lazily and validated with the same form rules as the
+    single-record pages. On DynamoDB every chunk goes out as BatchWriteItem
+    calls plus one summary update; locally everything is committed with a
+    single rewrite of each file at the end. The user's data version is bumped
+    once, after the last write. ``progress`` is called with the report after
+    every chunk.
+    """
+    if kind not in BUILDERS:
+        raise ValueError(f"Unknown import kind: {kind}")
+    build = BUILDERS[kind]
+    if kind == 'messages':
+        # Looked up once, not per row
+        recipients = recipient_choices(Trustee.get_by_user_id(user_id))
+        build = functools.partial(_build_message, recipients=recipients)
+    report = ImportReport(kind)
+    dynamodb = bool(current_app.dynamodb)
+    pending, stored = [], []
+
+    def flush():
+        if dynamodb:
+            _write_chunk(kind, user_id, pending)
+            bump_data_version(user_id)
+        else:
+            stored.extend(pending)
+        _index_chunk(user_id, pending)
+        report.imported += len(pending)
+        pending.clear()
+        report.elapsed = time.monotonic() - report.started
+        if progress:
+            progress(report)
+
+    # Every chunk bumps the user's data version; the bumps collapse into one at the end
+    with deferred_data_versions():
+        for line_number, row in iter_rows(stream, fmt):
+            report.rows += 1
+            if isinstance(row, Exception):
+                report.add_error(line_number, {'row': [str(row)]})
+                continue
+            record, errors = build(user_id, row)
+            if errors:
+                report.add_error(line_number, errors)
+                continue
+            pending.append(record)
+            if len(pending) >= IMPORT_CHUNK_SIZE:
+                flush()
+        if pending:
+            flush()
+
+        if stored:
+            StorageModel._commit_local({kind: [record.to_dict() for record in stored]})
+            if kind == 'assets':
+                Asset._add_to_local_summary(user_id, _summary_deltas(stored))
+            bump_data_version(user_id)
+    report.elapsed = time.monotonic() - report.started
+    return report
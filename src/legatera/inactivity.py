@@ -0,0 +1,94 @@
+from datetime import date, datetime, timedelta
+from flask import current_app
+from .models import StorageModel, CHECKIN_INDEX, checkin_bucket
+
+CHECKPOINT_KEY = {'PK': 'SWEEP#inactivity', 'SK': 'CHECKPOINT'}
+
+def load_checkpoint():
+    """Load the last fully swept bucket and any in-progress page key"""
+    if current_app.dynamodb:
+        response = StorageModel._get_table().get_item(Key=CHECKPOINT_KEY)
+        item = response.get('Item') or {}
+        return {'bucket': item.get('bucket'), 'start_key': item.get('start_key')}
+    checkpoint = StorageModel._load_data('sweep_checkpoint') or {}
+    return {'bucket': checkpoint.get('bucket'), 'start_key': checkpoint.get('start_key')}
+
+def save_checkpoint(bucket, start_key=None):
+    """Persist sweep progress so an interrupted run resumes where it stopped"""
+    if current_app.dynamodb:
+        item = {**CHECKPOINT_KEY, 'bucket': bucket, 'updated_at': datetime.utcnow().isoformat()}
+        if start_key:
+            item['start_key'] = start_key
+        StorageModel._get_table().put_item(Item=item)
+    else:
+        StorageModel._save_data('sweep_checkpoint', {'bucket': bucket, 'start_key': start_key})
+
+def _iter_bucket(day, start_key=None):
+    """Yield (user_id, last_seen, next_start_key) for every user in a day bucket"""
+    if current_app.dynamodb:
+        table = StorageModel._get_table()
+        kwargs = {
+            'IndexName': CHECKIN_INDEX,
+            'KeyConditionExpression': 'checkin_bucket = :bucket',
+            'ExpressionAttributeValues': {':bucket': checkin_bucket(day)},
+            'ProjectionExpression': 'id, last_seen'
+        }
+        if start_key:
+            kwargs['ExclusiveStartKey'] = start_key
+        while True:
+            response = table.query(**kwargs)
+            next_key = response.get('LastEvaluatedKey')
+            items = response['Items']
+            for index, item in enumerate(items):
+                # Only hand out a resume key once the whole page has been processed
+                yield item['id'], item['last_seen'], next_key if index == len(items) - 1 else None
+            if not next_key:
+                break
+            kwargs['ExclusiveStartKey'] = next_key
+    else:
+        checkins = StorageModel._load_data('checkins') or {}
+        users = checkins.get('buckets', {}).get(checkin_bucket(day), {})
+        for user_id, last_seen in sorted(users.items()):
+            yield user_id, last_seen, None
+
+def _first_bucket(cutoff):
+    """Pick where a sweep without a checkpoint starts reading"""
+    if not current_app.dynamodb:
+        checkins = StorageModel._load_data('checkins') or {}
+        days = [date.fromisoformat(b.split('#', 1)[1]) for b in checkins.get('buckets', {})]
+        return min(days) if days else cutoff
+    lookback = current_app.config['INACTIVITY_SWEEP_LOOKBACK_DAYS']
+    return cutoff - timedelta(days=lookback)
+
+def sweep_inactive(on_stale, threshold_days=None, now=None):
+    """Report users whose last check-in is older than the threshold
+
+    Each user sits in exactly one check-in bucket (the day of their latest
+    login), so every user in a bucket at or before the cutoff is stale. Only
+    the buckets that crossed the threshold since the last run are read, so a
+    sweep costs one index query per new day plus one item per stale user.
+    """
+    threshold_days = threshold_days or current_app.config['INACTIVITY_THRESHOLD_DAYS']
+    now = now or datetime.utcnow()
+    cutoff = (now - timedelta(days=threshold_days)).date()
+
+    checkpoint = load_checkpoint()
+    if checkpoint['bucket']:
+        day = date.fromisoformat(checkpoint['bucket'])
+        start_key = checkpoint['start_key']
+        if not start_key:
+            day += timedelta(days=1)
+    else:
+        day, start_key = _first_bucket(cutoff), None
+
+    stale = 0
+    while day <= cutoff:
+        for user_id, last_seen, next_key in _iter_bucket(day, start_key):
+            on_stale(user_id, last_seen)
+            stale += 1
+            if next_key:
+                save_checkpoint(day.isoformat(), next_key)
+        save_checkpoint(day.isoformat())
+        day += timedelta(days=1)
+        start_key = None
+    return stale
@@ -0,0 +1,313 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from flask import g, has_request_context, request, before_render_template, template_rendered
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Pure data transforms are too cheap and too frequent to be worth timing
+UNINSTRUMENTED_METHODS = {'from_dict', 'from_dynamo_item', 'to_dict', 'to_dynamo_item',
+                          'search_document', 'create_id', 'changed_fields', 'affected_users'}
+
+HELP = {
+    'legatera_request_duration_seconds': 'Time spent handling HTTP requests.',
+    'legatera_response_bytes_total': 'Bytes sent in HTTP response bodies.',
+    'legatera_model_call_duration_seconds': 'Time spent in model methods.',
+    'legatera_aws_call_duration_seconds': 'Latency of AWS API calls.',
+    'legatera_aws_response_bytes_total': 'Bytes received from AWS API calls.',
+    'legatera_upload_duration_seconds': 'Time spent storing uploaded files.',
+    'legatera_upload_bytes_total': 'Bytes of uploaded files stored.',
+    'legatera_template_render_duration_seconds': 'Time spent rendering templates.',
+    'legatera_dynamodb_calls_total': 'DynamoDB calls by route, calling method and operation.',
+    'legatera_dynamodb_capacity_units_total': 'DynamoDB capacity units consumed by route and calling method.',
+    'legatera_fragment_cache_total': 'Fragment cache lookups by fragment and result.',
+    'legatera_compression_bytes_total': 'Response bytes before (in) and after (out) compression, by encoding.',
+    'legatera_compression_cpu_seconds_total': 'CPU time spent compressing responses, by encoding.',
+    'legatera_compression_ratio': 'Compressed to original size of each compressed response.'
+}
+
+class Registry:
+    """Process-local counters and histograms that can be merged across workers"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((labels or {}).items()))
+
+    def inc(self, name, labels=None, amount=1):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), dict(h, buckets=list(h['buckets']))]
+                               for (name, labels), h in self.histograms.items()]
+            }
+
+    def merge(self, snapshot):
+        with self._lock:
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, labels, data in snapshot['histograms']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                histogram = self.histograms.setdefault(
+                    key, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+                histogram['buckets'] = [a + b for a, b in zip(histogram['buckets'], data['buckets'])]
+                histogram['sum'] += data['sum']
+                histogram['count'] += data['count']
+
+registry = Registry()
+_last_flush = 0.0
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + list(extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+def render_prometheus(source):
+    """Render a registry in the Prometheus text exposition format"""
+    lines = []
+    families = {}
+    for (name, labels), value in sorted(source.counters.items()):
+        families.setdefault((name, 'counter'), []).append((labels, value))
+    for (name, labels), value in sorted(source.histograms.items()):
+        families.setdefault((name, 'histogram'), []).append((labels, value))
+
+    for (name, kind), series in sorted(families.items()):
+        if name in HELP:
+            lines.append(f'# HELP {name} {HELP[name]}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series:
+            if kind == 'counter':
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(source.buckets, value['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {value["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {value["sum"]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+def flush(app, force=False):
+    """Write this worker's snapshot to the shared metrics directory"""
+    global _last_flush
+    metrics_dir = app.config.get('METRICS_DIR')
+    now = time.monotonic()
+    if not metrics_dir or (not force and now - _last_flush < app.config['METRICS_FLUSH_INTERVAL']):
+        return
+    _last_flush = now
+    os.makedirs(metrics_dir, exist_ok=True)
+    path = os.path.join(metrics_dir, f'{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+def collect(app):
+    """Merge the snapshots of every worker, or return this process's registry"""
+    metrics_dir = app.config.get('METRICS_DIR')
+    if not metrics_dir:
+        return registry
+    flush(app, force=True)
+    merged = Registry(registry.buckets)
+    for filename in os.listdir(metrics_dir):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(metrics_dir, filename)) as f:
+                merged.merge(json.load(f))
+        except (OSError, ValueError):
+            # A worker may be replacing its file right now; skip it this scrape
+            continue
+    return merged
+
+def _request_stats():
+    if has_request_context():
+        return g.get('_metrics')
+    return None
+
+def record_call(kind, name, seconds):
+    """Count a model or AWS call against the current request"""
+    stats = _request_stats()
+    if stats is not None:
+        stats[kind][name] += 1
+        stats[f'{kind}_time'] += seconds
+
+def record_capacity(kind, units):
+    """Add DynamoDB read or write units to the current request"""
+    stats = _request_stats()
+    if stats is not None:
+        stats[f'{kind}_units'] += units
+
+def timed(name):
+    """Decorator recording the latency of a model method"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                registry.observe('legatera_model_call_duration_seconds', {'method': name}, elapsed)
+                record_call('models', name, elapsed)
+        wrapper._legatera_instrumented = True
+        return wrapper
+    return decorator
+
+def instrument_class(cls):
+    """Wrap every public method of a model class, including shared base-class ones, with timing"""
+    # Methods inherited from the models module's own base classes are timed under
+    # the subclass name; third-party mixins such as UserMixin are left alone
+    attrs = {}
+    for klass in reversed(cls.__mro__):
+        if klass.__module__ == cls.__module__:
+            attrs.update(vars(klass))
+    for attr_name, attr in attrs.items():
+        if attr_name.startswith('_') or attr_name in UNINSTRUMENTED_METHODS:
+            continue
+        if isinstance(attr, (classmethod, staticmethod)):
+            func = attr.__func__
+            if getattr(func, '_legatera_instrumented', False):
+                continue
+            setattr(cls, attr_name, type(attr)(timed(f'{cls.__name__}.{attr_name}')(func)))
+        elif callable(attr) and not isinstance(attr, type):
+            if getattr(attr, '_legatera_instrumented', False):
+                continue
+            setattr(cls, attr_name, timed(f'{cls.__name__}.{attr_name}')(attr))
+
+def _before_aws_call(context, **kwargs):
+    context['legatera_started'] = time.perf_counter()
+
+def _after_aws_call(http_response, model, context, **kwargs):
+    started = context.get('legatera_started')
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    labels = {'service': model.service_model.service_id.hyphenize(), 'operation': model.name}
+    registry.observe('legatera_aws_call_duration_seconds', labels, elapsed)
+    length = http_response.headers.get('content-length') if http_response is not None else None
+    if length:
+        registry.inc('legatera_aws_response_bytes_total', labels, int(length))
+    record_call('aws', f"{labels['service']}.{model.name}", elapsed)
+
+def instrument_boto_client(client):
+    """Time every API call made through a botocore client via its event hooks"""
+    from .aio import LazyClient
+    if isinstance(client, LazyClient):
+        # Instrumenting now would build the client, and import boto3, at startup
+        client.add_hook(instrument_boto_client)
+        return
+    if client is None or getattr(client, '_legatera_instrumented', False):
+        return
+    client.meta.events.register('before-call.*.*', _before_aws_call, unique_id='legatera-metrics-before')
+    client.meta.events.register('after-call.*.*', _after_aws_call, unique_id='legatera-metrics-after')
+    client._legatera_instrumented = True
+
+def instrument_dynamodb(resource):
+    """Instrument the client under a DynamoDB resource, or under each of a ThreadLocalResource's"""
+    from .aio import ThreadLocalResource
+    if isinstance(resource, ThreadLocalResource):
+        resource.add_hook(lambda built: instrument_boto_client(built.meta.client))
+    elif resource is not None:
+        instrument_boto_client(resource.meta.client)
+
+def record_upload(backend, size, seconds):
+    registry.observe('legatera_upload_duration_seconds', {'backend': backend}, seconds)
+    registry.inc('legatera_upload_bytes_total', {'backend': backend}, size)
+
+def _before_render(sender, template, context, **extra):
+    stats = _request_stats()
+    if stats is not None:
+        stats['render_started'].append(time.perf_counter())
+
+def _after_render(sender, template, context, **extra):
+    stats = _request_stats()
+    if stats is None or not stats['render_started']:
+        return
+    elapsed = time.perf_counter() - stats['render_started'].pop()
+    registry.observe('legatera_template_render_duration_seconds', {'template': template.name or ''}, elapsed)
+    stats['templates'][template.name] += 1
+    stats['templates_time'] += elapsed
+
+def _start_request():
+    g._metrics = {
+        'started': time.perf_counter(),
+        'models': Counter(), 'models_time': 0.0,
+        'aws': Counter(), 'aws_time': 0.0,
+        'templates': Counter(), 'templates_time': 0.0,
+        'read_units': 0.0, 'write_units': 0.0,
+        'render_started': []
+    }
+
+def _summarise(counter):
+    return ', '.join(f'{name} x{count}' for name, count in counter.most_common()) or 'none'
+
+def _finish_request(app, response):
+    stats = g.pop('_metrics', None)
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - stats['started']
+    endpoint = request.endpoint or 'unmatched'
+    labels = {'endpoint': endpoint, 'method': request.method, 'status': str(response.status_code)}
+    registry.observe('legatera_request_duration_seconds', labels, elapsed)
+    if response.content_length:
+        registry.inc('legatera_response_bytes_total', {'endpoint': endpoint}, response.content_length)
+    if app.config['METRICS_REQUEST_LOG']:
+        app.logger.info(
+            f"{request.method} {request.path} {response.status_code} {elapsed * 1000:.1f}ms | "
+            f"aws {sum(stats['aws'].values())} ({stats['aws_time'] * 1000:.1f}ms): {_summarise(stats['aws'])} | "
+            f"dynamodb {stats['read_units']:g} RCU / {stats['write_units']:g} WCU | "
+            f"models {sum(stats['models'].values())}: {_summarise(stats['models'])} | "
+            f"templates {stats['templates_time'] * 1000:.1f}ms: {_summarise(stats['templates'])}"
+        )
+    flush(app)
+    return response
+
+def init_app(app, model_classes=()):
+    """Install request, model, AWS and template instrumentation on an app"""
+    if not app.config['METRICS_ENABLED']:
+        return
+    for cls in model_classes:
+        instrument_class(cls)
+    instrument_boto_client(app.cognito_client)
+    instrument_boto_client(app.s3_client)
+    instrument_dynamodb(app.dynamodb)
+
+    if app.config['METRICS_REQUEST_LOG'] and app.logger.level == logging.NOTSET:
+        app.logger.setLevel(logging.INFO)
+    app.before_request(_start_request)
+    app.after_request(functools.partial(_finish_request, app))
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
@@ -1,19 +1,89 @@
+from contextlib import contextmanager
 from datetime import datetime
+from decimal import Decimal
 import uuid
 import json
 import os
-from flask import current_app
+import time
+from flask import current_app, g
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from . import login_manager
+from .aio import AsyncMethods
+from .capacity import TrackedTable, batch_write_item
+from .schema import Field, Schema
+
+# DynamoDB accepts at most 25 put/delete requests per BatchWriteItem call
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_MAX_ATTEMPTS = 8
+
+# and at most 100 actions per TransactWriteItems call
+TRANSACT_WRITE_SIZE = 100
+
+# Sparse GSI holding only users that have checked in, partitioned by day
+CHECKIN_INDEX = 'CheckInIndex'
+
+# Sort key of the materialized per-user asset aggregates
+ASSET_SUMMARY_SK = 'SUMMARY#ASSETS'
+
+# Fields shown in list views; local storage keeps them in a compact per-user index
+LISTING_FIELDS = {
+    'messages': ('id', 'recipient_id', 'created_at', 'delay_days'),
+    'assets': ('id', 'name', 'asset_type', 'value')
+}
+
+# Each user has one last wishes item; replaced versions go under the history prefix
+LAST_WISHES_SK = 'WISHES'
+LAST_WISHES_HISTORY_PREFIX = 'HISTORY#WISHES#'
+
+# Per-user counter bumped after every write, so cached pages can be keyed by it
+DATA_VERSION_SK = 'DATA_VERSION'
+
+def checkin_bucket(day):
+    """Return the check-in index partition for a date"""
+    return f'CHECKIN#{day.isoformat()}'
+
+# Records written before versioning existed have no version attribute
+VERSION_FIELD = Field('version', 0, decode=int)
+
+class ConcurrentUpdateError(Exception):
+    """Raised when a record was changed by someone else since it was loaded"""
+
+class ListingEntry:
+    """Listing fields of a record; the full record is loaded on demand"""
+
+    def __init__(self, fields):
+        self.__dict__.update(fields)
 
 class StorageModel:
     """Base class for storage operations (DynamoDB or local file system)"""
-    
+
+    # Stored field values as of the last load or write, in schema order; None for unsaved records
+    __slots__ = ('_persisted',)
+    # Stored fields; subclasses set __slots__ = schema.slots
+    schema = None
+    # Value of the 'type' attribute on the model's DynamoDB items
+    item_type = None
+    # Local storage file of the model's records
+    collection = None
+    # Sort key prefix of the model's items in a user's partition
+    sk_prefix = None
+    # Fields that feed search_document(); changing one re-indexes on update()
+    search_fields = ()
+    # Awaitable form of every method: await Model.aio.get_by_user_id(...), await record.aio.save()
+    aio = AsyncMethods()
+
+    def __init__(self, **values):
+        for attr, default in self.schema.defaults():
+            setattr(self, attr, default)
+        for attr, value in values.items():
+            setattr(self, attr, value)
+        self._persisted = None
+
     @classmethod
     def _get_storage_dir(cls):
         """Get the storage directory for local files"""
-        storage_dir = os.path.join(current_app.root_path, 'storage')
+        storage_dir = current_app.config.get('STORAGE_DIR') or os.path.join(current_app.root_path, 'storage')
         os.makedirs(storage_dir, exist_ok=True)
         return storage_dir
 
@@ -37,20 +107,413 @@ class StorageModel:
         file_path = cls._get_storage_file(type_name)
         with open(file_path, 'w') as f:
             json.dump(data, f, indent=2)
+        if type_name in LISTING_FIELDS:
+            cls._save_listing_index(type_name, data)
+
+    @classmethod
+    def _save_listing_index(cls, type_name, data):
+        """Write the per-user listing fields of a collection beside it"""
+        fields = LISTING_FIELDS[type_name]
+        index = {}
+        for record in data:
+            index.setdefault(record.get('user_id'), []).append({field: record.get(field) for field in fields})
+        with open(cls._get_storage_file(f'{type_name}_listing'), 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        return index
+
+    @classmethod
+    def _load_listing_index(cls, type_name):
+        file_path = cls._get_storage_file(f'{type_name}_listing')
+        if not os.path.exists(file_path):
+            # Written before the index existed; build it once from the full records
+            return cls._save_listing_index(type_name, cls._load_data(type_name))
+        with open(file_path, 'r') as f:
+            return json.load(f)
+
+    @classmethod
+    def _commit_local(cls, changes):
+        """Upsert records by id into local storage, rewriting each file once"""
+        for type_name, records in changes.items():
+            if not records:
+                continue
+            data = cls._load_data(type_name)
+            positions = {record['id']: index for index, record in enumerate(data)}
+            for record in records:
+                if record['id'] in positions:
+                    data[positions[record['id']]] = record
+                else:
+                    positions[record['id']] = len(data)
+                    data.append(record)
+            cls._save_data(type_name, data)
+
+    @staticmethod
+    def _get_table():
+        """Get the DynamoDB table handle, wrapped for capacity accounting"""
+        return TrackedTable(current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE']))
+
+    @classmethod
+    def _query_partition(cls, user_id, sk_prefix=None, **kwargs):
+        """Yield every item in a user's partition, following pagination"""
+        table = cls._get_table()
+        if sk_prefix:
+            kwargs['KeyConditionExpression'] = 'PK = :pk AND begins_with(SK, :sk)'
+            values = {':pk': f'USER#{user_id}', ':sk': sk_prefix}
+        else:
+            kwargs['KeyConditionExpression'] = 'PK = :pk'
+            values = {':pk': f'USER#{user_id}'}
+        kwargs['ExpressionAttributeValues'] = {**kwargs.get('ExpressionAttributeValues', {}), **values}
+        while True:
+            response = table.query(**kwargs)
+            yield from response['Items']
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    @classmethod
+    def _batch_write(cls, items):
+        """Put items with BatchWriteItem, retrying unprocessed items with backoff"""
+        table_name = current_app.config['DYNAMODB_TABLE']
+        written = 0
+        batch = []
+        for item in items:
+            batch.append({'PutRequest': {'Item': item}})
+            if len(batch) == BATCH_WRITE_SIZE:
+                written += cls._flush_batch(table_name, batch)
+                batch = []
+        if batch:
+            written += cls._flush_batch(table_name, batch)
+        return written
+
+    @staticmethod
+    def _flush_batch(table_name, requests):
+        """Send one BatchWriteItem request until DynamoDB has processed all of it"""
+        count = len(requests)
+        for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+            response = batch_write_item(RequestItems={table_name: requests})
+            requests = response.get('UnprocessedItems', {}).get(table_name)
+            if not requests:
+                return count
+            time.sleep(min(0.05 * 2 ** attempt, 2))
+        raise RuntimeError(f"{len(requests)} items still unprocessed after {BATCH_WRITE_MAX_ATTEMPTS} attempts")
+
+    @classmethod
+    def _transact_update(cls, records):
+        """Write the changed fields of many records with version-checked updates, 100 per transaction
+
+        A record changed since it was loaded cancels its whole transaction with
+        ConcurrentUpdateError; transactions sent before it stay written.
+        Data versions are left to the caller, to bump once for the batch.
+        """
+        from botocore.exceptions import ClientError
+        table = cls._get_table()
+        table_name = current_app.config['DYNAMODB_TABLE']
+        records = [record for record in records if record.changed_fields()]
+        for start in range(0, len(records), TRANSACT_WRITE_SIZE):
+            chunk = records[start:start + TRANSACT_WRITE_SIZE]
+            try:
+                table.transact_write_items(TransactItems=[
+                    {'Update': {'TableName': table_name, **record._update_request(record.changed_fields())}}
+                    for record in chunk
+                ])
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    raise
+                raise ConcurrentUpdateError(f"A record in a batch of {len(chunk)} changed since it was loaded") from e
+            for record in chunk:
+                record.version += 1
+                record._mark_clean()
+
+    @classmethod
+    def _listing_entry(cls, record):
+        return ListingEntry({field: record.get(field) for field in LISTING_FIELDS[cls.collection]})
+
+    @classmethod
+    def list_by_user_id(cls, user_id):
+        """Return a user's records for list views, without their heavy attributes"""
+        if current_app.dynamodb:
+            names = {f'#p{index}': field for index, field in enumerate(LISTING_FIELDS[cls.collection])}
+            items = cls._query_partition(user_id, cls.sk_prefix, ProjectionExpression=', '.join(names),
+                                         ExpressionAttributeNames=names)
+            return [cls._listing_entry(item) for item in items]
+        index = cls._load_listing_index(cls.collection)
+        return [cls._listing_entry(record) for record in index.get(user_id, [])]
+
+    @classmethod
+    def page_by_user_id(cls, user_id, limit, start=None, fields=None):
+        """Return up to limit of a user's records and where the next page starts, or None after the last
+
+        start is a DynamoDB ExclusiveStartKey, or an offset for local storage.
+        With fields only those attributes are read; records loaded that way
+        are for display, not for update().
+        """
+        if current_app.dynamodb:
+            kwargs = {'Limit': limit}
+            if start:
+                kwargs['ExclusiveStartKey'] = start
+            if fields:
+                names = {f'#p{index}': field for index, field in enumerate(fields)}
+                kwargs.update(ProjectionExpression=', '.join(names), ExpressionAttributeNames=names)
+            response = cls._get_table().query(
+                KeyConditionExpression='PK = :pk AND begins_with(SK, :sk)',
+                ExpressionAttributeValues={':pk': f'USER#{user_id}', ':sk': cls.sk_prefix},
+                **kwargs
+            )
+            return [cls.from_dynamo_item(item) for item in response['Items']], response.get('LastEvaluatedKey')
+        offset = start or 0
+        if fields and set(fields) <= set(LISTING_FIELDS.get(cls.collection, ())):
+            # The compact listing index keeps the records in the same order
+            records = cls._load_listing_index(cls.collection).get(user_id, [])
+        else:
+            records = [r for r in cls._load_data(cls.collection) if r['user_id'] == user_id]
+        end = offset + limit
+        return [cls.from_dict(r) for r in records[offset:end]], (end if end < len(records) else None)
+
+    @classmethod
+    def get_for_user(cls, user_id, record_id):
+        """Load one full record owned by user_id, or None"""
+        if current_app.dynamodb:
+            response = cls._get_table().get_item(Key={'PK': f'USER#{user_id}', 'SK': f'{cls.sk_prefix}{record_id}'})
+            return cls.from_dynamo_item(response['Item']) if 'Item' in response else None
+        record = next((r for r in cls._load_data(cls.collection)
+                       if r['id'] == record_id and r['user_id'] == user_id), None)
+        return cls.from_dict(record) if record else None
+
+    @classmethod
+    def from_dict(cls, data):
+        """Load a stored record without running __init__, so nothing is generated"""
+        if not data:
+            return None
+        record = cls.__new__(cls)
+        cls.schema.decode(data, record)
+        record._persisted = cls.schema.values(record)
+        return record
+
+    @classmethod
+    def from_dynamo_item(cls, item):
+        # Key and type attributes are not fields, so decoding skips them
+        return cls.from_dict(item)
+
+    def to_dict(self):
+        return self.schema.dump(self)
+
+    def to_dynamo_item(self):
+        return {**self._dynamo_key(), 'type': self.item_type, **self.schema.dump(self, dynamo=True)}
+
+    def _encode(self, values):
+        """Stored form of a tuple of field values, such as the persisted ones"""
+        return self.schema.encode(values)
+
+    def _insert(self):
+        """Write a new record to DynamoDB or append it to the local collection"""
+        if current_app.dynamodb:
+            self._get_table().put_item(Item=self.to_dynamo_item())
+        else:
+            records = self._load_data(self.collection)
+            records.append(self.to_dict())
+            self._save_data(self.collection, records)
+        self._mark_clean()
+        bump_data_version(*self.affected_users())
+
+    def affected_users(self):
+        """Users whose pages show this record"""
+        return (self.user_id,)
+
+    def _mark_clean(self, *fields):
+        """Remember the stored field values so update() can send only what changed
+
+        With field names, only those are marked as stored on a loaded record.
+        """
+        values = self.schema.values(self)
+        if fields:
+            if self._persisted is None:
+                return
+            persisted = list(self._persisted)
+            for field in fields:
+                position = self.schema.index[field]
+                persisted[position] = values[position]
+            values = tuple(persisted)
+        self._persisted = values
+
+    def _persisted_value(self, field):
+        """The value a field had when the record was loaded or saved, or None"""
+        if self._persisted is None:
+            return None
+        return self._persisted[self.schema.index[field]]
+
+    def changed_fields(self):
+        """Return {field: value} for fields modified since the record was loaded or saved"""
+        current = self.to_dict()
+        if self._persisted is None:
+            return current
+        stored = self._encode(self._persisted)
+        return {field: value for field, value in current.items()
+                if field != 'version' and stored[field] != value}
+
+    def _dynamo_key(self):
+        raise NotImplementedError
+
+    def _update_request(self, changes):
+        """Build an UpdateItem request that writes only the changed attributes
+
+        The record's version must still be the one that was loaded; records
+        written before versioning existed have no version attribute at all.
+        """
+        item = self.to_dynamo_item()
+        names = {'#version': 'version'}
+        values = {':expected': self.version, ':next': self.version + 1}
+        sets, removes = ['#version = :next'], []
+        for index, field in enumerate(sorted(changes)):
+            names[f'#f{index}'] = field
+            if item.get(field) is None:
+                removes.append(f'#f{index}')
+            else:
+                values[f':f{index}'] = item[field]
+                sets.append(f'#f{index} = :f{index}')
+        expression = 'SET ' + ', '.join(sets)
+        if removes:
+            expression += ' REMOVE ' + ', '.join(removes)
+        condition = ('attribute_exists(PK) AND (attribute_not_exists(#version) OR #version = :expected)'
+                     if self.version == 0 else 'attribute_exists(PK) AND #version = :expected')
+        return {
+            'Key': self._dynamo_key(),
+            'UpdateExpression': expression,
+            'ConditionExpression': condition,
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values
+        }
+
+    def _update_local(self, changes):
+        """Apply changes to the stored record in place, checking its version first"""
+        records = self._load_data(self.collection)
+        record = next((r for r in records if r['id'] == self.id), None)
+        if record is None or record.get('version', 0) != self.version:
+            raise ConcurrentUpdateError(f"{type(self).__name__} {self.id} changed since it was loaded")
+        record.update(changes, version=self.version + 1)
+        self._save_data(self.collection, records)
+
+    def _write_update(self, changes):
+        if current_app.dynamodb:
+            from botocore.exceptions import ClientError
+            try:
+                self._get_table().update_item(**self._update_request(changes))
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                raise ConcurrentUpdateError(f"{type(self).__name__} {self.id} changed since it was loaded") from e
+        else:
+            self._update_local(changes)
+
+    def update(self):
+        """Write only the fields changed since load, failing if the record changed meanwhile
+
+        Returns False without touching storage when nothing changed.
+        """
+        changes = self.changed_fields()
+        if not changes:
+            return False
+        self._write_update(changes)
+        self.version += 1
+        self._mark_clean()
+        bump_data_version(*self.affected_users())
+        if self.search_fields and any(field in changes for field in self.search_fields):
+            self._update_search_index()
+        return True
+
+    def search_document(self):
+        """Return (kind, doc_id, title, body) for full-text search, or None"""
+        return None
+
+    def _update_search_index(self):
+        """Index this record for search; a failure here never fails the save"""
+        document = self.search_document()
+        if not document:
+            return
+        try:
+            from . import search
+            search.index_document(self.user_id, *document)
+        except Exception as e:
+            current_app.logger.error(f"Search index error: {str(e)}")
 
     @staticmethod
     def create_id():
         """Create a unique ID"""
         return str(uuid.uuid4())
 
+def get_data_version(user_id):
+    """Return the user's data version; read it before the data it versions"""
+    if current_app.dynamodb:
+        response = StorageModel._get_table().get_item(
+            Key={'PK': f'USER#{user_id}', 'SK': DATA_VERSION_SK},
+            ProjectionExpression='data_version',
+            # Another worker may have just written; a stale version would serve stale pages
+            ConsistentRead=True
+        )
+        return int(response.get('Item', {}).get('data_version', 0))
+    return (StorageModel._load_data('data_versions') or {}).get(user_id, 0)
+
+def bump_data_version(*user_ids):
+    """Invalidate everything cached for these users; call after the write lands"""
+    deferred = g.get('deferred_data_versions')
+    if deferred is not None:
+        deferred.update(dict.fromkeys(user_ids))
+        return
+    user_ids = dict.fromkeys(user_ids)
+    # Drop versions this request already read (see fragments.data_version)
+    g.pop('data_versions', None)
+    if current_app.dynamodb:
+        table = StorageModel._get_table()
+        for user_id in user_ids:
+            table.update_item(
+                Key={'PK': f'USER#{user_id}', 'SK': DATA_VERSION_SK},
+                UpdateExpression='SET #type = :type ADD data_version :one',
+                ExpressionAttributeNames={'#type': 'type'},
+                ExpressionAttributeValues={':type': 'data_version', ':one': 1}
+            )
+        return
+    versions = StorageModel._load_data('data_versions') or {}
+    for user_id in user_ids:
+        versions[user_id] = versions.get(user_id, 0) + 1
+    StorageModel._save_data('data_versions', versions)
+
+@contextmanager
+def deferred_data_versions():
+    """Hold the data version bumps of a bulk write and bump each user once when it ends
+
+    Without this every record written costs another UpdateItem per affected user.
+    """
+    if g.get('deferred_data_versions') is not None:
+        yield
+        return
+    g.deferred_data_versions = {}
+    try:
+        yield
+    finally:
+        user_ids = g.pop('deferred_data_versions')
+        if user_ids:
+            bump_data_version(*user_ids)
+
 class User(UserMixin, StorageModel):
+    # UserMixin has no __slots__, so users still carry an (empty) __dict__
+    schema = Schema(
+        Field('id'),
+        Field('email'),
+        Field('password_hash'),
+        Field('first_name'),
+        Field('last_name'),
+        Field('is_trustee', False),
+        Field('created_at'),
+        Field('last_seen'),
+        VERSION_FIELD,
+        # Derived from last_seen; only written as the check-in index key
+        extra=('checkin_bucket',)
+    )
+    __slots__ = schema.slots
+    item_type = 'user'
+    collection = 'users'
+
     def __init__(self, email, password=None, first_name=None, last_name=None, is_trustee=False):
-        self.id = self.create_id()
-        self.email = email
-        self.first_name = first_name
-        self.last_name = last_name
-        self.is_trustee = is_trustee
-        self.created_at = datetime.utcnow().isoformat()
+        super().__init__(id=self.create_id(), email=email, first_name=first_name, last_name=last_name,
+                         is_trustee=is_trustee, created_at=datetime.utcnow().isoformat())
         if password:
             self.set_password(password)
 
@@ -60,40 +523,65 @@ class User(UserMixin, StorageModel):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def _dynamo_key(self):
+        return {'PK': f'USER#{self.id}', 'SK': f'PROFILE#{self.id}'}
+
+    def affected_users(self):
+        return (self.id,)
+
+    def to_dynamo_item(self):
+        item = super().to_dynamo_item()
+        # Index keys must be omitted rather than null to keep the GSI sparse
+        if self.checkin_bucket:
+            item['checkin_bucket'] = self.checkin_bucket
+        else:
+            del item['last_seen']
+        return item
+
     def save(self):
+        self._insert()
+
+    def record_check_in(self, now=None):
+        """Record that the user is alive in the day-bucketed check-in index
+
+        No page shows last_seen, so this leaves the data version alone.
+        """
+        now = now or datetime.utcnow()
+        bucket = checkin_bucket(now.date())
+        if bucket == self.checkin_bucket:
+            # Day granularity is all the sweep needs; skip repeat writes
+            return
+        self.last_seen = now.isoformat()
+        self.checkin_bucket = bucket
+        self._mark_clean('last_seen')
         if current_app.dynamodb:
-            table = current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE'])
-            item = {
-                'PK': f'USER#{self.id}',
-                'SK': f'PROFILE#{self.id}',
-                'type': 'user',
-                'id': self.id,
-                'email': self.email,
-                'password_hash': self.password_hash,
-                'first_name': self.first_name,
-                'last_name': self.last_name,
-                'is_trustee': self.is_trustee,
-                'created_at': self.created_at
-            }
-            table.put_item(Item=item)
+            self._get_table().update_item(
+                Key=self._dynamo_key(),
+                UpdateExpression='SET last_seen = :last_seen, checkin_bucket = :bucket',
+                ExpressionAttributeValues={':last_seen': self.last_seen, ':bucket': bucket}
+            )
         else:
             users = self._load_data('users')
-            user_data = {
-                'id': self.id,
-                'email': self.email,
-                'password_hash': self.password_hash,
-                'first_name': self.first_name,
-                'last_name': self.last_name,
-                'is_trustee': self.is_trustee,
-                'created_at': self.created_at
-            }
-            users.append(user_data)
+            for user_data in users:
+                if user_data['id'] == self.id:
+                    user_data['last_seen'] = self.last_seen
             self._save_data('users', users)
 
+            checkins = self._load_data('checkins') or {}
+            previous = checkins.setdefault('users', {}).get(self.id)
+            buckets = checkins.setdefault('buckets', {})
+            if previous and previous in buckets:
+                buckets[previous].pop(self.id, None)
+                if not buckets[previous]:
+                    del buckets[previous]
+            buckets.setdefault(bucket, {})[self.id] = self.last_seen
+            checkins['users'][self.id] = bucket
+            self._save_data('checkins', checkins)
+
     @classmethod
     def get_by_id(cls, user_id):
         if current_app.dynamodb:
-            table = current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE'])
+            table = cls._get_table()
             response = table.get_item(
                 Key={
                     'PK': f'USER#{user_id}',
@@ -111,7 +599,7 @@ class User(UserMixin, StorageModel):
     @classmethod
     def get_by_email(cls, email):
         if current_app.dynamodb:
-            table = current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE'])
+            table = cls._get_table()
             response = table.scan(
                 FilterExpression='email = :email',
                 ExpressionAttributeValues={':email': email}
@@ -124,63 +612,45 @@ class User(UserMixin, StorageModel):
             user_data = next((u for u in users if u['email'] == email), None)
             return cls.from_dict(user_data) if user_data else None
 
-    @staticmethod
-    def from_dict(data):
-        if not data:
-            return None
-        user = User(
-            email=data['email'],
-            first_name=data.get('first_name'),
-            last_name=data.get('last_name'),
-            is_trustee=data.get('is_trustee', False)
-        )
-        user.id = data['id']
-        user.password_hash = data['password_hash']
-        user.created_at = data['created_at']
+    @classmethod
+    def from_dict(cls, data):
+        user = super().from_dict(data)
+        if user and user.last_seen:
+            user.checkin_bucket = data.get('checkin_bucket') or checkin_bucket(
+                datetime.fromisoformat(user.last_seen).date())
         return user
 
-    @staticmethod
-    def from_dynamo_item(item):
-        return User.from_dict(item)
-
 class Trustee(StorageModel):
+    schema = Schema(
+        Field('id'),
+        Field('user_id'),
+        Field('trustee_user_id'),
+        Field('notification_triggered', False),
+        Field('triggered_at', encode=datetime.isoformat, decode=datetime.fromisoformat),
+        VERSION_FIELD
+    )
+    __slots__ = schema.slots
+    item_type = 'trustee'
+    collection = 'trustees'
+    sk_prefix = 'TRUSTEE#'
+
     def __init__(self, user_id, trustee_user_id):
-        self.id = self.create_id()
-        self.user_id = user_id
-        self.trustee_user_id = trustee_user_id
-        self.notification_triggered = False
-        self.triggered_at = None
+        super().__init__(id=self.create_id(), user_id=user_id, trustee_user_id=trustee_user_id)
+
+    def _dynamo_key(self):
+        return {'PK': f'USER#{self.user_id}', 'SK': f'{self.sk_prefix}{self.id}'}
+
+    def affected_users(self):
+        # The trustee's own dashboard lists the users they look after
+        return (self.user_id, self.trustee_user_id)
 
     def save(self):
-        if current_app.dynamodb:
-            table = current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE'])
-            item = {
-                'PK': f'USER#{self.user_id}',
-                'SK': f'TRUSTEE#{self.id}',
-                'type': 'trustee',
-                'id': self.id,
-                'user_id': self.user_id,
-                'trustee_user_id': self.trustee_user_id,
-                'notification_triggered': self.notification_triggered,
-                'triggered_at': self.triggered_at.isoformat() if self.triggered_at else None
-            }
-            table.put_item(Item=item)
-        else:
-            trustees = self._load_data('trustees')
-            trustee_data = {
-                'id': self.id,
-                'user_id': self.user_id,
-                'trustee_user_id': self.trustee_user_id,
-                'notification_triggered': self.notification_triggered,
-                'triggered_at': self.triggered_at.isoformat() if self.triggered_at else None
-            }
-            trustees.append(trustee_data)
-            self._save_data('trustees', trustees)
+        self._insert()
 
     @classmethod
     def get_by_user_id(cls, user_id):
         if current_app.dynamodb:
-            table = current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE'])
+            table = cls._get_table()
             response = table.query(
                 KeyConditionExpression='PK = :pk AND begins_with(SK, :sk)',
                 ExpressionAttributeValues={
@@ -196,7 +666,7 @@ class Trustee(StorageModel):
     @classmethod
     def get_by_trustee_id(cls, trustee_id):
         if current_app.dynamodb:
-            table = current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE'])
+            table = cls._get_table()
             response = table.scan(
                 FilterExpression='trustee_user_id = :trustee_id',
                 ExpressionAttributeValues={':trustee_id': trustee_id}
@@ -206,74 +676,120 @@ class Trustee(StorageModel):
             trustees = cls._load_data('trustees')
             return [cls.from_dict(t) for t in trustees if t['trustee_user_id'] == trustee_id]
 
-    @staticmethod
-    def from_dict(data):
-        if not data:
-            return None
-        trustee = Trustee(
-            user_id=data['user_id'],
-            trustee_user_id=data['trustee_user_id']
-        )
-        trustee.id = data['id']
-        trustee.notification_triggered = data['notification_triggered']
-        trustee.triggered_at = datetime.fromisoformat(data['triggered_at']) if data['triggered_at'] else None
-        return trustee
-
-    @staticmethod
-    def from_dynamo_item(item):
-        return Trustee.from_dict(item)
 
 @login_manager.user_loader
 def load_user(user_id):
     return User.get_by_id(user_id)
 
 class Message(StorageModel):
+    schema = Schema(
+        Field('id'),
+        Field('user_id'),
+        Field('recipient_id'),
+        # Read through the content property, which fetches an offloaded body
+        Field('content', attr='_content'),
+        # Set when the body lives in blob storage instead of the record
+        Field('content_ref'),
+        Field('content_sha256'),
+        Field('content_size', decode=int),
+        Field('content_preview'),
+        Field('media_url'),
+        Field('delay_days', 0, decode=int),
+        Field('created_at'),
+        Field('sent_at'),
+        Field('release_at'),
+        VERSION_FIELD
+    )
+    __slots__ = schema.slots
+    item_type = 'message'
+    collection = 'messages'
+    sk_prefix = 'MESSAGE#'
+    # An offloaded body changes through its hash, not the inline content field
+    search_fields = ('recipient_id', 'content', 'content_sha256')
+
     def __init__(self, user_id, recipient_id, content, media_url=None, delay_days=0):
-        self.id = self.create_id()
-        self.user_id = user_id
-        self.recipient_id = recipient_id
-        self.content = content
-        self.media_url = media_url
-        self.delay_days = delay_days
-        self.created_at = datetime.utcnow().isoformat()
-        self.sent_at = None
+        super().__init__(id=self.create_id(), user_id=user_id, recipient_id=recipient_id, content=content,
+                         media_url=media_url, delay_days=delay_days, created_at=datetime.utcnow().isoformat())
+
+    @property
+    def content(self):
+        """The message body, fetched from blob storage on first access if offloaded"""
+        if self._content is None and self.content_ref:
+            from . import blobs
+            self._content = blobs.load_text(self.content_ref, self.content_sha256)
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+
+    def offload_body(self):
+        """Move a body over MESSAGE_INLINE_MAX_BYTES to blob storage, keeping a pointer, hash and preview"""
+        if self._content is None:
+            # Never loaded, so unchanged
+            return
+        data = self._content.encode('utf-8')
+        config = current_app.config
+        if len(data) <= config['MESSAGE_INLINE_MAX_BYTES']:
+            self.content_ref = self.content_sha256 = self.content_size = self.content_preview = None
+            return
+        from . import blobs
+        digest = blobs.text_digest(data)
+        if digest == self.content_sha256:
+            return
+        # The hash is part of the key, so an edit never overwrites a body another reader points at
+        key = f'message-bodies/{self.user_id}/{self.id}/{digest[:16]}.z'
+        blobs.store_text(key, data)
+        self.content_ref = key
+        self.content_sha256 = digest
+        self.content_size = len(data)
+        self.content_preview = self._content[:config['MESSAGE_PREVIEW_CHARS']]
+
+    @staticmethod
+    def _inline_only(data):
+        if data['content_ref']:
+            # An offloaded body is only stored in blob storage
+            data['content'] = None
+        return data
+
+    def to_dict(self):
+        return self._inline_only(super().to_dict())
+
+    def to_dynamo_item(self):
+        return self._inline_only(super().to_dynamo_item())
+
+    def _encode(self, values):
+        return self._inline_only(super()._encode(values))
+
+    def _dynamo_key(self):
+        return {'PK': f'USER#{self.user_id}', 'SK': f'{self.sk_prefix}{self.id}'}
 
     def save(self):
-        if current_app.dynamodb:
-            table = current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE'])
-            item = {
-                'PK': f'USER#{self.user_id}',
-                'SK': f'MESSAGE#{self.id}',
-                'type': 'message',
-                'id': self.id,
-                'user_id': self.user_id,
-                'recipient_id': self.recipient_id,
-                'content': self.content,
-                'media_url': self.media_url,
-                'delay_days': self.delay_days,
-                'created_at': self.created_at,
-                'sent_at': self.sent_at
-            }
-            table.put_item(Item=item)
-        else:
-            messages = self._load_data('messages')
-            message_data = {
-                'id': self.id,
-                'user_id': self.user_id,
-                'recipient_id': self.recipient_id,
-                'content': self.content,
-                'media_url': self.media_url,
-                'delay_days': self.delay_days,
-                'created_at': self.created_at,
-                'sent_at': self.sent_at
-            }
-            messages.append(message_data)
-            self._save_data('messages', messages)
+        self.offload_body()
+        self._insert()
+        self._update_search_index()
+
+    def update(self):
+        from . import blobs
+        previous_ref = self._persisted_value('content_ref')
+        self.offload_body()
+        try:
+            changed = super().update()
+        except ConcurrentUpdateError:
+            if self.content_ref and self.content_ref != previous_ref:
+                blobs.delete(self.content_ref)
+            raise
+        if previous_ref and previous_ref != self.content_ref:
+            blobs.delete(previous_ref)
+        return changed
+
+    def search_document(self):
+        return 'message', f'message:{self.id}', self.recipient_id, self.content
 
     @classmethod
     def get_by_user_id(cls, user_id):
         if current_app.dynamodb:
-            table = current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE'])
+            table = cls._get_table()
             response = table.query(
                 KeyConditionExpression='PK = :pk AND begins_with(SK, :sk)',
                 ExpressionAttributeValues={
@@ -286,70 +802,234 @@ class Message(StorageModel):
             messages = cls._load_data('messages')
             return [cls.from_dict(m) for m in messages if m['user_id'] == user_id]
 
-    @staticmethod
-    def from_dict(data):
-        if not data:
-            return None
-        message = Message(
-            user_id=data['user_id'],
-            recipient_id=data['recipient_id'],
-            content=data['content'],
-            media_url=data.get('media_url'),
-            delay_days=data['delay_days']
-        )
-        message.id = data['id']
-        message.created_at = data['created_at']
-        message.sent_at = data.get('sent_at')
-        return message
 
-    @staticmethod
-    def from_dynamo_item(item):
-        return Message.from_dict(item)
+def to_decimal(value):
+    """Convert a numeric value to Decimal, which DynamoDB requires instead of float"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+class AssetSummary:
+    """Per-user asset counts and value totals, overall and by asset type
+
+    by_type only holds types the user has assets of. A type whose count
+    drops to zero is dropped locally; on DynamoDB, where the summary is
+    moved with ADD and its attributes stay at zero, it is skipped on read.
+    """
+
+    def __init__(self, user_id, count=0, total_value=None, by_type=None):
+        self.user_id = user_id
+        self.count = count
+        self.total_value = total_value if total_value is not None else Decimal('0')
+        self.by_type = by_type or {}
+
+    def add(self, asset_type, value, count=1):
+        entry = self.by_type.setdefault(asset_type, {'count': 0, 'total_value': Decimal('0')})
+        entry['count'] += count
+        entry['total_value'] += value
+        if not entry['count']:
+            del self.by_type[asset_type]
+        self.count += count
+        self.total_value += value
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'count': self.count,
+            'total_value': str(self.total_value),
+            'by_type': {t: {'count': e['count'], 'total_value': str(e['total_value'])}
+                        for t, e in self.by_type.items()}
+        }
+
+    def to_dynamo_item(self):
+        item = {
+            'PK': f'USER#{self.user_id}',
+            'SK': ASSET_SUMMARY_SK,
+            'type': 'asset_summary',
+            'user_id': self.user_id,
+            'asset_count': self.count,
+            'total_value': self.total_value
+        }
+        for asset_type, entry in self.by_type.items():
+            item[f'count_{asset_type}'] = entry['count']
+            item[f'value_{asset_type}'] = entry['total_value']
+        return item
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls(data['user_id'], data['count'], Decimal(data['total_value']))
+        for asset_type, entry in data.get('by_type', {}).items():
+            if entry['count']:
+                summary.by_type[asset_type] = {'count': entry['count'],
+                                               'total_value': Decimal(entry['total_value'])}
+        return summary
+
+    @classmethod
+    def from_dynamo_item(cls, item):
+        summary = cls(item['user_id'], int(item.get('asset_count', 0)), item.get('total_value', Decimal('0')))
+        for key, count in item.items():
+            if key.startswith('count_') and count:
+                asset_type = key[len('count_'):]
+                summary.by_type[asset_type] = {'count': int(count),
+                                               'total_value': item.get(f'value_{asset_type}', Decimal('0'))}
+        return summary
 
 class Asset(StorageModel):
+    schema = Schema(
+        Field('id'),
+        Field('user_id'),
+        Field('name'),
+        Field('description'),
+        Field('asset_type'),
+        # JSON keeps the exact decimal as a string; DynamoDB stores the number
+        Field('value', encode=str, decode=to_decimal, native=True),
+        Field('location'),
+        VERSION_FIELD
+    )
+    __slots__ = schema.slots
+    item_type = 'asset'
+    collection = 'assets'
+    sk_prefix = 'ASSET#'
+    search_fields = ('name', 'description', 'location')
+
     def __init__(self, user_id, name, description=None, asset_type=None, value=None, location=None):
-        self.id = self.create_id()
-        self.user_id = user_id
-        self.name = name
-        self.description = description
-        self.asset_type = asset_type
-        self.value = value
-        self.location = location
+        super().__init__(id=self.create_id(), user_id=user_id, name=name, description=description,
+                         asset_type=asset_type, value=to_decimal(value), location=location)
+
+    @property
+    def summary_type(self):
+        return self.asset_type or 'other'
+
+    @classmethod
+    def _listing_entry(cls, record):
+        entry = super()._listing_entry(record)
+        entry.value = to_decimal(entry.value)
+        return entry
+
+    def _dynamo_key(self):
+        return {'PK': f'USER#{self.user_id}', 'SK': f'{self.sk_prefix}{self.id}'}
 
     def save(self):
+        deltas = {self.summary_type: (1, self.value or Decimal('0'))}
         if current_app.dynamodb:
-            table = current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE'])
-            item = {
-                'PK': f'USER#{self.user_id}',
-                'SK': f'ASSET#{self.id}',
-                'type': 'asset',
-                'id': self.id,
-                'user_id': self.user_id,
-                'name': self.name,
-                'description': self.description,
-                'asset_type': self.asset_type,
-                'value': self.value,
-                'location': self.location
-            }
-            table.put_item(Item=item)
+            table_name = current_app.config['DYNAMODB_TABLE']
+            # Put the asset and bump the summary in one transaction so they never drift
+            self._get_table().transact_write_items(TransactItems=[
+                {'Put': {'TableName': table_name, 'Item': self.to_dynamo_item()}},
+                {'Update': {'TableName': table_name, **self._summary_update(self.user_id, deltas)}}
+            ])
         else:
             assets = self._load_data('assets')
-            asset_data = {
-                'id': self.id,
-                'user_id': self.user_id,
-                'name': self.name,
-                'description': self.description,
-                'asset_type': self.asset_type,
-                'value': self.value,
-                'location': self.location
-            }
-            assets.append(asset_data)
+            assets.append(self.to_dict())
             self._save_data('assets', assets)
+            self._add_to_local_summary(self.user_id, deltas)
+        self._mark_clean()
+        bump_data_version(self.user_id)
+        self._update_search_index()
+
+    def _summary_deltas(self, changes):
+        """Summary adjustments for moving this asset from its stored type and value"""
+        if 'asset_type' not in changes and 'value' not in changes:
+            return {}
+        old_type = self._persisted_value('asset_type') or 'other'
+        old_value = self._persisted_value('value') or Decimal('0')
+        deltas = {old_type: (-1, -old_value)}
+        count, value = deltas.get(self.summary_type, (0, Decimal('0')))
+        deltas[self.summary_type] = (count + 1, value + (self.value or Decimal('0')))
+        return deltas
+
+    def _write_update(self, changes):
+        deltas = self._summary_deltas(changes)
+        if not deltas:
+            return super()._write_update(changes)
+        if current_app.dynamodb:
+            from botocore.exceptions import ClientError
+            table_name = current_app.config['DYNAMODB_TABLE']
+            try:
+                # The summary only moves if the asset update's version check passes
+                self._get_table().transact_write_items(TransactItems=[
+                    {'Update': {'TableName': table_name, **self._update_request(changes)}},
+                    {'Update': {'TableName': table_name, **self._summary_update(self.user_id, deltas)}}
+                ])
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    raise
+                raise ConcurrentUpdateError(f"Asset {self.id} changed since it was loaded") from e
+        else:
+            self._update_local(changes)
+            self._add_to_local_summary(self.user_id, deltas)
+
+    def search_document(self):
+        body = '\n'.join(part for part in (self.description, self.location) if part)
+        return 'asset', f'asset:{self.id}', self.name, body
+
+    @staticmethod
+    def _summary_update(user_id, deltas):
+        """Build an UpdateItem request that ADDs {asset_type: (count, value)} to the summary"""
+        names = {'#type': 'type'}
+        values = {':user_id': user_id, ':summary': 'asset_summary', ':count': 0, ':value': Decimal('0')}
+        adds = ['asset_count :count', 'total_value :value']
+        for index, (asset_type, (count, value)) in enumerate(sorted(deltas.items())):
+            names[f'#c{index}'] = f'count_{asset_type}'
+            names[f'#v{index}'] = f'value_{asset_type}'
+            values[f':c{index}'] = count
+            values[f':v{index}'] = value
+            values[':count'] += count
+            values[':value'] += value
+            adds.extend([f'#c{index} :c{index}', f'#v{index} :v{index}'])
+        return {
+            'Key': {'PK': f'USER#{user_id}', 'SK': ASSET_SUMMARY_SK},
+            'UpdateExpression': 'SET user_id = :user_id, #type = :summary ADD ' + ', '.join(adds),
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values
+        }
+
+    @classmethod
+    def _add_to_local_summary(cls, user_id, deltas):
+        summaries = cls._load_data('asset_summaries') or {}
+        summary = (AssetSummary.from_dict(summaries[user_id])
+                   if user_id in summaries else AssetSummary(user_id))
+        for asset_type, (count, value) in deltas.items():
+            summary.add(asset_type, value, count)
+        summaries[user_id] = summary.to_dict()
+        cls._save_data('asset_summaries', summaries)
+
+    @classmethod
+    def get_summary(cls, user_id):
+        """Read the materialized asset summary with a single lookup"""
+        if current_app.dynamodb:
+            response = cls._get_table().get_item(Key={'PK': f'USER#{user_id}', 'SK': ASSET_SUMMARY_SK})
+            if 'Item' not in response:
+                return AssetSummary(user_id)
+            return AssetSummary.from_dynamo_item(response['Item'])
+        summaries = cls._load_data('asset_summaries') or {}
+        if user_id not in summaries:
+            return AssetSummary(user_id)
+        return AssetSummary.from_dict(summaries[user_id])
+
+    @classmethod
+    def rebuild_summary(cls, user_id, assets=None):
+        """Recompute a user's asset summary from their assets and overwrite it"""
+        if assets is None:
+            assets = cls.get_by_user_id(user_id)
+        summary = AssetSummary(user_id)
+        for asset in assets:
+            summary.add(asset.summary_type, asset.value or Decimal('0'))
+        if current_app.dynamodb:
+            cls._get_table().put_item(Item=summary.to_dynamo_item())
+        else:
+            summaries = cls._load_data('asset_summaries') or {}
+            summaries[user_id] = summary.to_dict()
+            cls._save_data('asset_summaries', summaries)
+        bump_data_version(user_id)
+        return summary
 
     @classmethod
     def get_by_user_id(cls, user_id):
         if current_app.dynamodb:
-            table = current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE'])
+            table = cls._get_table()
             response = table.query(
                 KeyConditionExpression='PK = :pk AND begins_with(SK, :sk)',
                 ExpressionAttributeValues={
@@ -362,96 +1042,104 @@ class Asset(StorageModel):
             assets = cls._load_data('assets')
             return [cls.from_dict(a) for a in assets if a['user_id'] == user_id]
 
-    @staticmethod
-    def from_dict(data):
-        if not data:
-            return None
-        asset = Asset(
-            user_id=data['user_id'],
-            name=data['name'],
-            description=data.get('description'),
-            asset_type=data.get('asset_type'),
-            value=data.get('value'),
-            location=data.get('location')
-        )
-        asset.id = data['id']
-        return asset
-
-    @staticmethod
-    def from_dynamo_item(item):
-        return Asset.from_dict(item)
 
 class LastWishes(StorageModel):
+    schema = Schema(
+        Field('id'),
+        Field('user_id'),
+        Field('funeral_preferences'),
+        Field('special_requests'),
+        Field('personal_message'),
+        Field('updated_at'),
+        VERSION_FIELD
+    )
+    __slots__ = schema.slots
+    item_type = 'last_wishes'
+    collection = 'last_wishes'
+    search_fields = ('funeral_preferences', 'special_requests', 'personal_message')
+
     def __init__(self, user_id, funeral_preferences=None, special_requests=None, personal_message=None):
-        self.id = self.create_id()
-        self.user_id = user_id
-        self.funeral_preferences = funeral_preferences
-        self.special_requests = special_requests
-        self.personal_message = personal_message
-        self.updated_at = datetime.utcnow().isoformat()
+        super().__init__(id=self.create_id(), user_id=user_id, funeral_preferences=funeral_preferences,
+                         special_requests=special_requests, personal_message=personal_message,
+                         updated_at=datetime.utcnow().isoformat())
+
+    def _dynamo_key(self):
+        return {'PK': f'USER#{self.user_id}', 'SK': LAST_WISHES_SK}
 
     def save(self):
+        """Create or replace the user's single wishes record
+
+        A record that was loaded is updated in place with a version check,
+        and with LAST_WISHES_HISTORY on the text it replaced is kept. A new
+        record is only written if the user has none, so wishes saved since
+        the caller found none are not overwritten.
+        """
+        if self._persisted is not None:
+            previous = self._encode(self._persisted)
+            if self.update() and current_app.config['LAST_WISHES_HISTORY']:
+                self.save_history(self.user_id, [previous])
+            return
         if current_app.dynamodb:
-            table = current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE'])
-            item = {
-                'PK': f'USER#{self.user_id}',
-                'SK': f'WISHES#{self.id}',
-                'type': 'last_wishes',
-                'id': self.id,
-                'user_id': self.user_id,
-                'funeral_preferences': self.funeral_preferences,
-                'special_requests': self.special_requests,
-                'personal_message': self.personal_message,
-                'updated_at': self.updated_at
-            }
-            table.put_item(Item=item)
+            from botocore.exceptions import ClientError
+            try:
+                self._get_table().put_item(Item=self.to_dynamo_item(),
+                                           ConditionExpression='attribute_not_exists(PK)')
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                raise ConcurrentUpdateError(f"Last wishes of user {self.user_id} were saved elsewhere") from e
         else:
             wishes = self._load_data('last_wishes')
-            wish_data = {
-                'id': self.id,
-                'user_id': self.user_id,
-                'funeral_preferences': self.funeral_preferences,
-                'special_requests': self.special_requests,
-                'personal_message': self.personal_message,
-                'updated_at': self.updated_at
-            }
-            # Remove any existing wishes for this user
-            wishes = [w for w in wishes if w['user_id'] != self.user_id]
-            wishes.append(wish_data)
+            if any(w['user_id'] == self.user_id for w in wishes):
+                raise ConcurrentUpdateError(f"Last wishes of user {self.user_id} were saved elsewhere")
+            wishes.append(self.to_dict())
             self._save_data('last_wishes', wishes)
+        self._mark_clean()
+        bump_data_version(self.user_id)
+        self._update_search_index()
+
+    def search_document(self):
+        body = '\n'.join(part for part in (self.funeral_preferences, self.special_requests,
+                                            self.personal_message) if part)
+        # One document per user: newer wishes replace the indexed text
+        return 'last_wishes', 'last_wishes', 'Last wishes', body
+
+    @classmethod
+    def save_history(cls, user_id, records):
+        """Store replaced versions of a user's wishes, keyed by when they were written
+
+        A version without updated_at is dated now, when it was replaced.
+        """
+        replaced_at = datetime.utcnow().isoformat()
+        records = [dict(record, updated_at=record.get('updated_at') or replaced_at) for record in records]
+        if current_app.dynamodb:
+            cls._batch_write({
+                'PK': f'USER#{user_id}',
+                'SK': f"{LAST_WISHES_HISTORY_PREFIX}{record['updated_at']}",
+                'type': 'last_wishes_history',
+                **record
+            } for record in records)
+        else:
+            history = cls._load_data('last_wishes_history')
+            history.extend(records)
+            cls._save_data('last_wishes_history', history)
+
+    @classmethod
+    def get_history(cls, user_id):
+        """Return earlier versions of a user's wishes, newest first"""
+        if current_app.dynamodb:
+            items = cls._query_partition(user_id, LAST_WISHES_HISTORY_PREFIX, ScanIndexForward=False)
+            return [cls.from_dynamo_item(item) for item in items]
+        history = [w for w in cls._load_data('last_wishes_history') if w['user_id'] == user_id]
+        return [cls.from_dict(w) for w in sorted(history, key=lambda w: w['updated_at'], reverse=True)]
 
     @classmethod
     def get_by_user_id(cls, user_id):
         if current_app.dynamodb:
-            table = current_app.dynamodb.Table(current_app.config['DYNAMODB_TABLE'])
-            response = table.query(
-                KeyConditionExpression='PK = :pk AND begins_with(SK, :sk)',
-                ExpressionAttributeValues={
-                    ':pk': f'USER#{user_id}',
-                    ':sk': 'WISHES#'
-                }
-            )
-            items = response['Items']
-            return cls.from_dynamo_item(items[0]) if items else None
+            response = cls._get_table().get_item(Key={'PK': f'USER#{user_id}', 'SK': LAST_WISHES_SK})
+            return cls.from_dynamo_item(response['Item']) if 'Item' in response else None
         else:
             wishes = cls._load_data('last_wishes')
             wish_data = next((w for w in wishes if w['user_id'] == user_id), None)
             return cls.from_dict(wish_data) if wish_data else None
 
-    @staticmethod
-    def from_dict(data):
-        if not data:
-            return None
-        wishes = LastWishes(
-            user_id=data['user_id'],
-            funeral_preferences=data.get('funeral_preferences'),
-            special_requests=data.get('special_requests'),
-            personal_message=data.get('personal_message')
-        )
-        wishes.id = data['id']
-        wishes.updated_at = data['updated_at']
-        return wishes
-
-    @staticmethod
-    def from_dynamo_item(item):
-        return LastWishes.from_dict(item)
@@ -0,0 +1,98 @@
+import os
+import random
+import re
+import time
+from datetime import datetime
+from flask import g, request
+from itsdangerous import BadSignature, TimestampSigner
+
+PROFILE_SALT = 'legatera-profile'
+_FILENAME_RE = re.compile(r'^[\w.-]+\.pstats$')
+
+def _signer(app):
+    return TimestampSigner(app.config['SECRET_KEY'], salt=PROFILE_SALT)
+
+def create_token(app):
+    """Create a header value that enables profiling for requests carrying it"""
+    return _signer(app).sign(b'profile').decode('ascii')
+
+def _token_valid(app, token):
+    try:
+        _signer(app).unsign(token, max_age=app.config['PROFILE_TOKEN_MAX_AGE'])
+        return True
+    except BadSignature:
+        return False
+
+def profile_dir(app):
+    directory = app.config.get('PROFILE_DIR')
+    if not directory:
+        from .models import StorageModel
+        directory = os.path.join(StorageModel._get_storage_dir(), 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def list_profiles(app):
+    """Return saved profiles, newest first"""
+    directory = profile_dir(app)
+    entries = []
+    for name in os.listdir(directory):
+        if _FILENAME_RE.match(name):
+            stat = os.stat(os.path.join(directory, name))
+            entries.append({'name': name, 'size': stat.st_size,
+                            'created_at': datetime.utcfromtimestamp(stat.st_mtime).isoformat()})
+    return sorted(entries, key=lambda e: (e['created_at'], e['name']), reverse=True)
+
+def valid_profile_name(name):
+    return bool(_FILENAME_RE.match(name))
+
+def _rotate(directory, keep):
+    names = sorted((n for n in os.listdir(directory) if _FILENAME_RE.match(n)),
+                   key=lambda n: (os.path.getmtime(os.path.join(directory, n)), n))
+    for name in names[:max(len(names) - keep, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+def _should_profile(app):
+    header = request.headers.get(app.config['PROFILE_HEADER'])
+    if header:
+        return _token_valid(app, header)
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+def _start(app):
+    # Two dict lookups when profiling is off, so untouched requests pay nothing
+    if not app.config['PROFILE_SAMPLE_RATE'] and app.config['PROFILE_HEADER'] not in request.headers:
+        return
+    if not _should_profile(app):
+        return
+    import cProfile
+    g._profiler = cProfile.Profile()
+    g._profile_started = time.perf_counter()
+    g._profiler.enable()
+
+def _finish(app, response):
+    profiler = g.pop('_profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    elapsed_ms = (time.perf_counter() - g.pop('_profile_started')) * 1000
+    try:
+        import pstats
+        directory = profile_dir(app)
+        endpoint = re.sub(r'[^\w.-]', '_', request.endpoint or 'unmatched')
+        name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{endpoint}-{os.getpid()}-{elapsed_ms:.0f}ms.pstats"
+        pstats.Stats(profiler).dump_stats(os.path.join(directory, name))
+        _rotate(directory, app.config['PROFILE_MAX_FILES'])
+        response.headers['X-Legatera-Profile-Id'] = name
+    except Exception as e:
+        app.logger.error(f"Profile write error: {str(e)}")
+    return response
+
+def init_app(app):
+    """Profile a view when the request carries a signed header or is sampled"""
+    if not app.config['PROFILING_ENABLED']:
+        return
+    app.before_request(lambda: _start(app))
+    app.after_request(lambda response: _finish(app, response))
@@ -1,16 +1,60 @@
 from datetime import datetime
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from flask import (Blueprint, render_template, redirect, url_for, flash, request, current_app, session,
+                   Response, make_response, stream_with_context, abort, jsonify, send_from_directory)
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
-from botocore.exceptions import ClientError
-from .models import User, Trustee, Message, Asset, LastWishes
+from .models import User, Trustee, Message, Asset, LastWishes, ConcurrentUpdateError
+from .triggers import trigger_user
+from . import fragments, metrics, profiling
+from .api import ApiError, collection_page, json_response, last_wishes_record
+from functools import wraps
 from .forms import (RegistrationForm, LoginForm, TrusteeForm, RecipientForm, 
-                   MessageForm, LastWishesForm, AssetForm, DocumentForm)
+                   MessageForm, LastWishesForm, AssetForm, DocumentForm, ImportForm, recipient_choices)
 import os
+import time
 
 main = Blueprint('main', __name__)
 auth = Blueprint('auth', __name__)
 dashboard = Blueprint('dashboard', __name__)
+admin = Blueprint('admin', __name__, url_prefix='/admin')
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+def admin_required(view):
+    """Restrict a view to users listed in ADMIN_EMAILS"""
+    @wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        if (current_user.email or '').lower() not in current_app.config['ADMIN_EMAILS']:
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapped
+
+def versioned_page(view):
+    """Answer If-None-Match with 304 while the current user's data is unchanged
+
+    The ETag comes from the data version, so revalidating costs one small
+    read instead of loading and rendering the page. A page with pending
+    flash messages differs from any copy the browser holds and is always
+    sent in full.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if session.get('_flashes'):
+            return view(*args, **kwargs)
+        etag = fragments.page_etag(request.endpoint, current_user.id)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        # Per-user HTML: browsers may keep it but must revalidate, shared caches may not store it
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response
+    return wrapped
 
 def handle_file_upload(file, folder='general'):
     """Handle file upload for both S3 and local storage"""
@@ -18,6 +62,7 @@ def handle_file_upload(file, folder='general'):
         return None
         
     filename = secure_filename(file.filename)
+    started = time.perf_counter()
     
     if current_app.s3_client:
         try:
@@ -28,6 +73,7 @@ def handle_file_upload(file, folder='general'):
                 unique_filename,
                 ExtraArgs={'ACL': 'private'}
             )
+            metrics.record_upload('s3', file.stream.tell(), time.perf_counter() - started)
             return unique_filename
         except Exception as e:
             current_app.logger.error(f"Error uploading to S3: {str(e)}")
@@ -39,12 +85,29 @@ def handle_file_upload(file, folder='general'):
         unique_filename = f"{current_user.id}_{filename}"
         file_path = os.path.join(upload_folder, unique_filename)
         file.save(file_path)
+        metrics.record_upload('local', os.path.getsize(file_path), time.perf_counter() - started)
         return f"uploads/{folder}/{unique_filename}"
 
+def record_check_in(user):
+    """Record a login for the inactivity sweep without ever failing the login"""
+    try:
+        user.record_check_in()
+    except Exception as e:
+        current_app.logger.error(f"Check-in error: {str(e)}")
+
 @main.route('/')
 def home():
     return render_template('home.html', now=datetime.utcnow())
 
+@main.route('/metrics')
+def metrics_endpoint():
+    # Metrics name endpoints and traffic, so they are only served to a scraper holding the token
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token or request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+    return Response(metrics.render_prometheus(metrics.collect(current_app)),
+                    mimetype='text/plain; version=0.0.4')
+
 @auth.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
@@ -63,6 +126,7 @@ def register():
             
             # Try Cognito registration if available
             if current_app.cognito_client:
+                from botocore.exceptions import ClientError
                 try:
                     current_app.cognito_client.sign_up(
                         ClientId=current_app.config['COGNITO_APP_CLIENT_ID'],
@@ -101,6 +165,7 @@ def login():
         try:
             # Try Cognito authentication if available
             if current_app.cognito_client:
+                from botocore.exceptions import ClientError
                 try:
                     auth_response = current_app.cognito_client.initiate_auth(
                         ClientId=current_app.config['COGNITO_APP_CLIENT_ID'],
@@ -123,6 +188,7 @@ def login():
             user = User.get_by_email(form.email.data)
             if user and (not current_app.cognito_client or user.check_password(form.password.data)):
                 login_user(user)
+                record_check_in(user)
                 next_page = request.args.get('next')
                 return redirect(next_page or url_for('dashboard.user_dashboard'))
             else:
@@ -140,31 +206,81 @@ def logout():
     logout_user()
     return redirect(url_for('main.home'))
 
+def render_user_dashboard():
+    """Render the data-dependent part of the dashboard"""
+    # Listing fields only; message text and asset details load on their own pages
+    return render_template('dashboard/user_content.html',
+                           trustees=Trustee.get_by_user_id(current_user.id),
+                           messages=Message.list_by_user_id(current_user.id),
+                           assets=Asset.list_by_user_id(current_user.id),
+                           asset_summary=Asset.get_summary(current_user.id),
+                           last_wishes=LastWishes.get_by_user_id(current_user.id))
+
 @dashboard.route('/user-dashboard')
 @login_required
+@versioned_page
 def user_dashboard():
     try:
-        # Get user data from storage
-        trustees = Trustee.get_by_user_id(current_user.id)
-        messages = Message.get_by_user_id(current_user.id)
-        assets = Asset.get_by_user_id(current_user.id)
-        last_wishes = LastWishes.get_by_user_id(current_user.id)
-        
-        return render_template('dashboard/user.html',
-                             trustees=trustees,
-                             messages=messages,
-                             assets=assets,
-                             last_wishes=last_wishes,
-                             now=datetime.utcnow())
+        # Storage is only read when the user's data changed since the last render
+        content = fragments.cached('user_dashboard', current_user.id, render_user_dashboard)
+        return render_template('dashboard/user.html', content=content, now=datetime.utcnow())
     except Exception as e:
         flash('Error loading dashboard data.', 'danger')
         current_app.logger.error(f"Dashboard error: {str(e)}")
         return redirect(url_for('main.home'))
 
+@dashboard.route('/messages/<message_id>')
+@login_required
+def message_detail(message_id):
+    message = Message.get_for_user(current_user.id, message_id)
+    if not message:
+        abort(404)
+    return render_template('dashboard/message.html', message=message, now=datetime.utcnow())
+
+@dashboard.route('/messages/<message_id>/media')
+@login_required
+def message_media(message_id):
+    message = Message.get_for_user(current_user.id, message_id)
+    if not message or not message.media_url:
+        abort(404)
+    if current_app.s3_client:
+        # Uploads are private objects; hand out a short-lived link instead
+        return redirect(current_app.s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': current_app.config['S3_BUCKET'], 'Key': message.media_url},
+            ExpiresIn=current_app.config['S3_PRESIGNED_URL_EXPIRES']
+        ))
+    return redirect(url_for('static', filename=message.media_url))
+
+@dashboard.route('/assets/<asset_id>')
+@login_required
+def asset_detail(asset_id):
+    asset = Asset.get_for_user(current_user.id, asset_id)
+    if not asset:
+        abort(404)
+    return render_template('dashboard/asset.html', asset=asset, now=datetime.utcnow())
+
+@dashboard.route('/search')
+@login_required
+def search():
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    results = None
+    if query:
+        try:
+            from . import search as search_index
+            results = search_index.search(current_user.id, query, page=page,
+                                          per_page=current_app.config['SEARCH_PAGE_SIZE'])
+        except Exception as e:
+            flash('Search is unavailable right now.', 'danger')
+            current_app.logger.error(f"Search error: {str(e)}")
+    return render_template('dashboard/search.html', query=query, results=results, now=datetime.utcnow())
+
 @dashboard.route('/add-message', methods=['GET', 'POST'])
 @login_required
 def add_message():
     form = MessageForm()
+    form.recipient.choices = recipient_choices(Trustee.get_by_user_id(current_user.id))
     if form.validate_on_submit():
         media_url = handle_file_upload(form.media.data, 'messages')
         
@@ -194,7 +310,7 @@ def add_asset():
             name=form.name.data,
             description=form.description.data,
             asset_type=form.type.data,
-            value=float(form.value.data) if form.value.data else None,
+            value=form.value.data,
             location=form.location.data
         )
         asset.save()
@@ -204,18 +320,41 @@ def add_asset():
     
     return render_template('dashboard/add_asset.html', form=form, now=datetime.utcnow())
 
+@dashboard.route('/import', methods=['GET', 'POST'])
+@login_required
+def bulk_import():
+    form = ImportForm()
+    report = None
+    if form.validate_on_submit():
+        from .importer import import_records, detect_format
+        upload = form.file.data
+        try:
+            report = import_records(current_user.id, form.kind.data, upload.stream,
+                                    fmt=detect_format(upload.filename))
+            flash(f'Imported {report.imported} of {report.rows} rows.',
+                  'success' if not report.errors else 'warning')
+        except Exception as e:
+            flash('An error occurred during import. Please try again.', 'danger')
+            current_app.logger.error(f"Import error: {str(e)}")
+
+    return render_template('dashboard/import.html', form=form, report=report, now=datetime.utcnow())
+
 @dashboard.route('/last-wishes', methods=['GET', 'POST'])
 @login_required
 def last_wishes():
-    form = LastWishesForm()
+    wishes = LastWishes.get_by_user_id(current_user.id)
+    form = LastWishesForm(obj=wishes)
     if form.validate_on_submit():
-        wishes = LastWishes(
-            user_id=current_user.id,
-            funeral_preferences=form.funeral_preferences.data,
-            special_requests=form.special_requests.data,
-            personal_message=form.personal_message.data
-        )
-        wishes.save()
+        wishes = wishes or LastWishes(user_id=current_user.id)
+        wishes.funeral_preferences = form.funeral_preferences.data
+        wishes.special_requests = form.special_requests.data
+        wishes.personal_message = form.personal_message.data
+        wishes.updated_at = datetime.utcnow().isoformat()
+        try:
+            wishes.save()
+        except ConcurrentUpdateError:
+            flash('Your last wishes were changed elsewhere. Please review them and save again.', 'warning')
+            return redirect(url_for('dashboard.last_wishes'))
         
         flash('Last wishes updated successfully.', 'success')
         return redirect(url_for('dashboard.user_dashboard'))
@@ -232,6 +371,7 @@ def trustee_login():
         user = User.get_by_email(form.email.data)
         if user and user.is_trustee and user.check_password(form.password.data):
             login_user(user)
+            record_check_in(user)
             return redirect(url_for('dashboard.trustee_dashboard'))
         flash('Invalid trustee credentials.', 'danger')
     
@@ -239,6 +379,7 @@ def trustee_login():
 
 @dashboard.route('/trustee-dashboard')
 @login_required
+@versioned_page
 def trustee_dashboard():
     if not current_user.is_trustee:
         flash('Access denied.', 'danger')
@@ -246,3 +387,103 @@ def trustee_dashboard():
     
     trusted_users = Trustee.get_by_trustee_id(current_user.id)
     return render_template('dashboard/trustee.html', trusted_users=trusted_users, now=datetime.utcnow())
+
+@dashboard.route('/trustee/confirm/<user_id>', methods=['POST'])
+@login_required
+def confirm_passing(user_id):
+    if not current_user.is_trustee:
+        flash('Access denied.', 'danger')
+        return redirect(url_for('main.home'))
+
+    trustee_of = {t.user_id for t in Trustee.get_by_trustee_id(current_user.id)}
+    if user_id not in trustee_of:
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard.trustee_dashboard'))
+
+    try:
+        result = trigger_user(user_id)
+        if result.changed:
+            flash('Confirmation recorded. Trustees and messages have been updated.', 'success')
+        else:
+            flash('This confirmation was already recorded.', 'info')
+    except Exception as e:
+        flash('An error occurred while recording the confirmation.', 'danger')
+        current_app.logger.error(f"Trigger error: {str(e)}")
+    return redirect(url_for('dashboard.trustee_dashboard'))
+
+def export_response(user_id):
+    """Stream a user's legacy archive as a ZIP download"""
+    from .export import stream_export
+    filename = f"legatera-{user_id}-{datetime.utcnow():%Y%m%d}.zip"
+    return Response(
+        stream_with_context(stream_export(user_id)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@dashboard.route('/export')
+@login_required
+def export_own():
+    return export_response(current_user.id)
+
+@dashboard.route('/trustee/export/<user_id>')
+@login_required
+def trustee_export(user_id):
+    if not current_user.is_trustee:
+        flash('Access denied.', 'danger')
+        return redirect(url_for('main.home'))
+
+    # Trustees may only download a legacy once its release has been triggered
+    allowed = any(t.user_id == user_id and t.notification_triggered
+                  for t in Trustee.get_by_trustee_id(current_user.id))
+    if not allowed:
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard.trustee_dashboard'))
+    return export_response(user_id)
+
+@admin.route('/profiles')
+@admin_required
+def profiles():
+    return jsonify([
+        dict(entry, url=url_for('admin.profile_download', name=entry['name']))
+        for entry in profiling.list_profiles(current_app)
+    ])
+
+@admin.route('/profiles/<name>')
+@admin_required
+def profile_download(name):
+    if not profiling.valid_profile_name(name):
+        abort(404)
+    return send_from_directory(profiling.profile_dir(current_app), name, as_attachment=True)
+
+@admin.route('/capacity')
+@admin_required
+def capacity():
+    from .capacity import capacity_report
+    return jsonify(capacity_report(metrics.collect(current_app)))
+
+@api.before_request
+def api_login_required():
+    # API clients get a 401 rather than a redirect to the login page
+    if not current_user.is_authenticated:
+        return json_response({'error': 'Authentication required.'}, 401)
+
+@api.errorhandler(ApiError)
+def api_error(e):
+    return json_response({'error': e.message}, e.status)
+
+@api.route('/trustees')
+def api_trustees():
+    return json_response(collection_page('trustees', current_user.id))
+
+@api.route('/messages')
+def api_messages():
+    return json_response(collection_page('messages', current_user.id))
+
+@api.route('/assets')
+def api_assets():
+    return json_response(collection_page('assets', current_user.id))
+
+@api.route('/last-wishes')
+def api_last_wishes():
+    return json_response(last_wishes_record(current_user.id))
@@ -0,0 +1,172 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from .models import StorageModel
+
+# Local storage file for each item type, used when DynamoDB is unavailable
+LOCAL_COLLECTIONS = {
+    'user': 'users',
+    'trustee': 'trustees',
+    'message': 'messages',
+    'asset': 'assets',
+    'last_wishes': 'last_wishes'
+}
+SEGMENT_DONE = 'done'
+
+class ScanResult:
+    def __init__(self, segments):
+        self.segments = segments
+        self.items = 0
+        self.scanned = 0
+        self.units = 0.0
+        self.pages = 0
+        self.elapsed = 0.0
+        self.resumed = False
+
+class RateLimiter:
+    """Pace capacity consumption across threads to a units-per-second budget"""
+
+    def __init__(self, units_per_second):
+        self.rate = units_per_second
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def consume(self, units):
+        if not self.rate or not units:
+            return
+        # Reserve a slot after the previous page's, then wait for it outside the lock
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + units / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+def _checkpoint_key(name):
+    return {'PK': f'SCAN#{name}', 'SK': 'CHECKPOINT'}
+
+def load_checkpoint(name):
+    """Return the saved per-segment start keys of a named scan, or None"""
+    if current_app.dynamodb:
+        item = StorageModel._get_table().get_item(Key=_checkpoint_key(name)).get('Item')
+        return item['segments'] if item else None
+    return (StorageModel._load_data('scan_checkpoints') or {}).get(name)
+
+def save_checkpoint(name, segments):
+    if current_app.dynamodb:
+        StorageModel._get_table().put_item(Item={**_checkpoint_key(name), 'type': 'scan_checkpoint',
+                                                 'segments': segments,
+                                                 'updated_at': datetime.utcnow().isoformat()})
+    else:
+        checkpoints = StorageModel._load_data('scan_checkpoints') or {}
+        checkpoints[name] = segments
+        StorageModel._save_data('scan_checkpoints', checkpoints)
+
+def clear_checkpoint(name):
+    if current_app.dynamodb:
+        StorageModel._get_table().delete_item(Key=_checkpoint_key(name))
+    else:
+        checkpoints = StorageModel._load_data('scan_checkpoints') or {}
+        if checkpoints.pop(name, None) is not None:
+            StorageModel._save_data('scan_checkpoints', checkpoints)
+
+def _scan_kwargs(item_types, projection, names, page_size):
+    kwargs = {'ReturnConsumedCapacity': 'TOTAL'}
+    names = dict(names or {})
+    if item_types:
+        placeholders = [f':type{index}' for index in range(len(item_types))]
+        names['#type'] = 'type'
+        kwargs['FilterExpression'] = f"#type IN ({', '.join(placeholders)})"
+        kwargs['ExpressionAttributeValues'] = dict(zip(placeholders, item_types))
+    if projection:
+        kwargs['ProjectionExpression'] = projection
+    if names:
+        kwargs['ExpressionAttributeNames'] = names
+    if page_size:
+        kwargs['Limit'] = page_size
+    return kwargs
+
+def _scan_local(on_item, item_types, result):
+    for item_type in item_types:
+        for record in StorageModel._load_data(LOCAL_COLLECTIONS[item_type]):
+            result.scanned += 1
+            result.items += 1
+            on_item({'type': item_type, **record})
+
+def parallel_scan(on_item, item_types=None, projection=None, names=None, segments=None,
+                  checkpoint=None, resume=False, max_units_per_second=None, page_size=None):
+    """Scan the table with one thread per segment, calling on_item for every item
+
+    on_item runs on the worker threads and must be thread-safe. With a
+    checkpoint name, each segment's position is saved after every page so an
+    interrupted scan continues with resume=True instead of starting over; the
+    page that was interrupted is delivered again, so callbacks should be
+    idempotent.
+    """
+    config = current_app.config
+    segments = segments or config['SCAN_SEGMENTS']
+    result = ScanResult(segments)
+    started = time.monotonic()
+    if not current_app.dynamodb:
+        # Local storage is one process reading JSON files; segmenting buys nothing
+        if not item_types:
+            raise ValueError('Local scans need item_types')
+        result.segments = 1
+        _scan_local(on_item, item_types, result)
+        result.elapsed = time.monotonic() - started
+        return result
+
+    positions = [None] * segments
+    if checkpoint and resume:
+        saved = load_checkpoint(checkpoint)
+        if saved is not None:
+            if len(saved) != segments:
+                raise ValueError(f"Checkpoint {checkpoint!r} was taken with {len(saved)} segments, not {segments}")
+            positions = saved
+            result.resumed = True
+
+    app = current_app._get_current_object()
+    base_kwargs = _scan_kwargs(item_types, projection, names, page_size)
+    limiter = RateLimiter(max_units_per_second if max_units_per_second is not None
+                          else config['SCAN_MAX_UNITS_PER_SECOND'])
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def scan_segment(segment):
+        with app.app_context():
+            table = StorageModel._get_table()
+            start_key = positions[segment]
+            while start_key != SEGMENT_DONE and not stop.is_set():
+                kwargs = dict(base_kwargs, Segment=segment, TotalSegments=segments)
+                if start_key:
+                    kwargs['ExclusiveStartKey'] = start_key
+                try:
+                    response = table.scan(**kwargs)
+                    for item in response['Items']:
+                        on_item(item)
+                except Exception:
+                    stop.set()
+                    raise
+                start_key = response.get('LastEvaluatedKey') or SEGMENT_DONE
+                units = float((response.get('ConsumedCapacity') or {}).get('CapacityUnits', 0))
+                with lock:
+                    positions[segment] = start_key
+                    result.pages += 1
+                    result.items += len(response['Items'])
+                    result.scanned += response.get('ScannedCount', len(response['Items']))
+                    result.units += units
+                    if checkpoint:
+                        save_checkpoint(checkpoint, list(positions))
+                limiter.consume(units)
+
+    with ThreadPoolExecutor(max_workers=segments, thread_name_prefix='scan') as executor:
+        futures = [executor.submit(scan_segment, segment) for segment in range(segments)]
+    errors = [future.exception() for future in futures if future.exception()]
+    result.elapsed = time.monotonic() - started
+    if errors:
+        raise errors[0]
+    if checkpoint:
+        clear_checkpoint(checkpoint)
+    return result
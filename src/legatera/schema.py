@@ -0,0 +1,83 @@
+from operator import attrgetter
+
+class Field:
+    """One stored field of a model
+
+    encode/decode convert between the attribute value and its stored form and
+    are skipped for None. A native field is stored as-is in DynamoDB, which
+    has types (such as Decimal) that JSON lacks.
+    """
+    __slots__ = ('name', 'default', 'attr', 'encode', 'decode', 'native')
+
+    def __init__(self, name, default=None, encode=None, decode=None, native=False, attr=None):
+        self.name = name
+        self.default = default
+        self.attr = attr or name
+        self.encode = encode
+        self.decode = decode
+        self.native = native
+
+def _compile(name, lines, namespace):
+    """Build a function from source lines, as dataclasses and namedtuple do"""
+    exec('\n'.join(lines), namespace)
+    return namespace[name]
+
+class Schema:
+    """Ordered stored fields of a model, shared by the JSON and DynamoDB backends
+
+    The encoders and the decoder are generated once per schema, so a record
+    is converted with one straight-line function call instead of a loop over
+    its fields. values() reads a record's field values as a tuple in schema
+    order, which encode() turns into the stored form.
+    """
+
+    def __init__(self, *fields, extra=()):
+        self.fields = fields
+        self.names = tuple(field.name for field in fields)
+        self.extra = tuple(extra)
+        # Instance attributes of the model: the fields' plus any unstored extras
+        self.slots = tuple(field.attr for field in fields) + self.extra
+        self.values = attrgetter(*(field.attr for field in fields))
+        self.index = {field.name: position for position, field in enumerate(fields)}
+        self.encode = self._build_encoder('values', dynamo=False)
+        self._dump_json = self._build_encoder('record', dynamo=False)
+        self._dump_dynamo = self._build_encoder('record', dynamo=True)
+        self.decode = self._build_decoder()
+
+    def _build_encoder(self, argument, dynamo):
+        """Generate an encoder taking a values() tuple, or reading a record's attributes"""
+        namespace = {}
+        entries = []
+        for position, field in enumerate(self.fields):
+            value = f'v{position}' if argument == 'values' else f'record.{field.attr}'
+            if field.encode and not (dynamo and field.native):
+                namespace[f'e{position}'] = field.encode
+                value = f'None if (v{position} := {value}) is None else e{position}(v{position})'
+            entries.append(f'{field.name!r}: {value}')
+        lines = [f'def encode({argument}):']
+        if argument == 'values':
+            lines.append(f"    {', '.join(f'v{position}' for position in range(len(self.fields)))}, = values")
+        lines.append(f"    return {{{', '.join(entries)}}}")
+        return _compile('encode', lines, namespace)
+
+    def _build_decoder(self):
+        namespace = {}
+        lines = ['def decode(data, record):', '    get = data.get']
+        for position, field in enumerate(self.fields):
+            namespace[f'd{position}'] = field.default
+            if field.decode:
+                namespace[f'c{position}'] = field.decode
+                lines.append(f'    value = get({field.name!r}, d{position})')
+                lines.append(f'    record.{field.attr} = None if value is None else c{position}(value)')
+            else:
+                lines.append(f'    record.{field.attr} = get({field.name!r}, d{position})')
+        lines.extend(f'    record.{attr} = None' for attr in self.extra)
+        return _compile('decode', lines, namespace)
+
+    def defaults(self):
+        """(attribute, default) pairs for a new record"""
+        return [(field.attr, field.default) for field in self.fields] + [(attr, None) for attr in self.extra]
+
+    def dump(self, record, dynamo=False):
+        """Return the stored form of a record as a dict"""
+        return self._dump_dynamo(record) if dynamo else self._dump_json(record)
@@ -0,0 +1,149 @@
+"""Full-text search over a user's messages, assets and last wishes
+
+Each user has an SQLite FTS5 index under SEARCH_INDEX_DIR, kept up to date
+as records are saved. The indexes are local to the instance, even when the
+records are in DynamoDB. An instance starting with an empty directory has to
+rebuild them with `flask search-reindex --all`.
+"""
+import os
+import re
+import sqlite3
+from contextlib import closing
+from flask import current_app
+from markupsafe import Markup, escape
+
+# Control characters cannot appear in indexed text, so they safely mark
+# snippet highlights until the snippet has been HTML-escaped
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_USER_ID_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+    doc_id UNINDEXED,
+    kind UNINDEXED,
+    title,
+    body,
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS document_keys (
+    doc_id TEXT PRIMARY KEY,
+    doc_rowid INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+class SearchResult:
+    def __init__(self, doc_id, kind, title, snippet, score):
+        self.doc_id = doc_id
+        self.kind = kind
+        self.title = title
+        self.snippet = snippet
+        self.score = score
+
+class SearchPage:
+    def __init__(self, results, total, page, per_page):
+        self.results = results
+        self.total = total
+        self.page = page
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.page * self.per_page < self.total
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+def _index_dir():
+    """Get the directory holding one index database per user"""
+    index_dir = current_app.config.get('SEARCH_INDEX_DIR')
+    if not index_dir:
+        from .models import StorageModel
+        index_dir = os.path.join(StorageModel._get_storage_dir(), 'search')
+    os.makedirs(index_dir, exist_ok=True)
+    return index_dir
+
+def _index_path(user_id):
+    if not _USER_ID_RE.match(user_id):
+        raise ValueError(f"Invalid user id for search index: {user_id!r}")
+    return os.path.join(_index_dir(), f"{user_id}.db")
+
+def _connect(user_id):
+    """Open a user's index, creating it on first use"""
+    conn = sqlite3.connect(_index_path(user_id), timeout=5)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+def _delete(conn, doc_id):
+    # Look the FTS rowid up through the keyed table; filtering the FTS table
+    # on an unindexed column would scan every document
+    row = conn.execute('SELECT doc_rowid FROM document_keys WHERE doc_id = ?', (doc_id,)).fetchone()
+    if row:
+        conn.execute('DELETE FROM documents WHERE rowid = ?', row)
+        conn.execute('DELETE FROM document_keys WHERE doc_id = ?', (doc_id,))
+
+def _insert(conn, kind, doc_id, title, body):
+    cursor = conn.execute(
+        'INSERT INTO documents (doc_id, kind, title, body) VALUES (?, ?, ?, ?)',
+        (doc_id, kind, title or '', body or '')
+    )
+    conn.execute('INSERT INTO document_keys (doc_id, doc_rowid) VALUES (?, ?)', (doc_id, cursor.lastrowid))
+
+def build_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix"""
+    tokens = _TOKEN_RE.findall(text or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+def index_document(user_id, kind, doc_id, title, body):
+    """Add or replace a single document in the user's index"""
+    with closing(_connect(user_id)) as conn, conn:
+        _delete(conn, doc_id)
+        _insert(conn, kind, doc_id, title, body)
+
+def index_documents(user_id, documents, replace_all=False):
+    """Index many (kind, doc_id, title, body) tuples in one transaction"""
+    with closing(_connect(user_id)) as conn, conn:
+        if replace_all:
+            conn.execute('DELETE FROM documents')
+            conn.execute('DELETE FROM document_keys')
+        for kind, doc_id, title, body in documents:
+            if not replace_all:
+                _delete(conn, doc_id)
+            _insert(conn, kind, doc_id, title, body)
+
+def remove_document(user_id, doc_id):
+    with closing(_connect(user_id)) as conn, conn:
+        _delete(conn, doc_id)
+
+def _render_snippet(raw):
+    """Escape a snippet and turn the highlight markers into <mark> tags"""
+    html = str(escape(raw))
+    return Markup(html.replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>'))
+
+def search(user_id, text, page=1, per_page=20):
+    """Run a ranked full-text query against a single user's index"""
+    query = build_query(text)
+    page = max(page, 1)
+    if not query or not os.path.exists(_index_path(user_id)):
+        return SearchPage([], 0, page, per_page)
+
+    with closing(_connect(user_id)) as conn:
+        total = conn.execute(
+            'SELECT count(*) FROM documents WHERE documents MATCH ?', (query,)
+        ).fetchone()[0]
+        # Title matches weigh more than body matches
+        rows = conn.execute(
+            f"""SELECT doc_id, kind, title,
+                       snippet(documents, 3, '{_HIGHLIGHT_START}', '{_HIGHLIGHT_END}', '...', 16),
+                       bm25(documents, 0, 0, 5.0, 1.0) AS score
+                FROM documents WHERE documents MATCH ?
+                ORDER BY score LIMIT ? OFFSET ?""",
+            (query, per_page, (page - 1) * per_page)
+        ).fetchall()
+
+    results = [SearchResult(doc_id, kind, title, _render_snippet(snippet), score)
+               for doc_id, kind, title, snippet, score in rows]
+    return SearchPage(results, total, page, per_page)
@@ -0,0 +1,52 @@
+"""Compiled templates shared across workers and restarts
+
+Jinja compiles each template to Python bytecode on first use. With
+TEMPLATE_BYTECODE_CACHE on, that bytecode is kept in TEMPLATE_CACHE_DIR (by
+default a per-user directory in the system temp dir), so the other workers on
+the host, and the next restart, load it instead of compiling again. Entries
+are keyed by the template source, so an edited template is compiled afresh.
+
+`flask templates-compile` fills the cache when the image is built, and
+gunicorn.conf.py calls warm_up() in each worker before it takes traffic.
+"""
+import os
+import time
+from jinja2 import FileSystemBytecodeCache
+
+def init_app(app):
+    if not app.config['TEMPLATE_BYTECODE_CACHE']:
+        return
+    directory = app.config.get('TEMPLATE_CACHE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Read when the Jinja environment is first created
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(directory))
+
+def compile_templates(app):
+    """Load every template now rather than on first use and return their names"""
+    env = app.jinja_env
+    names = env.list_templates()
+    for name in names:
+        env.get_template(name)
+    return names
+
+def warm_up(app):
+    """Load every template and serve each of WARM_UP_PATHS once, so a fresh
+    worker's first real request runs as fast as later ones
+
+    A failed warm-up is logged and only costs the head start.
+    """
+    started = time.perf_counter()
+    try:
+        names = compile_templates(app)
+        client = app.test_client()
+        for path in app.config['WARM_UP_PATHS']:
+            response = client.get(path)
+            if response.status_code != 200:
+                app.logger.warning(f"Warm-up request to {path} returned {response.status_code}")
+    except Exception as e:
+        app.logger.error(f"Warm-up failed: {str(e)}")
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    app.logger.info(f"Warmed up {len(names)} templates and {len(app.config['WARM_UP_PATHS'])} pages "
+                    f"in {elapsed_ms:.0f}ms")
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from .models import StorageModel, Trustee, Message, bump_data_version, deferred_data_versions
+
+class TriggerResult:
+    """Summary of the state changes applied by a trustee trigger"""
+
+    def __init__(self, user_id, trustees, messages):
+        self.user_id = user_id
+        self.trustees = trustees
+        self.messages = messages
+
+    @property
+    def changed(self):
+        return bool(self.trustees or self.messages)
+
+def load_trigger_state(user_id):
+    """Load a user's trustees and messages with a single pass over their data"""
+    if current_app.dynamodb:
+        trustees, messages = [], []
+        items = StorageModel._query_partition(
+            user_id,
+            FilterExpression='#type IN (:trustee, :message)',
+            ExpressionAttributeNames={'#type': 'type'},
+            ExpressionAttributeValues={':trustee': 'trustee', ':message': 'message'}
+        )
+        for item in items:
+            if item['SK'].startswith('TRUSTEE#'):
+                trustees.append(Trustee.from_dynamo_item(item))
+            elif item['SK'].startswith('MESSAGE#'):
+                messages.append(Message.from_dynamo_item(item))
+        return trustees, messages
+    trustees = [Trustee.from_dict(t) for t in StorageModel._load_data('trustees') if t['user_id'] == user_id]
+    messages = [Message.from_dict(m) for m in StorageModel._load_data('messages') if m['user_id'] == user_id]
+    return trustees, messages
+
+def plan_trigger(trustees, messages, now):
+    """Compute which records change when a user's death is confirmed"""
+    changed_trustees = []
+    for trustee in trustees:
+        if not trustee.notification_triggered:
+            trustee.notification_triggered = True
+            trustee.triggered_at = now
+            changed_trustees.append(trustee)
+
+    changed_messages = []
+    for message in messages:
+        if message.sent_at is None and message.release_at is None:
+            message.release_at = (now + timedelta(days=int(message.delay_days or 0))).isoformat()
+            changed_messages.append(message)
+    return changed_trustees, changed_messages
+
+def trigger_user(user_id, now=None):
+    """Mark every trustee as notified and schedule every pending message for release
+
+    The user's records are read once, and trustees already notified and
+    messages already scheduled are left alone, so running the trigger twice
+    is harmless.
+
+    On DynamoDB the changes go out as TransactWriteItems calls of up to 100
+    updates. Each update writes only the trigger fields, so message content
+    is not rewritten, and is checked against the version read, so an edit
+    made since is never overwritten. Locally each file is rewritten once.
+    The data versions of the user and of each newly notified trustee are
+    bumped once.
+    """
+    now = now or datetime.utcnow()
+    trustees, messages = load_trigger_state(user_id)
+    changed_trustees, changed_messages = plan_trigger(trustees, messages, now)
+    records = changed_trustees + changed_messages
+
+    if records:
+        # Transactions sent before a conflict have landed, so the bump runs either way
+        with deferred_data_versions():
+            bump_data_version(user_id, *(t.trustee_user_id for t in changed_trustees))
+            if current_app.dynamodb:
+                StorageModel._transact_update(records)
+            else:
+                for record in records:
+                    record.version += 1
+                StorageModel._commit_local({
+                    'trustees': [t.to_dict() for t in changed_trustees],
+                    'messages': [m.to_dict() for m in changed_messages]
+                })
+
+    current_app.logger.info(
+        f"Trigger for user {user_id}: {len(changed_trustees)} trustees notified, "
+        f"{len(changed_messages)} messages scheduled"
+    )
+    return TriggerResult(user_id, changed_trustees, changed_messages)
@@ -0,0 +1,51 @@
+"""Test cases the suites build on"""
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from legatera import create_app
+
+class LocalAppTestCase(unittest.TestCase):
+    """An app on the local JSON backend, storing everything under self.tmp
+
+    Subclasses add settings in ``config`` and set ``push_context`` to hold an
+    app context for the whole test. Tests making requests as several users
+    leave it off: flask-login caches the logged-in user on the context.
+    """
+    config = {}
+    push_context = False
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.app = create_app()
+        self.app.config.update(STORAGE_DIR=self.tmp.name, SEARCH_INDEX_DIR=self.tmp.name)
+        self.app.config.update(self.config)
+        self.app.dynamodb = None
+        self.app.s3_client = None
+        if self.push_context:
+            self.ctx = self.app.app_context()
+            self.ctx.push()
+            self.addCleanup(self.ctx.pop)
+
+    def login(self, user):
+        """A test client whose session is logged in as user"""
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = user.id
+        return client
+
+class MockDynamoTestCase(unittest.TestCase):
+    """An app whose DynamoDB resource is a MagicMock, with an app context held for the test
+
+    self.table is the mock every Table() call returns.
+    """
+    config = {}
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config.update(self.config)
+        self.app.dynamodb = MagicMock()
+        self.table = self.app.dynamodb.Table.return_value
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.addCleanup(self.ctx.pop)
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from flask import current_app, request
+from legatera.aio import AsgiAdapter, ThreadLocalResource
+from legatera.models import Asset, Trustee
+from base import LocalAppTestCase
+
+def call_asgi(app, method, path, body=b'', headers=(), chunks=1):
+    """Send one request through an ASGI app and return (status, headers, body, body messages)"""
+    size = -(-len(body) // chunks) if body else 0
+    parts = [body[i:i + size] for i in range(0, len(body), size)] if body else [b'']
+    incoming = [{'type': 'http.request', 'body': part, 'more_body': index < len(parts) - 1}
+                for index, part in enumerate(parts)]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    async def main():
+        await app({'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http', 'path': path,
+                   'query_string': b'', 'root_path': '', 'server': ('testserver', 80),
+                   'client': ('127.0.0.1', 50000),
+                   'headers': [(k.lower().encode(), v.encode()) for k, v in headers]}, receive, send)
+    return main(), sent
+
+def collect(sent):
+    start = sent[0]
+    bodies = [m for m in sent[1:] if m['type'] == 'http.response.body']
+    return start['status'], dict((k.decode(), v.decode()) for k, v in start['headers']), \
+        b''.join(m['body'] for m in bodies), bodies
+
+class TestAsyncModels(LocalAppTestCase):
+    def test_methods_run_on_the_io_pool_with_the_app_context(self):
+        seen = []
+        original = Asset.get_by_user_id.__func__
+
+        def spy(cls, user_id):
+            seen.append((threading.current_thread().name, current_app._get_current_object()))
+            return original(cls, user_id)
+
+        async def load():
+            await Asset('owner', 'House', value='10').aio.save()
+            return await asyncio.gather(Asset.aio.get_by_user_id('owner'), Trustee.aio.get_by_user_id('owner'))
+
+        with self.app.app_context():
+            Asset.get_by_user_id = classmethod(spy)
+            try:
+                assets, trustees = asyncio.run(load())
+            finally:
+                Asset.get_by_user_id = classmethod(original)
+        self.assertEqual([a.name for a in assets], ['House'])
+        self.assertEqual(trustees, [])
+        self.assertTrue(seen[0][0].startswith('legatera-io'))
+        self.assertIs(seen[0][1], self.app)
+
+    def test_async_views_run_under_wsgi(self):
+        @self.app.route('/async-count')
+        async def async_count():
+            assets, trustees = await asyncio.gather(Asset.aio.get_by_user_id(request.args['user']),
+                                                    Trustee.aio.get_by_user_id(request.args['user']))
+            return {'assets': len(assets), 'trustees': len(trustees)}
+
+        with self.app.app_context():
+            Asset('owner', 'House').save()
+        response = self.app.test_client().get('/async-count?user=owner')
+        self.assertEqual(response.get_json(), {'assets': 1, 'trustees': 0})
+
+class TestAsgiAdapter(LocalAppTestCase):
+    config = {'WTF_CSRF_ENABLED': False, 'ASYNC_REQUEST_THREADS': 32}
+
+    def setUp(self):
+        super().setUp()
+        self.asgi = AsgiAdapter(self.app)
+
+    def test_serves_the_same_response_as_wsgi(self):
+        expected = self.app.test_client().get('/')
+        coroutine, sent = call_asgi(self.asgi, 'GET', '/', headers=[('Accept-Encoding', 'identity')])
+        asyncio.run(coroutine)
+        status, headers, body, bodies = collect(sent)
+        self.assertEqual(status, 200)
+        self.assertEqual(body, expected.data)
+        self.assertEqual(headers['content-type'], 'text/html; charset=utf-8')
+        self.assertFalse(bodies[-1]['more_body'])
+
+    def test_request_body_and_headers_reach_the_app(self):
+        @self.app.route('/echo', methods=['POST'])
+        def echo():
+            return {'body': request.get_data(as_text=True), 'cookies': request.cookies, 'remote': request.remote_addr}
+
+        coroutine, sent = call_asgi(self.asgi, 'POST', '/echo', body=b'a=1&b=2' * 100, chunks=3,
+                                    headers=[('Content-Type', 'application/x-www-form-urlencoded'),
+                                             ('Cookie', 'x=1'), ('Cookie', 'y=2')])
+        asyncio.run(coroutine)
+        status, _, body, _ = collect(sent)
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), {'body': 'a=1&b=2' * 100, 'cookies': {'x': '1', 'y': '2'},
+                                            'remote': '127.0.0.1'})
+
+    def test_blocked_requests_do_not_hold_up_the_process(self):
+        # Concurrency needs DynamoDB; the route itself does not touch storage
+        self.app.dynamodb = MagicMock()
+
+        @self.app.route('/slow')
+        def slow():
+            # Stands in for a DynamoDB or Cognito round trip
+            time.sleep(0.2)
+            return 'done'
+
+        async def burst():
+            calls = [call_asgi(self.asgi, 'GET', '/slow') for _ in range(20)]
+            await asyncio.gather(*(coroutine for coroutine, _ in calls))
+            return [collect(sent)[2] for _, sent in calls]
+
+        started = time.perf_counter()
+        self.assertEqual(asyncio.run(burst()), [b'done'] * 20)
+        # Served one at a time, as by a sync worker, this would take 4 seconds
+        self.assertLess(time.perf_counter() - started, 1.5)
+
+    def test_local_storage_requests_run_one_at_a_time(self):
+        running, overlapped = [], []
+
+        @self.app.route('/write', methods=['POST'])
+        def write():
+            running.append(1)
+            overlapped.append(len(running) > 1)
+            time.sleep(0.02)
+            running.pop()
+            return 'ok'
+
+        async def burst():
+            calls = [call_asgi(self.asgi, 'POST', '/write') for _ in range(5)]
+            await asyncio.gather(*(coroutine for coroutine, _ in calls))
+
+        asyncio.run(burst())
+        self.assertEqual(overlapped, [False] * 5)
+
+    def test_lifespan(self):
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(self.asgi({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+    def test_websockets_are_refused(self):
+        sent = []
+
+        async def receive():
+            return {'type': 'websocket.connect'}
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.asgi({'type': 'websocket', 'path': '/'}, receive, send))
+        self.assertEqual(sent, [{'type': 'websocket.close'}])
+
+class TestThreadLocalResource(unittest.TestCase):
+    def test_each_thread_gets_its_own_resource(self):
+        resource = ThreadLocalResource(lambda: MagicMock(name=threading.current_thread().name))
+        seen = []
+
+        def use():
+            first = resource.get()
+            resource.Table('legatera-table')
+            seen.append((first, resource.get()))
+
+        threads = [threading.Thread(target=use) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(first) for first, _ in seen}), 3)
+        self.assertTrue(all(first is second and first.Table.called for first, second in seen))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import unittest
+from decimal import Decimal
+from legatera.api import collection_page
+from legatera.models import User, Trustee, Message, Asset, LastWishes
+from base import LocalAppTestCase, MockDynamoTestCase
+
+class TestLocalApi(LocalAppTestCase):
+    config = {'MESSAGE_INLINE_MAX_BYTES': 100}
+
+    def setUp(self):
+        super().setUp()
+        self.app.config['BLOB_DIR'] = self.tmp.name
+        with self.app.app_context():
+            self.user = User('owner@example.com', password='password')
+            self.user.save()
+            for index in range(5):
+                Asset(self.user.id, f'Asset {index}', description='long text', value=f'{index}.50').save()
+            Message(self.user.id, 'r1', 'x' * 500).save()
+            Trustee(self.user.id, 'trustee-1').save()
+            LastWishes(self.user.id, funeral_preferences='Quiet').save()
+        self.client = self.login(self.user)
+
+    def test_pages_follow_cursors(self):
+        first = self.client.get('/api/v1/assets?limit=2')
+        self.assertEqual(first.mimetype, 'application/json')
+        self.assertNotIn(b', ', first.data)
+        page = first.get_json()
+        self.assertEqual([a['name'] for a in page['data']], ['Asset 0', 'Asset 1'])
+        self.assertEqual(set(page['data'][0]), {'id', 'name', 'asset_type', 'value'})
+        self.assertEqual(page['data'][0]['value'], '0.50')
+
+        names = [a['name'] for a in page['data']]
+        while page['next']:
+            page = self.client.get(f"/api/v1/assets?limit=2&cursor={page['next']}").get_json()
+            names.extend(a['name'] for a in page['data'])
+        self.assertEqual(names, [f'Asset {index}' for index in range(5)])
+
+    def test_sparse_fields(self):
+        page = self.client.get('/api/v1/assets?fields=description,name').get_json()
+        self.assertEqual(list(page['data'][0]), ['id', 'description', 'name'])
+        message, = self.client.get('/api/v1/messages?fields=content').get_json()['data']
+        # The body was offloaded to blob storage and is read back through the model
+        self.assertEqual(message['content'], 'x' * 500)
+        trustee, = self.client.get('/api/v1/trustees').get_json()['data']
+        self.assertEqual(trustee['trustee_user_id'], 'trustee-1')
+        wishes = self.client.get('/api/v1/last-wishes?fields=funeral_preferences').get_json()['data']
+        self.assertEqual(wishes, {'id': wishes['id'], 'funeral_preferences': 'Quiet'})
+
+    def test_errors(self):
+        response = self.client.get('/api/v1/assets?fields=password_hash')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Unknown fields: password_hash', response.get_json()['error'])
+        self.assertEqual(self.client.get('/api/v1/assets?cursor=forged').status_code, 400)
+
+        # A cursor only works for the collection and user it was issued to
+        cursor = self.client.get('/api/v1/assets?limit=1').get_json()['next']
+        self.assertEqual(self.client.get(f'/api/v1/messages?cursor={cursor}').status_code, 400)
+        self.assertEqual(self.app.test_client().get(f'/api/v1/assets?cursor={cursor}').status_code, 401)
+
+class TestDynamoApi(MockDynamoTestCase):
+    def test_cursor_carries_the_start_key(self):
+        key = {'PK': 'USER#owner', 'SK': 'ASSET#a1'}
+        self.table.query.return_value = {'Items': [{'id': 'a1', 'name': 'House', 'value': Decimal('5')}],
+                                         'LastEvaluatedKey': key}
+        with self.app.test_request_context('/api/v1/assets?limit=1&fields=name'):
+            page = collection_page('assets', 'owner')
+        self.assertEqual(page['data'], [{'id': 'a1', 'name': 'House'}])
+        request = self.table.query.call_args.kwargs
+        self.assertEqual(request['Limit'], 1)
+        self.assertNotIn('ExclusiveStartKey', request)
+        self.assertEqual(sorted(request['ExpressionAttributeNames'].values()), ['id', 'name'])
+        self.assertNotIn('PK', json.dumps(page['next']))
+
+        self.table.query.return_value = {'Items': []}
+        with self.app.test_request_context(f"/api/v1/assets?limit=1&cursor={page['next']}"):
+            self.assertEqual(collection_page('assets', 'owner'), {'data': [], 'next': None})
+        self.assertEqual(self.table.query.call_args.kwargs['ExclusiveStartKey'], key)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from decimal import Decimal
+from legatera.models import Asset, AssetSummary
+from base import LocalAppTestCase
+
+class TestAssetSummary(LocalAppTestCase):
+    push_context = True
+
+    def test_save_maintains_summary(self):
+        Asset('owner', 'House', asset_type='real_estate', value=Decimal('250000.10')).save()
+        Asset('owner', 'Flat', asset_type='real_estate', value=0.2).save()
+        Asset('owner', 'Wallet', asset_type='digital').save()
+        Asset('other', 'Car', asset_type='personal', value=Decimal('5000')).save()
+
+        summary = Asset.get_summary('owner')
+        self.assertEqual(summary.count, 3)
+        self.assertEqual(summary.total_value, Decimal('250000.30'))
+        self.assertEqual(summary.by_type['real_estate'], {'count': 2, 'total_value': Decimal('250000.30')})
+        self.assertEqual(summary.by_type['digital']['count'], 1)
+
+    def test_values_round_trip_as_decimal(self):
+        Asset('owner', 'Flat', value=0.1).save()
+        self.assertEqual(Asset.get_by_user_id('owner')[0].value, Decimal('0.1'))
+
+    def test_rebuild_matches_incremental(self):
+        Asset('owner', 'House', asset_type='real_estate', value=Decimal('100')).save()
+        Asset('owner', 'Stocks', asset_type='financial', value=Decimal('50.5')).save()
+        incremental = Asset.get_summary('owner').to_dict()
+        self.assertEqual(Asset.rebuild_summary('owner').to_dict(), incremental)
+
+    def test_types_left_at_zero_on_dynamodb_are_skipped(self):
+        summary = AssetSummary.from_dynamo_item({
+            'user_id': 'owner', 'asset_count': 1, 'total_value': Decimal('40'),
+            'count_real_estate': 0, 'value_real_estate': Decimal('0'),
+            'count_financial': 1, 'value_financial': Decimal('40')
+        })
+        self.assertEqual(list(summary.by_type), ['financial'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import gzip
+import json
+import os
+import unittest
+from flask import url_for
+from legatera.assets import build, have_brotli
+from base import LocalAppTestCase
+
+class TestStaticAssets(LocalAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['STATIC_BUILD_DIR'] = os.path.join(self.tmp.name, 'build')
+        self.manifest = build(self.app.static_folder, self.app.config['STATIC_BUILD_DIR'])
+        self.client = self.app.test_client()
+        with open(os.path.join(self.app.static_folder, 'css', 'styles.css'), 'rb') as f:
+            self.css = f.read()
+
+    def test_build_is_deterministic(self):
+        built = self.manifest['css/styles.css']
+        self.assertRegex(built, r'^css/styles\.[0-9a-f]{12}\.css$')
+        target = self.app.config['STATIC_BUILD_DIR']
+        with open(os.path.join(target, built + '.gz'), 'rb') as f:
+            first = f.read()
+        self.assertEqual(build(self.app.static_folder, target), self.manifest)
+        with open(os.path.join(target, built + '.gz'), 'rb') as f:
+            self.assertEqual(f.read(), first)
+        with open(os.path.join(target, 'manifest.json')) as f:
+            self.assertEqual(json.load(f), self.manifest)
+
+    def test_urls_and_pages_use_fingerprinted_names(self):
+        with self.app.test_request_context():
+            self.assertEqual(url_for('static', filename='js/main.js'), '/static/' + self.manifest['js/main.js'])
+        page = self.client.get('/').data.decode()
+        self.assertIn(self.manifest['css/styles.css'], page)
+
+    def test_serves_precompressed_variant_as_immutable(self):
+        url = '/static/' + self.manifest['css/styles.css']
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('max-age=31536000', response.headers['Cache-Control'])
+        self.assertEqual(gzip.decompress(response.data), self.css)
+
+        plain = self.client.get(url, headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(plain.data, self.css)
+
+        if have_brotli():
+            import brotli
+            br = self.client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+            self.assertEqual(br.headers['Content-Encoding'], 'br')
+            self.assertEqual(brotli.decompress(br.data), self.css)
+
+    def test_unbuilt_names_are_served_as_before(self):
+        response = self.client.get('/static/css/styles.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response.headers.get('Cache-Control', ''))
+        self.assertEqual(response.data, self.css)
+        self.assertEqual(self.client.get('/static/' + self.manifest['css/styles.css'] + '.gz').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
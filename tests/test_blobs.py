@@ -0,0 +1,52 @@
+import os
+import unittest
+from legatera import blobs
+from legatera.models import StorageModel, Message
+from base import LocalAppTestCase
+
+class TestMessageOffload(LocalAppTestCase):
+    config = {'MESSAGE_INLINE_MAX_BYTES': 100, 'MESSAGE_PREVIEW_CHARS': 10}
+    push_context = True
+
+    def test_large_body_is_offloaded_and_loaded_lazily(self):
+        body = 'Dear family, ' * 50
+        Message('owner', 'r1', body).save()
+        Message('owner', 'r2', 'short note').save()
+
+        stored = StorageModel._load_data('messages')
+        self.assertIsNone(stored[0]['content'])
+        self.assertEqual(stored[0]['content_preview'], 'Dear famil')
+        self.assertEqual(stored[0]['content_size'], len(body))
+        self.assertLess(os.path.getsize(blobs._local_path(stored[0]['content_ref'])), len(body) // 4)
+        self.assertEqual(stored[1]['content'], 'short note')
+        self.assertIsNone(stored[1]['content_ref'])
+
+        message, _ = Message.get_by_user_id('owner')
+        self.assertIsNone(message._content)
+        self.assertEqual(message.content, body)
+
+    def test_editing_body_replaces_blob(self):
+        Message('owner', 'r1', 'a' * 200).save()
+        message, = Message.get_by_user_id('owner')
+        old_ref = message.content_ref
+        message.content = 'b' * 200
+        message.update()
+
+        self.assertNotEqual(message.content_ref, old_ref)
+        self.assertFalse(os.path.exists(blobs._local_path(old_ref)))
+        self.assertEqual(Message.get_by_user_id('owner')[0].content, 'b' * 200)
+
+        message.content = 'now short'
+        message.update()
+        stored, = StorageModel._load_data('messages')
+        self.assertEqual((stored['content'], stored['content_ref']), ('now short', None))
+
+    def test_tampered_blob_is_rejected(self):
+        Message('owner', 'r1', 'a' * 200).save()
+        message, = Message.get_by_user_id('owner')
+        blobs.store_text(message.content_ref, b'something else')
+        with self.assertRaises(blobs.BlobIntegrityError):
+            message.content
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from legatera import metrics
+from legatera.capacity import capacity_report
+from legatera.models import User, Trustee
+from base import MockDynamoTestCase
+
+class TestCapacity(MockDynamoTestCase):
+    config = {'METRICS_DIR': None, 'DYNAMODB_SLOW_CALL_MS': 1000, 'DYNAMODB_SLOW_CALL_UNITS': 10}
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry = metrics.Registry()
+
+    def test_calls_are_attributed_to_method_and_route(self):
+        self.table.scan.return_value = {'Items': [], 'Count': 0, 'ScannedCount': 4000,
+                                        'ConsumedCapacity': {'TableName': 't', 'CapacityUnits': 64.5}}
+        self.table.query.return_value = {'Items': [], 'ConsumedCapacity': {'TableName': 't', 'CapacityUnits': 0.5}}
+        with self.app.test_request_context('/trustee-dashboard'):
+            self.app.preprocess_request()
+            with self.assertLogs(self.app.logger, 'WARNING') as logs:
+                User.get_by_email('someone@example.com')
+            Trustee.get_by_user_id('u1')
+
+        self.assertEqual(self.table.scan.call_args.kwargs['ReturnConsumedCapacity'], 'TOTAL')
+        self.assertIn('User.get_by_email', logs.output[0])
+        self.assertIn('scanned=4000', logs.output[0])
+        self.assertNotIn('someone@example.com', logs.output[0])
+
+        route, = capacity_report(metrics.registry)
+        self.assertEqual(route['endpoint'], 'dashboard.trustee_dashboard')
+        self.assertEqual((route['calls'], route['read_units'], route['write_units']), (2, 65.0, 0.0))
+        self.assertEqual([(c['caller'], c['operation']) for c in route['callers']],
+                         [('User.get_by_email', 'scan'), ('Trustee.get_by_user_id', 'query')])
+
+    def test_tracking_can_be_disabled(self):
+        self.app.config['DYNAMODB_CAPACITY_TRACKING'] = False
+        self.table.query.return_value = {'Items': []}
+        with self.app.app_context():
+            Trustee.get_by_user_id('u1')
+        self.assertNotIn('ReturnConsumedCapacity', self.table.query.call_args.kwargs)
+        self.assertEqual(capacity_report(metrics.registry), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import gzip
+import unittest
+import zlib
+from flask import Response
+from legatera import metrics
+from legatera.compression import negotiate, GzipCompressor, _load_brotli
+from base import LocalAppTestCase
+
+class TestCompression(LocalAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chunks = [f'<p>line {i} '.encode() + b'x' * 600 + b'</p>' for i in range(5)]
+
+        def stream():
+            for chunk in self.chunks:
+                self.produced.append(chunk)
+                yield chunk
+        self.produced = []
+        self.app.add_url_rule('/stream', 'stream', lambda: Response(stream(), mimetype='text/html'))
+        self.app.add_url_rule('/tiny', 'tiny', lambda: 'ok')
+        self.app.add_url_rule('/image', 'image', lambda: Response(b'\x89PNG' * 1000, mimetype='image/png'))
+        self.client = self.app.test_client()
+
+    def test_negotiation(self):
+        self.assertIsNone(negotiate(None))
+        self.assertIsNone(negotiate('identity'))
+        self.assertIsNone(negotiate('gzip;q=0'))
+        self.assertIs(negotiate('deflate, gzip'), GzipCompressor)
+        if _load_brotli():
+            self.assertEqual(negotiate('gzip, br').encoding, 'br')
+            self.assertIs(negotiate('gzip, br;q=0.5'), GzipCompressor)
+
+    def test_page_is_gzipped_with_length(self):
+        plain = self.client.get('/')
+        before = metrics.registry.counters.get(
+            ('legatera_compression_bytes_total', (('direction', 'in'), ('encoding', 'gzip'))), 0)
+        response = self.client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertLess(len(response.data), len(plain.data) / 2)
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+        self.assertNotIn('Content-Encoding', plain.headers)
+        after = metrics.registry.counters[('legatera_compression_bytes_total', (('direction', 'in'), ('encoding', 'gzip')))]
+        self.assertEqual(after - before, len(plain.data))
+
+    def test_skips_small_bodies_and_other_types(self):
+        tiny = self.client.get('/tiny', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(tiny.data, b'ok')
+        self.assertNotIn('Content-Encoding', tiny.headers)
+        image = self.client.get('/image', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', image.headers)
+        self.assertNotIn('Vary', image.headers)
+        self.app.config['COMPRESSION_ENABLED'] = False
+        self.assertNotIn('Content-Encoding', self.client.get('/', headers={'Accept-Encoding': 'gzip'}).headers)
+
+    def test_streamed_body_is_compressed_incrementally(self):
+        response = self.client.get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+        decoder = zlib.decompressobj(31)
+        body = iter(response.response)
+        # The first compressed chunk decodes on its own, before the rest is produced
+        first = decoder.decompress(next(body))
+        self.assertEqual(first, b''.join(self.chunks[:2]))
+        self.assertEqual(len(self.produced), 2)
+        rest = b''.join(decoder.decompress(chunk) for chunk in body)
+        response.close()
+        self.assertEqual(first + rest, b''.join(self.chunks))
+
+    def test_static_file_etag_becomes_weak(self):
+        response = self.client.get('/static/css/styles.css', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertTrue(response.headers['ETag'].startswith('W/"'))
+        self.assertNotIn('Accept-Ranges', response.headers)
+
+if __name__ == '__main__':
+    unittest.main()
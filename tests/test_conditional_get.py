@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import patch
+from legatera.models import User, Trustee, Asset
+from base import LocalAppTestCase
+
+class TestConditionalGet(LocalAppTestCase):
+    def save(self, record):
+        # Requests get their own app context, as in production, so the logged-in user is not shared
+        with self.app.app_context():
+            record.save()
+        return record
+
+    def test_dashboard_revalidates_without_loading_data(self):
+        user = self.save(User('owner@example.com', password='password', first_name='Owner'))
+        client = self.login(user)
+        first = client.get('/user-dashboard')
+        etag = first.headers['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('private', first.headers['Cache-Control'])
+        self.assertIn('no-cache', first.headers['Cache-Control'])
+        self.assertIn('Cookie', first.headers['Vary'])
+
+        with patch.object(Asset, 'list_by_user_id') as listing:
+            again = client.get('/user-dashboard', headers={'If-None-Match': etag})
+        listing.assert_not_called()
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.data, b'')
+        self.assertEqual(again.headers['ETag'], etag)
+
+        self.save(Asset(user.id, 'House', value='10'))
+        changed = client.get('/user-dashboard', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+        self.assertIn(b'House', changed.data)
+
+    def test_etag_is_per_user_and_skipped_with_flashes(self):
+        owner = self.save(User('owner@example.com', password='password'))
+        other = self.save(User('other@example.com', password='password'))
+        etag = self.login(owner).get('/user-dashboard').headers['ETag']
+        self.assertEqual(self.login(other).get('/user-dashboard', headers={'If-None-Match': etag}).status_code, 200)
+
+        client = self.login(owner)
+        with client.session_transaction() as session:
+            session['_flashes'] = [('success', 'Saved.')]
+        response = client.get('/user-dashboard', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Saved.', response.data)
+
+    def test_trustee_dashboard_follows_assignments(self):
+        trustee = self.save(User('trustee@example.com', password='password', is_trustee=True))
+        client = self.login(trustee)
+        etag = client.get('/trustee-dashboard').headers['ETag']
+        self.assertEqual(client.get('/trustee-dashboard', headers={'If-None-Match': etag}).status_code, 304)
+        self.save(Trustee('someone', trustee.id))
+        self.assertEqual(client.get('/trustee-dashboard', headers={'If-None-Match': etag}).status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import io
+import json
+import os
+import unittest
+import zipfile
+from legatera.models import User, Trustee, Message, Asset
+from legatera.export import stream_export, EXPORT_CHUNK_SIZE
+from base import LocalAppTestCase
+
+class TestExport(LocalAppTestCase):
+    push_context = True
+
+    def setUp(self):
+        super().setUp()
+        self.app.root_path = self.tmp.name
+
+    def write_media(self, relative, data):
+        path = os.path.join(self.tmp.name, 'static', relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def test_archive_contains_records_and_media(self):
+        user = User('owner@example.com', password='secret-password')
+        user.save()
+        media = os.urandom(3 * EXPORT_CHUNK_SIZE + 17)
+        self.write_media('uploads/messages/letter.pdf', media)
+        message = Message(user.id, 'Anna', 'hello', media_url='uploads/messages/letter.pdf')
+        message.save()
+        Message(user.id, 'Ben', 'missing media', media_url='uploads/messages/gone.pdf').save()
+        Asset(user.id, 'House', value=10).save()
+        Trustee(user.id, 'trustee').save()
+
+        chunks = list(stream_export(user.id))
+        self.assertLess(max(len(c) for c in chunks), 2 * EXPORT_CHUNK_SIZE)
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        messages = [json.loads(line) for line in archive.read('messages.jsonl').splitlines()]
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(archive.read(f'media/{message.id}/letter.pdf'), media)
+        profile = json.loads(archive.read('profile.jsonl'))
+        self.assertNotIn('password_hash', profile)
+        self.assertIn('assets.jsonl', archive.namelist())
+        self.assertIn('trustees.jsonl', archive.namelist())
+
+    def test_media_outside_static_is_refused(self):
+        user = User('owner@example.com', password='secret-password')
+        user.save()
+        Message(user.id, 'Anna', 'hello', media_url='../../etc/passwd').save()
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(stream_export(user.id))))
+        self.assertFalse(any(name.startswith('media/') for name in archive.namelist()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from legatera.fragments import SQLiteFragmentCache, MemoryFragmentCache
+from legatera.models import User, Trustee, Asset, deferred_data_versions, get_data_version
+from base import LocalAppTestCase
+
+class TestDashboardCache(LocalAppTestCase):
+    push_context = True
+
+    def setUp(self):
+        super().setUp()
+        self.user = User('owner@example.com', password='password', first_name='Owner')
+        self.user.save()
+        self.client = self.login(self.user)
+
+    def test_repeat_views_skip_storage_until_a_write(self):
+        Asset(self.user.id, 'House', value='10').save()
+        with patch.object(Asset, 'list_by_user_id', wraps=Asset.list_by_user_id) as listing:
+            first = self.client.get('/user-dashboard')
+            second = self.client.get('/user-dashboard')
+            self.assertEqual(listing.call_count, 1)
+            self.assertEqual(first.data, second.data)
+            self.assertIn(b'House', second.data)
+
+            Asset(self.user.id, 'Boat', value='5').save()
+            third = self.client.get('/user-dashboard')
+            self.assertEqual(listing.call_count, 2)
+            self.assertIn(b'Boat', third.data)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, 'fragment_cache.db')))
+
+    def test_trustee_writes_bump_both_users(self):
+        before = get_data_version('trustee-1')
+        Trustee(self.user.id, 'trustee-1').save()
+        self.assertEqual(get_data_version('trustee-1'), before + 1)
+        self.assertEqual(get_data_version(self.user.id), 2)
+
+    def test_bulk_writes_bump_each_user_once(self):
+        with deferred_data_versions():
+            Trustee(self.user.id, 'trustee-1').save()
+            Trustee(self.user.id, 'trustee-2').save()
+            Asset(self.user.id, 'House', value='10').save()
+            self.assertEqual(get_data_version(self.user.id), 1)
+        self.assertEqual(get_data_version(self.user.id), 2)
+        self.assertEqual(get_data_version('trustee-2'), 1)
+
+class TestBackends(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check_lru(self, cache):
+        cache.set('page', 'a', 1, 'x' * 40)
+        cache.set('page', 'b', 1, 'y' * 40)
+        self.assertEqual(cache.get('page', 'a', 1), 'x' * 40)
+        self.assertIsNone(cache.get('page', 'a', 2))
+        # 'b' is now the least recently used and makes room for 'c'
+        cache.set('page', 'c', 1, 'z' * 40)
+        self.assertIsNone(cache.get('page', 'b', 1))
+        self.assertEqual(cache.get('page', 'c', 1), 'z' * 40)
+        # A newer version replaces the user's entry rather than adding one
+        cache.set('page', 'a', 2, 'w' * 10)
+        self.assertIsNone(cache.get('page', 'a', 1))
+        cache.set('page', 'd', 1, 'v' * 40)
+        self.assertEqual(cache.get('page', 'a', 2), 'w' * 10)
+        self.assertEqual(cache.get('page', 'd', 1), 'v' * 40)
+        cache.set('page', 'e', 1, 'u' * 500)
+        self.assertIsNone(cache.get('page', 'e', 1))
+
+    def test_sqlite_lru(self):
+        with patch('legatera.fragments.TOUCH_INTERVAL', 0):
+            self.check_lru(SQLiteFragmentCache(os.path.join(self.tmp.name, 'cache.db'), max_bytes=100))
+
+    def test_memory_lru(self):
+        self.check_lru(MemoryFragmentCache(max_bytes=100))
+
+if __name__ == '__main__':
+    unittest.main()
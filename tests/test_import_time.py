@@ -0,0 +1,56 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# Cumulative import time allowed for the package and its blueprints; override
+# with LEGATERA_IMPORT_BUDGET_MS on slow machines
+IMPORT_BUDGET_MS = float(os.environ.get('LEGATERA_IMPORT_BUDGET_MS', 500))
+DEFERRED_MODULES = ('boto3', 'botocore', 'sqlite3')
+# Startup is measured without AWS and with it configured; nothing listens on the endpoint
+AWS_ENVIRONMENTS = {
+    'local': {},
+    'aws': {'AWS_ACCESS_KEY_ID': 'testing', 'AWS_SECRET_ACCESS_KEY': 'testing',
+            'AWS_ENDPOINT_URL': 'http://127.0.0.1:9'}
+}
+
+def _run(code, *flags, aws=None):
+    env = {k: v for k, v in os.environ.items() if k not in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY')}
+    env.update(aws or {})
+    return subprocess.run([sys.executable, *flags, '-c', code], capture_output=True, text=True,
+                          env=env, check=True)
+
+def _import_time_ms(aws):
+    """Cumulative import time of legatera and its blueprints, from -X importtime"""
+    stderr = _run('import legatera.routes', '-X', 'importtime', aws=aws).stderr
+    for line in stderr.splitlines():
+        fields = line.split('|')
+        # The importing statement is the only top-level entry for legatera.routes
+        if len(fields) == 3 and fields[2] == ' legatera.routes':
+            return int(fields[1]) / 1000
+    raise AssertionError(f'legatera.routes missing from -X importtime output:\n{stderr}')
+
+class TestImportTime(unittest.TestCase):
+    def test_startup_defers_heavy_modules(self):
+        for name, aws in AWS_ENVIRONMENTS.items():
+            with self.subTest(name):
+                result = _run(
+                    'import json, sys\n'
+                    'from legatera import create_app\n'
+                    'create_app()\n'
+                    f'print(json.dumps(sorted(m for m in sys.modules if m.split(".")[0] in {DEFERRED_MODULES!r})))',
+                    aws=aws
+                )
+                self.assertEqual(json.loads(result.stdout.splitlines()[-1]), [])
+
+    def test_import_time_budget(self):
+        for name, aws in AWS_ENVIRONMENTS.items():
+            with self.subTest(name):
+                # Best of three to keep scheduler noise out of the measurement
+                best = min(_import_time_ms(aws) for _ in range(3))
+                self.assertLess(best, IMPORT_BUDGET_MS,
+                                f'importing legatera took {best:.0f}ms, budget is {IMPORT_BUDGET_MS:.0f}ms')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import io
+import unittest
+from decimal import Decimal
+from legatera.models import User, Message, Asset, Trustee
+from legatera.importer import import_records
+from base import LocalAppTestCase
+
+ASSET_CSV = b"""name,description,type,value,location
+House,Family home,real_estate,250000.50,Lisbon
+Savings,,financial,1000,Bank
+,Missing name,financial,1,Bank
+Rocket,,spaceship,1,Moon
+"""
+
+MESSAGE_JSONL = b"""{"recipient": "anna", "content": "For your birthday", "delay_days": 7}
+{"recipient": "ben", "content": ""}
+not json
+{"recipient_id": "cara", "content": "Hello", "delay_days": "0"}
+{"recipient": "stranger", "content": "Not a trustee"}
+"""
+
+class TestImporter(LocalAppTestCase):
+    config = {'WTF_CSRF_ENABLED': False}
+    push_context = True
+
+    def test_asset_csv_import(self):
+        report = import_records('owner', 'assets', io.BytesIO(ASSET_CSV), 'csv')
+        self.assertEqual((report.rows, report.imported), (4, 2))
+        self.assertEqual([line for line, _ in report.errors], [4, 5])
+        self.assertIn('name', report.errors[0][1])
+        self.assertIn('type', report.errors[1][1])
+
+        summary = Asset.get_summary('owner')
+        self.assertEqual(summary.count, 2)
+        self.assertEqual(summary.total_value, Decimal('251000.50'))
+
+    def test_message_jsonl_import(self):
+        for trustee_user_id in ('anna', 'ben', 'cara'):
+            Trustee('owner', trustee_user_id).save()
+        progress = []
+        report = import_records('owner', 'messages', io.BytesIO(MESSAGE_JSONL), 'jsonl',
+                                progress=lambda r: progress.append(r.imported))
+        self.assertEqual(report.imported, 2)
+        self.assertEqual([line for line, _ in report.errors], [2, 3, 5])
+        self.assertIn('recipient', report.errors[2][1])
+        self.assertEqual(progress, [2])
+        messages = sorted(Message.get_by_user_id('owner'), key=lambda m: m.recipient_id)
+        self.assertEqual([(m.recipient_id, m.delay_days) for m in messages], [('anna', 7), ('cara', 0)])
+
+    def test_import_route(self):
+        user = User('owner@example.com', password='password')
+        user.save()
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = user.id
+        response = client.post('/import', data={
+            'kind': 'assets',
+            'file': (io.BytesIO(ASSET_CSV), 'assets.csv')
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'2 of 4 rows imported', response.data)
+        self.assertEqual(len(Asset.get_by_user_id(user.id)), 2)
+
+if __name__ == '__main__':
+    unittest.main()
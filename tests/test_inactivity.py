@@ -0,0 +1,44 @@
+import unittest
+from datetime import datetime, timedelta
+from legatera.models import User
+from legatera.inactivity import sweep_inactive
+from base import LocalAppTestCase
+
+class TestInactivitySweep(LocalAppTestCase):
+    push_context = True
+
+    def setUp(self):
+        super().setUp()
+        self.base = datetime(2026, 1, 1)
+
+    def make_user(self, email, days_after_base):
+        user = User(email, password='password')
+        user.save()
+        user.record_check_in(self.base + timedelta(days=days_after_base))
+        return user
+
+    def sweep(self, days_after_base):
+        found = []
+        sweep_inactive(lambda user_id, last_seen: found.append(user_id),
+                       threshold_days=30, now=self.base + timedelta(days=days_after_base))
+        return found
+
+    def test_only_users_past_threshold_are_reported(self):
+        stale = self.make_user('stale@example.com', 0)
+        self.make_user('active@example.com', 20)
+        self.assertEqual(self.sweep(35), [stale.id])
+
+    def test_sweep_is_incremental(self):
+        first = self.make_user('first@example.com', 0)
+        second = self.make_user('second@example.com', 10)
+        self.assertEqual(self.sweep(35), [first.id])
+        self.assertEqual(self.sweep(35), [])
+        self.assertEqual(self.sweep(45), [second.id])
+
+    def test_new_check_in_moves_user_out_of_old_bucket(self):
+        user = self.make_user('user@example.com', 0)
+        User.get_by_id(user.id).record_check_in(self.base + timedelta(days=25))
+        self.assertEqual(self.sweep(35), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from botocore.exceptions import ClientError
+from legatera.cli import migrate_last_wishes
+from legatera.models import StorageModel, LastWishes, ConcurrentUpdateError, get_data_version
+from base import LocalAppTestCase, MockDynamoTestCase
+
+class TestLastWishesLocal(LocalAppTestCase):
+    push_context = True
+
+    def test_edits_replace_one_record_and_keep_history(self):
+        self.app.config['LAST_WISHES_HISTORY'] = True
+        LastWishes('owner', funeral_preferences='burial').save()
+        wishes = LastWishes.get_by_user_id('owner')
+        wishes.funeral_preferences = 'cremation'
+        wishes.updated_at = '2999-01-01T00:00:00'
+        wishes.save()
+
+        stored = StorageModel._load_data('last_wishes')
+        self.assertEqual(len(stored), 1)
+        self.assertEqual(stored[0]['funeral_preferences'], 'cremation')
+        self.assertEqual(stored[0]['version'], 1)
+        self.assertEqual([w.funeral_preferences for w in LastWishes.get_history('owner')], ['burial'])
+
+    def test_new_record_does_not_replace_existing_wishes(self):
+        LastWishes('owner', funeral_preferences='burial').save()
+        with self.assertRaises(ConcurrentUpdateError):
+            LastWishes('owner', funeral_preferences='cremation').save()
+        self.assertEqual(LastWishes.get_by_user_id('owner').funeral_preferences, 'burial')
+
+    def test_history_of_undated_wishes_is_dated_when_replaced(self):
+        self.app.config['LAST_WISHES_HISTORY'] = True
+        StorageModel._save_data('last_wishes', [{'id': 'w', 'user_id': 'owner', 'personal_message': 'old'}])
+        wishes = LastWishes.get_by_user_id('owner')
+        wishes.personal_message = 'new'
+        wishes.save()
+        previous, = LastWishes.get_history('owner')
+        self.assertEqual(previous.personal_message, 'old')
+        self.assertIsNotNone(previous.updated_at)
+
+    def test_migration_keeps_newest_duplicate(self):
+        StorageModel._save_data('last_wishes', [
+            {'id': 'a', 'user_id': 'owner', 'personal_message': 'old', 'updated_at': '2024-01-01'},
+            {'id': 'b', 'user_id': 'owner', 'personal_message': 'new', 'updated_at': '2025-01-01'},
+            {'id': 'c', 'user_id': 'other', 'personal_message': 'only', 'updated_at': '2024-06-01'}
+        ])
+        result = self.app.test_cli_runner().invoke(migrate_last_wishes)
+        self.assertIn('Migrated last wishes of 1 users', result.output)
+        self.assertEqual((get_data_version('owner'), get_data_version('other')), (1, 0))
+        stored = sorted(StorageModel._load_data('last_wishes'), key=lambda w: w['id'])
+        self.assertEqual([w['id'] for w in stored], ['b', 'c'])
+        self.assertEqual(LastWishes.get_history('owner'), [])
+
+class TestLastWishesDynamo(MockDynamoTestCase):
+    def test_read_is_a_single_get_item_on_the_fixed_key(self):
+        self.table.get_item.return_value = {'Item': {
+            'PK': 'USER#owner', 'SK': 'WISHES', 'id': 'w', 'user_id': 'owner', 'updated_at': '2025-01-01'
+        }}
+        wishes = LastWishes.get_by_user_id('owner')
+        self.assertEqual(wishes.id, 'w')
+        self.table.get_item.assert_called_once()
+        self.assertEqual(self.table.get_item.call_args.kwargs['Key'], {'PK': 'USER#owner', 'SK': 'WISHES'})
+        self.table.query.assert_not_called()
+
+    def test_new_record_is_written_only_if_none_exists(self):
+        LastWishes('owner', funeral_preferences='burial').save()
+        self.assertEqual(self.table.put_item.call_args.kwargs['ConditionExpression'], 'attribute_not_exists(PK)')
+
+        self.table.put_item.side_effect = ClientError(
+            {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'}}, 'PutItem')
+        with self.assertRaises(ConcurrentUpdateError):
+            LastWishes('owner', funeral_preferences='cremation').save()
+
+    def test_history_key_of_undated_wishes(self):
+        self.app.dynamodb.batch_write_item.return_value = {}
+        LastWishes.save_history('owner', [{'id': 'w', 'user_id': 'owner', 'updated_at': None}])
+        request, = self.app.dynamodb.batch_write_item.call_args.kwargs['RequestItems'].values()
+        sort_key = request[0]['PutRequest']['Item']['SK']
+        self.assertTrue(sort_key.startswith('HISTORY#WISHES#2'))
+
+if __name__ == '__main__':
+    unittest.main()
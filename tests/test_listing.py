@@ -0,0 +1,80 @@
+import unittest
+from decimal import Decimal
+from unittest.mock import MagicMock
+from legatera.models import StorageModel, User, Asset, Message
+from base import LocalAppTestCase, MockDynamoTestCase
+
+class TestLocalListing(LocalAppTestCase):
+    push_context = True
+
+    def test_listing_index_follows_writes(self):
+        message = Message('owner', 'r1', 'a long letter', delay_days=7)
+        message.save()
+        Message('other', 'r2', 'not mine').save()
+        Asset('owner', 'House', 'three bedrooms', 'real_estate', '100.50').save()
+
+        entry, = Message.list_by_user_id('owner')
+        self.assertEqual((entry.id, entry.recipient_id, entry.delay_days), (message.id, 'r1', 7))
+        self.assertFalse(hasattr(entry, 'content'))
+        asset, = Asset.list_by_user_id('owner')
+        self.assertEqual((asset.name, asset.value), ('House', Decimal('100.50')))
+        self.assertFalse(hasattr(asset, 'description'))
+
+        loaded = Message.get_for_user('owner', message.id)
+        loaded.recipient_id = 'r3'
+        loaded.update()
+        self.assertEqual(Message.list_by_user_id('owner')[0].recipient_id, 'r3')
+        self.assertEqual(Message.get_for_user('owner', message.id).content, 'a long letter')
+        self.assertIsNone(Message.get_for_user('other', message.id))
+
+    def test_index_is_built_for_existing_data(self):
+        with open(StorageModel._get_storage_file('messages'), 'w') as f:
+            f.write('[{"id": "m1", "user_id": "owner", "recipient_id": "r1", "content": "x",'
+                    ' "created_at": "2024-01-01", "delay_days": 0}]')
+        self.assertEqual([m.id for m in Message.list_by_user_id('owner')], ['m1'])
+
+class TestDynamoListing(MockDynamoTestCase):
+    def test_query_projects_listing_fields(self):
+        self.table.query.return_value = {'Items': [{'id': 'a1', 'name': 'House', 'value': Decimal('5')}]}
+        entry, = Asset.list_by_user_id('owner')
+        self.assertEqual((entry.id, entry.name, entry.asset_type), ('a1', 'House', None))
+
+        request = self.table.query.call_args.kwargs
+        projected = [request['ExpressionAttributeNames'][name.strip()]
+                     for name in request['ProjectionExpression'].split(',')]
+        self.assertEqual(projected, ['id', 'name', 'asset_type', 'value'])
+        self.assertEqual(request['ExpressionAttributeValues'][':sk'], 'ASSET#')
+
+class TestMessageMedia(LocalAppTestCase):
+    def setUp(self):
+        super().setUp()
+        # No app context is kept pushed: flask-login caches the user on it between requests
+        with self.app.app_context():
+            self.owner, self.other = User('owner@example.com'), User('other@example.com')
+            self.owner.save()
+            self.other.save()
+            self.message = Message(self.owner.id, 'r1', 'see attached',
+                                   media_url='uploads/messages/owner_letter.pdf')
+            self.message.save()
+
+    def test_local_media_is_served_from_static(self):
+        client = self.login(self.owner)
+        page = client.get(f'/messages/{self.message.id}')
+        self.assertIn(f'/messages/{self.message.id}/media'.encode(), page.data)
+        response = client.get(f'/messages/{self.message.id}/media')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith('/static/uploads/messages/owner_letter.pdf'))
+
+    def test_s3_media_gets_a_presigned_link(self):
+        self.app.s3_client = MagicMock()
+        self.app.s3_client.generate_presigned_url.return_value = 'https://bucket.example/signed'
+        response = self.login(self.owner).get(f'/messages/{self.message.id}/media')
+        self.assertEqual(response.location, 'https://bucket.example/signed')
+        params = self.app.s3_client.generate_presigned_url.call_args.kwargs['Params']
+        self.assertEqual(params['Key'], 'uploads/messages/owner_letter.pdf')
+
+    def test_other_users_get_a_404(self):
+        self.assertEqual(self.login(self.other).get(f'/messages/{self.message.id}/media').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
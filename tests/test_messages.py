@@ -0,0 +1,25 @@
+import unittest
+from legatera.models import User, Trustee, Message
+from base import LocalAppTestCase
+
+class TestAddMessage(LocalAppTestCase):
+    config = {'WTF_CSRF_ENABLED': False}
+
+    def test_recipient_must_be_a_trustee(self):
+        with self.app.app_context():
+            owner = User('owner@example.com', password='password')
+            owner.save()
+            Trustee(owner.id, 'trustee-1').save()
+        client = self.login(owner)
+
+        response = client.post('/add-message', data={'recipient': 'trustee-1', 'content': 'Hello',
+                                                     'delay_days': '7'})
+        self.assertEqual(response.status_code, 302)
+        response = client.post('/add-message', data={'recipient': 'stranger', 'content': 'Hello',
+                                                     'delay_days': '7'})
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            self.assertEqual([m.recipient_id for m in Message.get_by_user_id(owner.id)], ['trustee-1'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import threading
+import unittest
+from legatera import create_app, metrics
+from legatera.models import User
+from base import LocalAppTestCase
+
+class TestRegistry(unittest.TestCase):
+    def test_merge_and_render(self):
+        first, second = metrics.Registry(buckets=(0.1, 1.0)), metrics.Registry(buckets=(0.1, 1.0))
+        first.observe('legatera_request_duration_seconds', {'endpoint': 'main.home'}, 0.05)
+        second.observe('legatera_request_duration_seconds', {'endpoint': 'main.home'}, 0.5)
+        second.inc('legatera_response_bytes_total', {'endpoint': 'main.home'}, 100)
+
+        merged = metrics.Registry(buckets=(0.1, 1.0))
+        merged.merge(first.snapshot())
+        merged.merge(second.snapshot())
+        text = metrics.render_prometheus(merged)
+
+        self.assertIn('legatera_request_duration_seconds_bucket{endpoint="main.home",le="0.1"} 1', text)
+        self.assertIn('legatera_request_duration_seconds_bucket{endpoint="main.home",le="+Inf"} 2', text)
+        self.assertIn('legatera_request_duration_seconds_count{endpoint="main.home"} 2', text)
+        self.assertIn('legatera_response_bytes_total{endpoint="main.home"} 100', text)
+
+class TestInstrumentation(LocalAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['METRICS_DIR'] = f'{self.tmp.name}/metrics'
+
+    def test_model_methods_wrapped_once(self):
+        create_app()
+        self.assertTrue(User.get_by_id.__func__._legatera_instrumented)
+        self.assertFalse(hasattr(User.from_dict, '_legatera_instrumented'))
+        self.assertFalse(hasattr(User.get_by_id.__func__.__wrapped__, '_legatera_instrumented'))
+
+    def test_metrics_endpoint_aggregates_requests(self):
+        with self.app.app_context():
+            user = User('owner@example.com', password='password')
+            user.save()
+        client = self.login(user)
+        client.get('/search')
+        self.app.config['METRICS_TOKEN'] = 'scrape'
+        text = client.get('/metrics', headers={'Authorization': 'Bearer scrape'}).get_data(as_text=True)
+        self.assertIn('legatera_model_call_duration_seconds_count{method="User.get_by_id"}', text)
+        self.assertIn('endpoint="dashboard.search"', text)
+
+    def test_metrics_denied_without_token(self):
+        self.app.config['METRICS_TOKEN'] = None
+        self.assertEqual(self.app.test_client().get('/metrics').status_code, 403)
+
+    def test_metrics_token(self):
+        self.app.config['METRICS_TOKEN'] = 'scrape'
+        client = self.app.test_client()
+        self.assertEqual(client.get('/metrics').status_code, 403)
+        self.assertEqual(client.get('/metrics', headers={'Authorization': 'Bearer scrape'}).status_code, 200)
+
+class TestThreadedDynamoDB(unittest.TestCase):
+    def test_calls_from_other_threads_are_counted(self):
+        import boto3
+        from moto import mock_dynamodb
+        from legatera.aio import ThreadLocalResource
+
+        key = ('legatera_aws_call_duration_seconds', (('operation', 'ListTables'), ('service', 'dynamodb')))
+        with mock_dynamodb():
+            session = boto3.session.Session(aws_access_key_id='testing', aws_secret_access_key='testing',
+                                            region_name='us-east-1')
+            resource = ThreadLocalResource(lambda: session.resource('dynamodb'))
+            metrics.instrument_dynamodb(resource)
+            before = metrics.registry.histograms.get(key, {}).get('count', 0)
+            threads = [threading.Thread(target=lambda: resource.meta.client.list_tables()) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(metrics.registry.histograms[key]['count'], before + 2)
+
+class TestLazyClient(unittest.TestCase):
+    def test_client_is_instrumented_when_first_used(self):
+        import boto3
+        from moto import mock_dynamodb
+        from legatera.aio import LazyClient
+
+        key = ('legatera_aws_call_duration_seconds', (('operation', 'ListTables'), ('service', 'dynamodb')))
+        with mock_dynamodb():
+            session = boto3.session.Session(aws_access_key_id='testing', aws_secret_access_key='testing',
+                                            region_name='us-east-1')
+            client = LazyClient(lambda: session.client('dynamodb'))
+            metrics.instrument_boto_client(client)
+            self.assertIsNone(client._client)
+            before = metrics.registry.histograms.get(key, {}).get('count', 0)
+            client.list_tables()
+        self.assertEqual(metrics.registry.histograms[key]['count'], before + 1)
+
+if __name__ == '__main__':
+    unittest.main()
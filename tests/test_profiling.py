@@ -0,0 +1,47 @@
+import unittest
+from legatera.models import User
+from legatera.profiling import create_token
+from base import LocalAppTestCase
+
+class TestProfiling(LocalAppTestCase):
+    config = {'PROFILE_SAMPLE_RATE': 0, 'ADMIN_EMAILS': ['admin@example.com']}
+
+    def setUp(self):
+        super().setUp()
+        self.app.config['PROFILE_DIR'] = f'{self.tmp.name}/profiles'
+        self.client = self.app.test_client()
+
+    def login_as(self, email):
+        with self.app.app_context():
+            user = User(email, password='password')
+            user.save()
+        with self.client.session_transaction() as session:
+            session['_user_id'] = user.id
+
+    def test_unsigned_requests_are_not_profiled(self):
+        self.assertNotIn('X-Legatera-Profile-Id', self.client.get('/').headers)
+        response = self.client.get('/', headers={'X-Legatera-Profile': 'forged'})
+        self.assertNotIn('X-Legatera-Profile-Id', response.headers)
+
+    def test_signed_request_writes_profile_and_rotates(self):
+        self.app.config['PROFILE_MAX_FILES'] = 2
+        headers = {'X-Legatera-Profile': create_token(self.app)}
+        names = [self.client.get('/', headers=headers).headers['X-Legatera-Profile-Id'] for _ in range(3)]
+        self.assertTrue(all(name.endswith('.pstats') for name in names))
+
+        self.login_as('admin@example.com')
+        listed = [entry['name'] for entry in self.client.get('/admin/profiles').get_json()]
+        self.assertEqual(len(listed), 2)
+        self.assertNotIn(names[0], listed)
+        self.assertEqual(self.client.get(f'/admin/profiles/{listed[0]}').status_code, 200)
+
+    def test_sample_rate(self):
+        self.app.config['PROFILE_SAMPLE_RATE'] = 1.0
+        self.assertIn('X-Legatera-Profile-Id', self.client.get('/').headers)
+
+    def test_index_requires_admin(self):
+        self.login_as('someone@example.com')
+        self.assertEqual(self.client.get('/admin/profiles').status_code, 403)
+
+if __name__ == '__main__':
+    unittest.main()
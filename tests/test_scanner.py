@@ -0,0 +1,108 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+from legatera.models import StorageModel
+from legatera.scanner import parallel_scan, load_checkpoint, RateLimiter
+from base import LocalAppTestCase
+
+class SegmentedTable:
+    """Pages through a fixed item list the way DynamoDB splits it into segments"""
+
+    def __init__(self, items, fail_after=None):
+        self.items = items
+        self.fail_after = fail_after
+        self.pages = 0
+        self.checkpoint = None
+
+    def scan(self, Segment, TotalSegments, Limit=None, ExclusiveStartKey=None, **kwargs):
+        self.pages += 1
+        if self.fail_after is not None and self.pages > self.fail_after:
+            raise RuntimeError('throttled')
+        mine = [item for index, item in enumerate(self.items) if index % TotalSegments == Segment]
+        start = mine.index(ExclusiveStartKey) + 1 if ExclusiveStartKey else 0
+        Limit = Limit or len(mine)
+        page = mine[start:start + Limit]
+        response = {'Items': page, 'ScannedCount': len(page),
+                    'ConsumedCapacity': {'CapacityUnits': 1.0}}
+        if start + Limit < len(mine):
+            response['LastEvaluatedKey'] = page[-1]
+        return response
+
+    def get_item(self, Key, **kwargs):
+        return {'Item': self.checkpoint} if self.checkpoint else {}
+
+    def put_item(self, Item, **kwargs):
+        self.checkpoint = Item
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        self.checkpoint = None
+        return {}
+
+class TestParallelScan(LocalAppTestCase):
+    config = {'DYNAMODB_CAPACITY_TRACKING': False}
+
+    def setUp(self):
+        super().setUp()
+        self.items = [{'PK': f'USER#{i}', 'SK': f'MESSAGE#{i}', 'type': 'message'} for i in range(40)]
+
+    def use_table(self, table):
+        self.app.dynamodb = MagicMock()
+        self.app.dynamodb.Table.return_value = table
+
+    def test_every_item_is_visited_once(self):
+        self.use_table(SegmentedTable(self.items))
+        seen = []
+        with self.app.app_context():
+            result = parallel_scan(lambda item: seen.append(item['PK']), ['message'], segments=4, page_size=3)
+        self.assertEqual(sorted(seen), sorted(item['PK'] for item in self.items))
+        self.assertEqual((result.items, result.units), (40, result.pages * 1.0))
+
+    def test_interrupted_scan_resumes_from_checkpoint(self):
+        table = SegmentedTable(self.items, fail_after=5)
+        self.use_table(table)
+        seen = set()
+        with self.app.app_context():
+            with self.assertRaises(RuntimeError):
+                parallel_scan(lambda item: seen.add(item['PK']), ['message'], segments=2,
+                              checkpoint='test', page_size=4)
+            self.assertEqual(len(load_checkpoint('test')), 2)
+
+            table.fail_after = None
+            table.pages = 0
+            result = parallel_scan(lambda item: seen.add(item['PK']), ['message'], segments=2,
+                                   checkpoint='test', resume=True, page_size=4)
+            self.assertIsNone(load_checkpoint('test'))
+        self.assertTrue(result.resumed)
+        self.assertLess(result.items, 40)
+        self.assertEqual(len(seen), 40)
+
+    def test_local_backend_reads_collections(self):
+        self.app.dynamodb = None
+        with self.app.app_context():
+            StorageModel._save_data('messages', [{'id': 'm1'}, {'id': 'm2'}])
+            seen = []
+            result = parallel_scan(seen.append, ['message'])
+        self.assertEqual(result.items, 2)
+        self.assertEqual(seen[0], {'type': 'message', 'id': 'm1'})
+
+    def test_single_pass_commands_neither_resume_nor_checkpoint(self):
+        table = SegmentedTable(self.items)
+        table.put_item = MagicMock(side_effect=AssertionError('checkpoint written'))
+        self.use_table(table)
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=['count-messages', '--segments', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('held\t40', result.output)
+        self.assertEqual(runner.invoke(args=['count-messages', '--resume']).exit_code, 2)
+        self.assertEqual(runner.invoke(args=['reconcile-users', '--resume']).exit_code, 2)
+
+    def test_rate_limiter_paces_consumption(self):
+        limiter = RateLimiter(100)
+        started = time.monotonic()
+        for _ in range(3):
+            limiter.consume(10)
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import patch
+from legatera.models import User, Trustee, Message, Asset, LastWishes
+
+class TestSchema(unittest.TestCase):
+    def test_instances_have_no_dict(self):
+        for record in (Trustee('owner', 't1'), Message('owner', 'r1', 'hi'), Asset('owner', 'House'),
+                       LastWishes('owner')):
+            self.assertFalse(hasattr(record, '__dict__'), type(record).__name__)
+
+    def test_loading_generates_nothing(self):
+        stored = Message('owner', 'r1', 'hello', delay_days=3).to_dict()
+        with patch('legatera.models.uuid.uuid4') as uuid4, patch('legatera.models.datetime') as clock:
+            message = Message.from_dict(stored)
+        uuid4.assert_not_called()
+        clock.utcnow.assert_not_called()
+        self.assertEqual(message.to_dict(), stored)
+        self.assertEqual(message.changed_fields(), {})
+
+    def test_json_and_dynamo_forms(self):
+        asset = Asset('owner', 'House', value='12.50')
+        self.assertEqual(asset.to_dict()['value'], '12.50')
+        item = asset.to_dynamo_item()
+        self.assertEqual(item['value'], Decimal('12.50'))
+        self.assertEqual((item['SK'], item['type']), (f'ASSET#{asset.id}', 'asset'))
+        self.assertEqual(Asset.from_dynamo_item(item).value, Decimal('12.50'))
+
+        trustee = Trustee('owner', 't1')
+        trustee.triggered_at = datetime(2026, 1, 1, 12, 0)
+        stored = trustee.to_dynamo_item()
+        self.assertEqual(stored['triggered_at'], '2026-01-01T12:00:00')
+        self.assertEqual(Trustee.from_dynamo_item(dict(stored, version=Decimal('2'))).version, 2)
+
+    def test_missing_fields_take_defaults(self):
+        user = User.from_dict({'id': 'u1', 'email': 'a@example.com', 'password_hash': 'hash',
+                               'created_at': '2026-01-01T00:00:00'})
+        self.assertEqual((user.is_trustee, user.last_seen, user.checkin_bucket, user.version),
+                         (False, None, None, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from legatera.models import User, Message, Asset, LastWishes
+from legatera import search
+from base import LocalAppTestCase
+
+class TestSearch(LocalAppTestCase):
+    config = {'SEARCH_INDEX_DIR': None, 'WTF_CSRF_ENABLED': False}
+    push_context = True
+
+    def test_models_are_indexed_on_save(self):
+        Message('owner', 'Anna', 'The piano goes to my granddaughter').save()
+        Asset('owner', 'Grand piano', description='Steinway in the living room').save()
+        LastWishes('owner', funeral_preferences='Play piano music at the service').save()
+        Message('other', 'Ben', 'piano lessons').save()
+
+        page = search.search('owner', 'piano')
+        self.assertEqual(page.total, 3)
+        # Title matches rank first
+        self.assertEqual(page.results[0].kind, 'asset')
+        self.assertIn('<mark>', page.results[0].snippet + page.results[1].snippet)
+
+    def test_prefix_matching_and_pagination(self):
+        for i in range(5):
+            Message('owner', 'Anna', f'letter number {i} about gardening').save()
+        first = search.search('owner', 'garden', page=1, per_page=2)
+        last = search.search('owner', 'garden', page=3, per_page=2)
+        self.assertEqual(first.total, 5)
+        self.assertTrue(first.has_next)
+        self.assertEqual(len(last.results), 1)
+        self.assertFalse(last.has_next)
+
+    def test_last_wishes_replace_previous_text(self):
+        LastWishes('owner', special_requests='scatter ashes at sea').save()
+        wishes = LastWishes.get_by_user_id('owner')
+        wishes.special_requests = 'plant a tree'
+        wishes.save()
+        self.assertEqual(search.search('owner', 'ashes').total, 0)
+        self.assertEqual(search.search('owner', 'tree').total, 1)
+
+    def test_query_syntax_is_neutralised(self):
+        Message('owner', 'Anna', 'hello "world"').save()
+        self.assertEqual(search.search('owner', 'world" OR (').total, 0)
+        self.assertEqual(search.search('owner', '"world" )').total, 1)
+
+    def test_search_route(self):
+        user = User('owner@example.com', password='password', first_name='Owner')
+        user.save()
+        Message(user.id, 'Anna', 'notes about the cottage').save()
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = user.id
+        response = client.get('/search?q=cottage')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'<mark>cottage</mark>', response.data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from legatera import create_app
+from legatera.config import Config
+from legatera.templating import warm_up
+
+class TestTemplateCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp.name, 'templates')
+        patcher = patch.object(Config, 'TEMPLATE_CACHE_DIR', self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def create_app(self):
+        app = create_app()
+        app.config.update(STORAGE_DIR=self.tmp.name, SEARCH_INDEX_DIR=self.tmp.name)
+        app.dynamodb = None
+        return app
+
+    def test_compiled_templates_are_reused_by_other_workers(self):
+        app = self.create_app()
+        result = app.test_cli_runner().invoke(args=['templates-compile'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        count = len(app.jinja_env.list_templates())
+        self.assertIn(f'{count} templates compiled', result.output)
+        self.assertEqual(len(os.listdir(self.cache_dir)), count)
+
+        # A second app stands in for another worker: it loads, never compiles
+        other = self.create_app()
+        with patch.object(other.jinja_env, 'compile', side_effect=AssertionError('compiled again')):
+            self.assertEqual(other.test_client().get('/').status_code, 200)
+
+    def test_warm_up_loads_templates_and_pages(self):
+        app = self.create_app()
+        with self.assertLogs(app.logger, 'INFO') as logs:
+            warm_up(app)
+        self.assertIn('base.html', [name for _, name in app.jinja_env.cache.keys()])
+        self.assertTrue(any('Warmed up' in line for line in logs.output))
+        self.assertFalse(any('returned' in line for line in logs.output))
+
+    def test_disabled(self):
+        with patch.object(Config, 'TEMPLATE_BYTECODE_CACHE', False):
+            app = self.create_app()
+        self.assertIsNone(app.jinja_env.bytecode_cache)
+        self.assertNotEqual(app.test_cli_runner().invoke(args=['templates-compile']).exit_code, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from datetime import datetime
+from legatera.models import StorageModel, Trustee, Message
+from legatera.triggers import trigger_user
+from base import LocalAppTestCase, MockDynamoTestCase
+
+class TestTriggerLocal(LocalAppTestCase):
+    push_context = True
+
+    def test_trigger_updates_trustees_and_pending_messages(self):
+        Trustee('owner', 'trustee-1').save()
+        Trustee('owner', 'trustee-2').save()
+        Trustee('someone-else', 'trustee-1').save()
+        Message('owner', 'r1', 'hello', delay_days=0).save()
+        Message('owner', 'r2', 'later', delay_days=30).save()
+
+        now = datetime(2026, 1, 1)
+        result = trigger_user('owner', now=now)
+
+        self.assertEqual(len(result.trustees), 2)
+        self.assertEqual(len(result.messages), 2)
+        self.assertTrue(all(t.notification_triggered for t in Trustee.get_by_user_id('owner')))
+        self.assertFalse(Trustee.get_by_user_id('someone-else')[0].notification_triggered)
+        release = sorted(m.release_at for m in Message.get_by_user_id('owner'))
+        self.assertEqual(release, ['2026-01-01T00:00:00', '2026-01-31T00:00:00'])
+        self.assertEqual(len(StorageModel._load_data('messages')), 2)
+
+    def test_trigger_is_idempotent(self):
+        Trustee('owner', 'trustee-1').save()
+        Message('owner', 'r1', 'hello').save()
+        trigger_user('owner')
+        result = trigger_user('owner')
+        self.assertFalse(result.changed)
+
+class TestTriggerDynamo(MockDynamoTestCase):
+    config = {'DYNAMODB_CAPACITY_TRACKING': False}
+
+    def test_changes_go_out_in_transactions_of_100(self):
+        items = [Trustee('owner', 'trustee-1').to_dynamo_item()]
+        items += [Message('owner', 'r1', f'letter {i}', delay_days=7).to_dynamo_item() for i in range(150)]
+        self.table.query.return_value = {'Items': items}
+
+        result = trigger_user('owner', now=datetime(2026, 1, 1))
+
+        self.assertEqual(len(result.messages), 150)
+        calls = self.table.meta.client.transact_write_items.call_args_list
+        self.assertEqual([len(c.kwargs['TransactItems']) for c in calls], [100, 51])
+        update = calls[0].kwargs['TransactItems'][0]['Update']
+        self.assertIn('#version = :expected', update['ConditionExpression'])
+        self.assertEqual(sorted(update['ExpressionAttributeNames'].values()),
+                         ['notification_triggered', 'triggered_at', 'version'])
+        self.assertTrue(all(m.version == 1 and not m.changed_fields() for m in result.messages))
+        # Only the data versions of the owner and the trustee are bumped, once each
+        bumped = [c.kwargs['Key']['PK'] for c in self.table.update_item.call_args_list]
+        self.assertEqual(bumped, ['USER#owner', 'USER#trustee-1'])
+
+class TestBatchWrite(MockDynamoTestCase):
+    def test_batches_of_25_and_unprocessed_retry(self):
+        table = self.app.config['DYNAMODB_TABLE']
+        leftover = {'UnprocessedItems': {table: [{'PutRequest': {'Item': {'PK': 'x'}}}]}}
+        self.app.dynamodb.batch_write_item.side_effect = [leftover, {}, {}]
+
+        written = StorageModel._batch_write({'PK': str(i)} for i in range(30))
+
+        self.assertEqual(written, 30)
+        calls = self.app.dynamodb.batch_write_item.call_args_list
+        self.assertEqual([len(c.kwargs['RequestItems'][table]) for c in calls], [25, 1, 5])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from decimal import Decimal
+from botocore.exceptions import ClientError
+from legatera.models import StorageModel, Asset, ConcurrentUpdateError, Message
+from base import LocalAppTestCase, MockDynamoTestCase
+
+class TestLocalUpdate(LocalAppTestCase):
+    push_context = True
+
+    def test_update_writes_changed_fields_in_place(self):
+        Message('owner', 'r1', 'first').save()
+        Message('owner', 'r2', 'second').save()
+        message = Message.get_by_user_id('owner')[1]
+        self.assertEqual(message.changed_fields(), {})
+        self.assertFalse(message.update())
+
+        message.sent_at = '2026-01-01T00:00:00'
+        self.assertEqual(message.changed_fields(), {'sent_at': '2026-01-01T00:00:00'})
+        self.assertTrue(message.update())
+
+        stored = StorageModel._load_data('messages')
+        self.assertEqual([m['content'] for m in stored], ['first', 'second'])
+        self.assertEqual(stored[1]['sent_at'], '2026-01-01T00:00:00')
+        self.assertEqual(stored[1]['version'], 1)
+        self.assertEqual(message.changed_fields(), {})
+
+    def test_stale_instance_is_rejected(self):
+        Message('owner', 'r1', 'hello').save()
+        first, = Message.get_by_user_id('owner')
+        second, = Message.get_by_user_id('owner')
+        first.sent_at = '2026-01-01T00:00:00'
+        first.update()
+        second.content = 'edited'
+        with self.assertRaises(ConcurrentUpdateError):
+            second.update()
+        self.assertEqual(StorageModel._load_data('messages')[0]['content'], 'hello')
+
+    def test_asset_update_moves_summary(self):
+        Asset('owner', 'House', asset_type='real_estate', value=Decimal('100')).save()
+        asset, = Asset.get_by_user_id('owner')
+        asset.asset_type = 'financial'
+        asset.value = Decimal('40')
+        asset.update()
+
+        summary = Asset.get_summary('owner')
+        self.assertEqual(summary.count, 1)
+        self.assertEqual(summary.total_value, Decimal('40'))
+        self.assertNotIn('real_estate', summary.by_type)
+        self.assertEqual(summary.by_type['financial'], {'count': 1, 'total_value': Decimal('40')})
+
+class TestDynamoUpdate(MockDynamoTestCase):
+    def test_update_item_carries_only_changes_and_version_check(self):
+        message = Message.from_dict(dict(Message('owner', 'r1', 'x' * 2000).to_dict(), version=3))
+        message.sent_at = '2026-01-01T00:00:00'
+        message.media_url = None
+        message.update()
+
+        # The record update comes first; the data version bump follows it
+        request = self.table.update_item.call_args_list[0].kwargs
+        self.assertEqual(request['Key'], {'PK': 'USER#owner', 'SK': f'MESSAGE#{message.id}'})
+        self.assertEqual(request['UpdateExpression'], 'SET #version = :next, #f0 = :f0')
+        self.assertEqual(request['ExpressionAttributeNames']['#f0'], 'sent_at')
+        self.assertNotIn('content', request['ExpressionAttributeNames'].values())
+        self.assertEqual(request['ConditionExpression'], 'attribute_exists(PK) AND #version = :expected')
+        self.assertEqual(request['ExpressionAttributeValues'][':expected'], 3)
+        self.assertEqual(message.version, 4)
+
+    def test_conditional_failure_raises_conflict(self):
+        self.table.update_item.side_effect = ClientError(
+            {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'}}, 'UpdateItem')
+        message = Message.from_dict(Message('owner', 'r1', 'hello').to_dict())
+        message.release_at = None
+        message.sent_at = '2026-01-01T00:00:00'
+        with self.assertRaises(ConcurrentUpdateError):
+            message.update()
+        self.assertEqual(message.version, 0)
+
+if __name__ == '__main__':
+    unittest.main()